@@ -0,0 +1,149 @@
+"""Admission control for routes that see bursts, such as submissions at exam close.
+
+Each limited route runs at most ``concurrency`` requests at once. Requests
+beyond that wait in a FIFO queue of at most ``queue_size`` entries: a
+finishing request hands its slot straight to the oldest waiter, so
+nobody is overtaken. A request that cannot be queued, or whose wait
+exceeds ``queue_timeout_seconds``, is answered with 429 and a
+Retry-After estimated from the queue length and recent service times.
+Work in flight therefore stays bounded and latency degrades into fast
+rejections instead of piling up threads and database locks. Limits are
+per worker process and are set per route in the "admission" section of
+config.json, keyed by "<METHOD> <rule>". A queued request holds a server
+thread while it waits, so the sum of concurrency and queue_size over the
+limited routes should stay below ``server.threads``.
+"""
+import math
+import threading
+import time
+from collections import deque
+from flask import g, jsonify, request
+from config import get_setting
+from metrics import metrics
+
+# Weight of the latest request in the moving average of service times
+SERVICE_TIME_WEIGHT = 0.1
+
+
+class AdmissionLimit:
+    """Concurrency limit and FIFO wait queue of one route"""
+
+    def __init__(self, concurrency, queue_size, queue_timeout):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.service_seconds = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Wait for a slot; return (outcome, seconds waited).
+
+        The outcome is 'admitted', 'queued' (admitted after waiting),
+        'rejected_full' or 'rejected_timeout'.
+        """
+        with self._lock:
+            if self.active < self.concurrency and not self._waiters:
+                self.active += 1
+                return 'admitted', 0.0
+            if len(self._waiters) >= self.queue_size:
+                return 'rejected_full', 0.0
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        started = time.perf_counter()
+        admitted = waiter.wait(self.queue_timeout if timeout is None else timeout)
+        if not admitted:
+            with self._lock:
+                # The slot may have been handed over between the timeout and the lock
+                admitted = waiter.is_set()
+                if not admitted:
+                    self._waiters.remove(waiter)
+        return ('queued' if admitted else 'rejected_timeout'), time.perf_counter() - started
+
+    def release(self, service_seconds=None):
+        """Give the slot to the oldest waiter, or free it"""
+        with self._lock:
+            if service_seconds is not None:
+                self.service_seconds += SERVICE_TIME_WEIGHT * (service_seconds - self.service_seconds)
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying"""
+        with self._lock:
+            backlog = len(self._waiters) + 1
+        return max(1, math.ceil(backlog * self.service_seconds / self.concurrency))
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+
+class AdmissionControl:
+    """Apply the configured AdmissionLimit of each route around its requests"""
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'active': ('gauge', 'Requests running under admission control'),
+        'queued': ('gauge', 'Requests waiting for admission')
+    }
+
+    def __init__(self):
+        self.limits = {}
+
+    def init_app(self, app):
+        """Read the per-route limits from config.json and hook into app's requests"""
+        self.limits = {}
+        for route, settings in get_setting('admission', 'routes', {}).items():
+            self.limit(route, **settings)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def limit(self, route, concurrency, queue_size=0, queue_timeout_seconds=0.0):
+        """Limit route ("<METHOD> <rule>") and return its AdmissionLimit"""
+        method, _, rule = route.partition(' ')
+        limit = AdmissionLimit(concurrency, queue_size, queue_timeout_seconds)
+        self.limits[(rule, method.upper())] = limit
+        return limit
+
+    def arrived_at(self):
+        """Wall-clock time the current request arrived, before any queueing"""
+        return g.get('admission_arrived_at') or time.time()
+
+    def stats(self):
+        return {
+            'active': sum(limit.active for limit in self.limits.values()),
+            'queued': sum(limit.queued for limit in self.limits.values())
+        }
+
+    def _before_request(self):
+        if request.url_rule is None:
+            return None
+        key = (request.url_rule.rule, request.method)
+        limit = self.limits.get(key)
+        if limit is None:
+            return None
+
+        g.admission_arrived_at = time.time()
+        outcome, waited = limit.acquire()
+        metrics.record_admission(key, outcome, waited)
+        if outcome.startswith('rejected'):
+            response = jsonify({'error': 'Server is busy, please retry'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(limit.retry_after())
+            return response
+        g.admission_limit = limit
+        g.admission_started = time.perf_counter()
+        return None
+
+    def _teardown_request(self, exception=None):
+        limit = g.pop('admission_limit', None)
+        if limit is not None:
+            limit.release(time.perf_counter() - g.pop('admission_started'))
+
+
+admission = AdmissionControl()
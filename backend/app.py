@@ -1,20 +1,189 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, request, jsonify, abort, Response, stream_with_context
 from flask_cors import CORS
-from database import init_app, db
+from database import init_app, db, warm_pool
 from models import Quiz, Question, Option
+from scoring import answer_keys
+from attempts import attempt_writer, build_attempt_rows
+from http_cache import versions, not_modified, add_cache_headers, QUIZ_LIST
+from response_cache import response_cache, CachedBody
+from metrics import metrics
+from config import get_setting
+from validation import validate_question, validate_questions
+from importer import insert_questions
+from search import search, index_quizzes, index_questions
+from sessions import session_store
+from signing import signer
+from autosave import autosave
+from stats import quiz_stats, most_played
+from leaderboard import leaderboards
+from snapshot import snapshots, compile_snapshot
+from changes import quiz_changes
+from startup import readiness
+from admission import admission
+from sharding import shards
+from export import (
+    iter_results, render_csv, render_ndjson, gzip_stream, parse_cursor, parse_timestamp,
+    ATTEMPT_COLUMNS, ANSWER_COLUMNS
+)
+from migrations import upgrade_schema
+from sqlalchemy import func
+from urllib.parse import urlencode
+import heapq
+import itertools
 import json
 import os
+import secrets
+import time
 
 # --- App Initialization ---
-app = Flask(__name__)
-CORS(app)
+# Routes are registered on this blueprint; create_app() builds the app around it
+api = Blueprint('api', __name__)
 
-# --- Database Initialization ---
-init_app(app)
+# --- Instrumentation ---
+metrics.add_collector('quiz_attempt_writer_', attempt_writer.stats, attempt_writer.STATS)
+metrics.add_collector('quiz_response_cache_', response_cache.stats, response_cache.STATS)
+metrics.add_collector('quiz_answer_key_cache_', lambda: {'entries': len(answer_keys)},
+                      {'entries': ('gauge', 'Answer keys held in memory')})
+metrics.add_collector('quiz_sessions_', session_store.stats, session_store.STATS)
+metrics.add_collector('quiz_autosave_', autosave.stats, autosave.STATS)
+metrics.add_collector('quiz_leaderboards_', leaderboards.stats, leaderboards.STATS)
+metrics.add_collector('quiz_snapshot_', snapshots.stats, snapshots.STATS)
+metrics.add_collector('quiz_startup_', readiness.stats, readiness.STATS)
+metrics.add_collector('quiz_admission_', admission.stats, admission.STATS)
+metrics.add_collector('quiz_change_feed_', quiz_changes.stats, quiz_changes.STATS)
+
+# --- Quiz bank snapshot ---
+@snapshots.on_reload
+def snapshot_reloaded():
+    """The snapshot now serves every quiz: drop caches built from the previous one.
+
+    ETags stay valid, since both snapshots hold each quiz as of its updated_at.
+    """
+    answer_keys.clear()
+    response_cache.clear()
+
+# Upper bound on answer sheets accepted by one batch submission
+MAX_BATCH_SHEETS = 10000
+
+# Default and maximum page size of the quiz listing, and its selectable fields
+QUIZ_PAGE_SIZE = get_setting('quiz_settings', 'quiz_page_size', 100)
+MAX_QUIZ_PAGE_SIZE = get_setting('quiz_settings', 'max_quiz_page_size', 500)
+QUIZ_FIELDS = ('id', 'title')
+
+# Upper bound on questions accepted by one bulk or import request
+MAX_BULK_QUESTIONS = get_setting('quiz_settings', 'max_questions_per_request', 1000)
+
+# Default and maximum page size of search results
+SEARCH_PAGE_SIZE = get_setting('quiz_settings', 'search_page_size', 20)
+MAX_SEARCH_PAGE_SIZE = get_setting('quiz_settings', 'max_search_page_size', 100)
+SEARCH_KINDS = ('quiz', 'question')
+
+# Upper bound on the length of a shuffle seed
+MAX_SEED_LENGTH = 64
+
+# Fewest questions a scored draw may have (or the whole quiz, if smaller)
+MIN_DRAW_COUNT = get_setting('quiz_settings', 'min_draw_count', 5)
+
+# Time allowed between starting and submitting an attempt
+TIME_LIMIT_SECONDS = get_setting('quiz_settings', 'default_timer_minutes', 5) * 60
+
+# How long a drawToken from the questions endpoint can be submitted
+DRAW_TOKEN_SECONDS = get_setting('sessions', 'draw_token_seconds', 3600)
+
+# Default and maximum number of leaderboard entries returned
+LEADERBOARD_SIZE = get_setting('quiz_settings', 'leaderboard_size', 10)
+MAX_LEADERBOARD_SIZE = get_setting('quiz_settings', 'max_leaderboard_size', 100)
+
+# Answer keys built during warm-up, for the most played quizzes of each shard
+PRELOAD_ANSWER_KEYS = get_setting('startup', 'preload_answer_keys', 100)
+
+# --- Warm-up ---
+def preload_answer_keys():
+    """Build the answer keys of the current shard's most played quizzes before traffic arrives"""
+    for quiz_id in most_played(PRELOAD_ANSWER_KEYS):
+        answer_keys.get(quiz_id)
+
+def upgrade_shards():
+    """Bring every shard's schema up to date and check its quizzes belong there"""
+    shards.each(upgrade_schema)
+    shards.check_placement()
+
+readiness.add_step('schema', upgrade_shards)
+readiness.add_step('connection_pool', lambda: shards.each(lambda: warm_pool(get_setting('startup', 'warm_connections'))))
+def start_change_feed():
+    """Follow quiz changes from now on, starting from every quiz's current version"""
+    quiz_changes.start()
+    versions.load(quiz_changes.current())
+
+readiness.add_step('change_feed', start_change_feed)
+readiness.add_step('snapshot', snapshots.configure)
+readiness.add_step('answer_keys', lambda: shards.each(preload_answer_keys))
+
+def answers_to_dict(answers):
+    """Convert a list of {questionId, selectedOptionId} into a lookup dict, or None if it is malformed"""
+    if not isinstance(answers, list):
+        return None
+    result = {}
+    for answer in answers:
+        if not isinstance(answer, dict) or 'selectedOptionId' not in answer:
+            return None
+        # Ids must be ints: a list or object can't be looked up in the answer key
+        question_id, option_id = answer.get('questionId'), answer['selectedOptionId']
+        if not isinstance(question_id, int) or not (option_id is None or isinstance(option_id, int)):
+            return None
+        result[question_id] = option_id
+    return result
+
+def quiz_changed(quiz_id, updated_at, listing_changed=False):
+    """Invalidate every cache that depends on a quiz's content, changed at updated_at"""
+    snapshots.invalidate(quiz_id, updated_at)
+    answer_keys.invalidate(quiz_id)
+    response_cache.invalidate(('questions', quiz_id))
+    versions.bump(quiz_id, updated_at)
+    if listing_changed:
+        response_cache.invalidate_prefix(QUIZ_LIST)
+        versions.bump(QUIZ_LIST, updated_at)
+
+@quiz_changes.on_change
+def quizzes_changed_elsewhere(changed):
+    """Quizzes changed by any process (this one included): drop their cached copies"""
+    for quiz_id, updated_at in changed.items():
+        quiz_changed(quiz_id, updated_at, listing_changed=True)
+
+def cached_json_response(cache_key, version_key, build):
+    """Serve a pre-encoded JSON body from the response cache.
+
+    On a miss, build() produces the payload (or a (payload, headers)
+    tuple), which is encoded once and cached unless the content changed
+    while it was being built.
+    """
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        etag_before, _ = versions.get(version_key)
+        payload, headers = build(), None
+        if isinstance(payload, tuple):
+            payload, headers = payload
+        body = current_app.json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        if versions.get(version_key)[0] == etag_before:
+            entry = response_cache.put(cache_key, body, headers)
+        else:
+            entry = CachedBody(body, headers)
+    
+    body, encoding = entry.body, None
+    if 'gzip' in request.accept_encodings:
+        gzipped = response_cache.gzipped(cache_key, entry)
+        if gzipped is not None:
+            body, encoding = gzipped, 'gzip'
+    
+    response = Response(body, mimetype='application/json', headers=entry.headers)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return add_cache_headers(response, version_key, encoding)
 
 # --- API Routes ---
 
-@app.route('/api/quizzes', methods=['POST'])
+@api.route('/api/quizzes', methods=['POST'])
 def create_quiz():
     """Create a new quiz"""
     data = request.get_json()
@@ -22,50 +191,100 @@ def create_quiz():
         return jsonify({'error': 'Title is required'}), 400
     
     new_quiz = Quiz(title=data['title'])
+    shards.place_quiz(new_quiz)
     db.session.add(new_quiz)
+    db.session.flush()
+    index_quizzes([new_quiz.id])
+    updated_at = new_quiz.updated_at
     db.session.commit()
+    quiz_changed(new_quiz.id, updated_at, listing_changed=True)
     return jsonify({'id': new_quiz.id, 'title': new_quiz.title}), 201
 
-@app.route('/api/quizzes', methods=['GET'])
+@api.route('/api/quizzes', methods=['GET'])
 def get_quizzes():
-    """Get all available quizzes"""
+    """Get one page of available quizzes.
+
+    Query parameters: limit (page size), after (cursor: the last id of the
+    previous page), fields (comma-separated subset of id,title) and prefix
+    (title prefix filter). The body is a list of quizzes; when more remain,
+    the next page's URL is sent in the Link header and its cursor in
+    X-Next-Cursor.
+    """
+    try:
+        limit = int(request.args.get('limit', QUIZ_PAGE_SIZE))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and after must be integers'}), 400
+    if not 1 <= limit <= MAX_QUIZ_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_QUIZ_PAGE_SIZE}'}), 400
+    
+    fields = tuple(request.args.get('fields', 'id,title').split(','))
+    if not set(fields) <= set(QUIZ_FIELDS):
+        return jsonify({'error': f'fields must be a subset of {",".join(QUIZ_FIELDS)}'}), 400
+    prefix = request.args.get('prefix', '')
+    
+    cached = not_modified(QUIZ_LIST)
+    if cached:
+        return cached
+    
+    def read_page():
+        # Keyset pagination: seek past the cursor instead of OFFSET
+        columns = [getattr(Quiz, field) for field in QUIZ_FIELDS if field in fields or field == 'id']
+        query = db.session.query(*columns).filter(Quiz.id > after)
+        if prefix:
+            # A range on title can use its index, unlike LIKE 'prefix%'
+            query = query.filter(Quiz.title >= prefix, Quiz.title < prefix + '\U0010ffff')
+        return query.order_by(Quiz.id).limit(limit + 1).all()
+    
+    def build():
+        # Every shard returns its next page in id order; merging them gives the global page
+        pages = shards.each(read_page)
+        rows = list(itertools.islice(heapq.merge(*pages, key=lambda row: row.id), limit + 1))
+        
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+            next_args = dict(request.args, after=next_cursor, limit=limit)
+            headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+            headers['X-Next-Cursor'] = str(next_cursor)
+        
+        quizzes_list = [{field: getattr(row, field) for field in fields} for row in rows]
+        return quizzes_list, headers
+    
     try:
-        all_quizzes = Quiz.query.all()
-        quizzes_list = [{'id': quiz.id, 'title': quiz.title} for quiz in all_quizzes]
-        return jsonify(quizzes_list)
+        cache_key = (QUIZ_LIST, limit, after, fields, prefix)
+        return cached_json_response(cache_key, QUIZ_LIST, build)
     except Exception as e:
-        print(f"Error fetching quizzes: {e}")
+        current_app.logger.exception(f"Error fetching quizzes: {e}")
         return jsonify({'error': 'Failed to fetch quizzes'}), 500
 
-@app.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
+@api.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
 def get_quiz(quiz_id):
     """Get a specific quiz by ID"""
+    cached = not_modified(quiz_id)
+    if cached:
+        return cached
+    
     try:
         quiz = Quiz.query.get_or_404(quiz_id)
-        return jsonify({'id': quiz.id, 'title': quiz.title})
+        return add_cache_headers(jsonify({'id': quiz.id, 'title': quiz.title}), quiz_id)
     except Exception as e:
-        print(f"Error fetching quiz {quiz_id}: {e}")
+        current_app.logger.warning(f"Error fetching quiz {quiz_id}: {e}")
         return jsonify({'error': 'Quiz not found'}), 404
 
-@app.route('/api/quizzes/<int:quiz_id>/questions', methods=['POST'])
+@api.route('/api/quizzes/<int:quiz_id>/questions', methods=['POST'])
 def add_question_to_quiz(quiz_id):
     """Add a question to a quiz"""
     quiz = Quiz.query.get_or_404(quiz_id)
     data = request.get_json()
     
-    if not data or 'text' not in data or 'options' not in data:
-        return jsonify({'error': 'Missing text or options'}), 400
+    error = validate_question(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Validate question text length (300 character limit)
-    if len(data['text']) > 300:
-        return jsonify({'error': 'Question text must be 300 characters or less'}), 400
-    
-    # Validate that exactly one option is marked as correct
-    correct_options = [opt for opt in data['options'] if opt.get('is_correct', False)]
-    if len(correct_options) != 1:
-        return jsonify({'error': 'Exactly one option must be marked as correct'}), 400
-    
-    new_question = Question(text=data['text'], quiz_id=quiz.id)
+    last_position = db.session.query(func.max(Question.position)).filter_by(quiz_id=quiz.id).scalar()
+    new_question = Question(text=data['text'], quiz_id=quiz.id, position=(last_position or 0) + 1)
     for option_data in data['options']:
         new_option = Option(
             text=option_data['text'],
@@ -75,100 +294,567 @@ def add_question_to_quiz(quiz_id):
         db.session.add(new_option)
     
     db.session.add(new_question)
+    db.session.flush()
+    index_questions([new_question.id])
+    updated_at = quiz_changes.touch([quiz.id])
     db.session.commit()
+    quiz_changed(quiz.id, updated_at)
     
     return jsonify({
         'message': 'Question added successfully',
         'question_id': new_question.id
     }), 201
 
-@app.route('/api/quizzes/<int:quiz_id>/questions', methods=['GET'])
+def read_draw(source):
+    """Read the optional seed and count of a shuffled draw from query args or a JSON body.
+
+    Returns (seed, count, error); seed is None when no draw was requested.
+    """
+    seed = source.get('seed')
+    if seed is not None:
+        seed = str(seed)
+        if not seed or len(seed) > MAX_SEED_LENGTH:
+            return None, None, f'seed must be 1 to {MAX_SEED_LENGTH} characters'
+    count = source.get('count')
+    if count is not None:
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            return None, None, 'count must be an integer'
+        if count < 1:
+            return None, None, 'count must be at least 1'
+    return seed, count, None
+
+def draw_count_error(answer_key, count):
+    """Reject draws too small to be scored fairly; returns an error message or None"""
+    minimum = min(MIN_DRAW_COUNT, len(answer_key.questions))
+    if count is not None and count < minimum:
+        return f'count must be at least {minimum}'
+    return None
+
+def is_atomic(data):
+    """Whether a bulk request asked to be rejected entirely on any invalid item"""
+    return bool(data.get('atomic')) or request.args.get('atomic', 'false').lower() == 'true'
+
+def read_bulk_questions(data):
+    """Validate the questions of a bulk request; returns (valid, errors, error_response)"""
+    questions = data.get('questions') if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions:
+        return None, None, (jsonify({'error': 'Missing questions'}), 400)
+    if len(questions) > MAX_BULK_QUESTIONS:
+        return None, None, (jsonify({'error': f'At most {MAX_BULK_QUESTIONS} questions per request'}), 400)
+    
+    valid, errors = validate_questions(questions)
+    if errors and (is_atomic(data) or not valid):
+        return None, None, (jsonify({'error': 'Invalid questions', 'errors': errors}), 400)
+    return valid, errors, None
+
+@api.route('/api/quizzes/<int:quiz_id>/questions/bulk', methods=['POST'])
+def add_questions_bulk(quiz_id):
+    """Add many questions to a quiz in one transaction.
+
+    Invalid questions are reported per item and skipped, unless the request
+    is atomic ("atomic": true or ?atomic=true), in which case nothing is
+    written if any question is invalid.
+    """
+    quiz = Quiz.query.get_or_404(quiz_id)
+    valid, errors, error_response = read_bulk_questions(request.get_json(silent=True))
+    if error_response:
+        return error_response
+    
+    last_position = db.session.query(func.max(Question.position)).filter_by(quiz_id=quiz.id).scalar()
+    question_ids = insert_questions(quiz.id, valid, first_position=(last_position or 0) + 1)
+    updated_at = quiz_changes.touch([quiz.id])
+    db.session.commit()
+    quiz_changed(quiz.id, updated_at)
+    
+    return jsonify({
+        'message': f'{len(question_ids)} questions added successfully',
+        'question_ids': question_ids,
+        'errors': errors
+    }), 201
+
+@api.route('/api/quizzes/import', methods=['POST'])
+def import_quiz():
+    """Create a quiz together with all of its questions in one transaction"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('title'), str) or not data['title'].strip():
+        return jsonify({'error': 'Title is required'}), 400
+    if len(data['title']) > 100:
+        return jsonify({'error': 'Title must be 100 characters or less'}), 400
+    
+    valid, errors, error_response = read_bulk_questions(data)
+    if error_response:
+        return error_response
+    
+    new_quiz = Quiz(title=data['title'])
+    shards.place_quiz(new_quiz)
+    db.session.add(new_quiz)
+    db.session.flush()
+    index_quizzes([new_quiz.id])
+    question_ids = insert_questions(new_quiz.id, valid)
+    updated_at = new_quiz.updated_at
+    db.session.commit()
+    quiz_changed(new_quiz.id, updated_at, listing_changed=True)
+    
+    return jsonify({
+        'id': new_quiz.id,
+        'title': new_quiz.title,
+        'question_ids': question_ids,
+        'errors': errors
+    }), 201
+
+def search_shards(query, kind, quiz_id, limit, offset):
+    """Search the quiz's shard, or every shard merging their hits by score"""
+    if quiz_id is not None or shards.count == 1:
+        with shards.use(shards.shard_for(quiz_id or 1)):
+            return search(query, kind=kind, quiz_id=quiz_id, limit=limit, offset=offset)
+    pages = shards.each(lambda: search(query, kind=kind, limit=offset + limit))
+    hits = heapq.merge(*pages, key=lambda hit: -hit['score'])
+    return list(itertools.islice(hits, offset, offset + limit))
+
+@api.route('/api/search', methods=['GET'])
+def search_quizzes():
+    """Full-text search over quiz titles, question texts and option texts.
+
+    Query parameters: q (words to match, the last one as a prefix), kind
+    (quiz or question), quiz_id, limit and offset. Results are ranked best
+    match first; nextOffset is null on the last page.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = int(request.args.get('limit', SEARCH_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+        quiz_id = int(request.args['quiz_id']) if 'quiz_id' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'limit, offset and quiz_id must be integers'}), 400
+    if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE or offset < 0:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SEARCH_PAGE_SIZE} and offset not negative'}), 400
+    kind = request.args.get('kind')
+    if kind is not None and kind not in SEARCH_KINDS:
+        return jsonify({'error': f'kind must be one of {",".join(SEARCH_KINDS)}'}), 400
+    
+    hits = search_shards(query, kind, quiz_id, limit + 1, offset)
+    return jsonify({
+        'results': hits[:limit],
+        'nextOffset': offset + limit if len(hits) > limit else None
+    })
+
+@api.route('/api/quizzes/<int:quiz_id>/questions', methods=['GET'])
 def get_questions_for_quiz(quiz_id):
-    """Get all questions for a specific quiz (without correct answers)"""
+    """Get all questions for a specific quiz (without correct answers).
+
+    With ?seed=<seed> the questions and their options are shuffled for one
+    attempt, and ?count=N draws N of the quiz's questions. ?shuffle=true
+    (or a count without a seed) has the server pick the seed, returned in
+    X-Quiz-Seed. Unless attempt tokens are required, the draw is also
+    signed into X-Quiz-Draw, a single-use token that expires after
+    sessions.draw_token_seconds; a submission sends that drawToken to be
+    scored against the questions that were served. Draws with a
+    client-chosen seed are for display only, since choosing the seed would
+    let a client pick its questions.
+    """
+    if 'seed' in request.args or 'count' in request.args or request.args.get('shuffle') == 'true':
+        return get_drawn_questions(quiz_id)
+    
+    cached = not_modified(quiz_id)
+    if cached:
+        return cached
+    
+    def build():
+        # Built from the answer key, which comes from the snapshot when one
+        # is mapped (otherwise one eager-loading query) and stays cached for
+        # scoring. public_questions() leaves out the correct answers.
+        answer_key = answer_keys.get(quiz_id)
+        if answer_key is None:
+            abort(404)
+        return answer_key.public_questions()
+    
     try:
-        quiz = Quiz.query.get_or_404(quiz_id)
-        questions_list = []
-        
-        for question in quiz.questions:
-            options_list = []
-            for option in question.options:
-                # Don't send is_correct to frontend
-                options_list.append({
-                    'id': option.id,
-                    'text': option.text
-                })
-            
-            questions_list.append({
-                'id': question.id,
-                'text': question.text,
-                'options': options_list
-            })
-        
-        return jsonify(questions_list)
+        return cached_json_response(('questions', quiz_id), quiz_id, build)
     except Exception as e:
-        print(f"Error fetching questions for quiz {quiz_id}: {e}")
+        current_app.logger.exception(f"Error fetching questions for quiz {quiz_id}: {e}")
         return jsonify({'error': 'Failed to fetch questions'}), 500
 
-@app.route('/api/quizzes/<int:quiz_id>/submit', methods=['POST'])
+def get_drawn_questions(quiz_id):
+    """Serve one attempt's draw, built from the cached answer key"""
+    seed, count, error = read_draw(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    random_seed = seed is None
+    if random_seed:
+        seed = secrets.token_hex(8)
+    
+    answer_key = answer_keys.get(quiz_id)
+    if answer_key is None:
+        abort(404)
+    error = draw_count_error(answer_key, count)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    response = jsonify(answer_key.draw(seed, count).public_questions())
+    response.headers['X-Quiz-Seed'] = seed
+    if random_seed and not current_app.config['REQUIRE_ATTEMPT_TOKEN']:
+        # The session makes the token single-use (in every worker sharing the store) and expire
+        session = session_store.start(quiz_id, seed, count, DRAW_TOKEN_SECONDS)
+        response.headers['X-Quiz-Draw'] = signer.sign({
+            'quizId': quiz_id, 'seed': seed, 'count': count, 'nonce': session.token, 'expires': session.deadline
+        })
+        response.headers['Cache-Control'] = 'no-store'
+    elif random_seed:
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@api.route('/api/quizzes/<int:quiz_id>/start', methods=['POST'])
+def start_quiz(quiz_id):
+    """Start a timed attempt.
+
+    Returns an attempt token, the server-side deadline (Unix time) and the
+    attempt's shuffled questions (``count`` in the body draws a subset).
+    The token must be sent with the submission, which is rejected once
+    the deadline plus a short grace period has passed.
+    """
+    data = request.get_json(silent=True) or {}
+    _, count, error = read_draw({'count': data.get('count')})
+    if error:
+        return jsonify({'error': error}), 400
+    
+    answer_key = answer_keys.get(quiz_id)
+    if answer_key is None:
+        abort(404)
+    error = draw_count_error(answer_key, count)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    session = session_store.start(quiz_id, secrets.token_hex(8), count, TIME_LIMIT_SECONDS)
+    return jsonify({
+        'attemptToken': session.token,
+        'quizId': quiz_id,
+        'seed': session.seed,
+        'count': session.count,
+        'deadline': session.deadline,
+        'timeLimitSeconds': TIME_LIMIT_SECONDS,
+        'questions': answer_key.draw(session.seed, session.count).public_questions()
+    }), 201
+
+@api.route('/api/quizzes/<int:quiz_id>/submit', methods=['POST'])
 def submit_quiz(quiz_id):
-    """Submit quiz answers and calculate score"""
-    quiz = Quiz.query.get_or_404(quiz_id)
+    """Submit quiz answers and calculate score.
+
+    With an attemptToken from /start the deadline is enforced and the
+    attempt is scored against the questions it was served, starting from
+    its autosaved answers (answers in the body override them); otherwise
+    an optional drawToken from the questions endpoint selects the draw to
+    score.
+    """
+    answer_key = answer_keys.get(quiz_id)
+    if answer_key is None:
+        abort(404)
     data = request.get_json()
     
-    if not data or 'answers' not in data:
+    token = data.get('attemptToken') if isinstance(data, dict) else None
+    if not data or ('answers' not in data and token is None):
         return jsonify({'error': 'Missing answers'}), 400
+    submitted = answers_to_dict(data.get('answers', []))
+    if submitted is None:
+        return jsonify({'error': 'Invalid answers'}), 400
     
-    user_answers = {
-        answer['questionId']: answer['selectedOptionId'] 
-        for answer in data['answers']
-    }
+    attempt_id = None
+    user_answers = {}
+    if token is not None:
+        session = session_store.get(token) if isinstance(token, str) else None
+        if session is None or session.quiz_id != quiz_id:
+            return jsonify({'error': 'Unknown, expired or already submitted attempt'}), 410
+        if session_store.finish(token) is None:
+            return jsonify({'error': 'Attempt already submitted'}), 409
+        # Judged by arrival, so time spent queued by admission control doesn't count
+        if admission.arrived_at() > session.deadline + session_store.grace:
+            return jsonify({'error': 'Time limit exceeded'}), 403
+        attempt_id = session.token
+        answer_key = answer_key.draw(session.seed, session.count)
+        user_answers = autosave.answers(token)
+        autosave.discard(token)
+    elif current_app.config['REQUIRE_ATTEMPT_TOKEN']:
+        return jsonify({'error': 'attemptToken is required'}), 400
+    elif 'drawToken' in data:
+        # Score a shuffled attempt against exactly the questions the server drew
+        draw = signer.unsign(data['drawToken'])
+        if not isinstance(draw, dict) or draw.get('quizId') != quiz_id or not isinstance(draw.get('nonce'), str) \
+                or not isinstance(draw.get('expires'), (int, float)):
+            return jsonify({'error': 'Invalid drawToken'}), 400
+        if admission.arrived_at() > draw['expires'] + session_store.grace:
+            return jsonify({'error': 'drawToken expired'}), 410
+        session = session_store.finish(draw['nonce'])
+        if session is None or session.quiz_id != quiz_id:
+            return jsonify({'error': 'drawToken already submitted or expired'}), 409
+        answer_key = answer_key.draw(session.seed, session.count)
+    elif 'seed' in data or 'count' in data:
+        return jsonify({'error': 'Send the drawToken the questions were served with instead of seed and count'}), 400
     
-    score = 0
-    results = []
-    questions = quiz.questions
+    user_answers.update(submitted)
+    result = answer_key.score(user_answers)
     
-    for question in questions:
-        correct_option = next(
-            (opt for opt in question.options if opt.is_correct),
-            None
-        )
-        user_answer_id = user_answers.get(question.id)
-        
-        is_correct = False
-        if correct_option and user_answer_id == correct_option.id:
-            score += 1
-            is_correct = True
-        
-        # Find the text of the user's answer and the correct answer
-        user_answer_text = next(
-            (opt.text for opt in question.options if opt.id == user_answer_id),
-            "Not Answered"
-        )
-        correct_answer_text = correct_option.text if correct_option else "N/A"
-        
-        results.append({
-            'questionId': question.id,
-            'questionText': question.text,
-            'userAnswer': user_answer_text,
-            'correctAnswer': correct_answer_text,
-            'isCorrect': is_correct
-        })
+    # Persist the attempt in the background so the response doesn't wait on a commit
+    participant = data.get('participant')
+    if not isinstance(participant, str):
+        participant = None
+    attempt, answers = build_attempt_rows(
+        answer_key, user_answers, result, participant and participant[:100], attempt_id
+    )
+    attempt_writer.submit(attempt, answers)
+    result['attemptId'] = attempt['id']
+    result['rank'] = leaderboards.record(attempt)
+    
+    return jsonify(result)
+
+def active_session(attempt_id):
+    """Return (session, error_response) for an attempt that can still be answered"""
+    session = session_store.get(attempt_id)
+    if session is None:
+        return None, (jsonify({'error': 'Unknown, expired or already submitted attempt'}), 410)
+    shards.route(session.quiz_id)
+    if time.time() > session.deadline + session_store.grace:
+        return None, (jsonify({'error': 'Time limit exceeded'}), 403)
+    return session, None
+
+@api.route('/api/attempts/<attempt_id>/answers', methods=['PATCH'])
+def autosave_answers(attempt_id):
+    """Autosave some answers of a started attempt.
+
+    Request body: {"answers": [{"questionId": ..., "selectedOptionId": ...}]};
+    a null selectedOptionId clears the answer. Saves are buffered and
+    written in batches, and the submission is scored from the saved state.
+    """
+    session, error_response = active_session(attempt_id)
+    if error_response:
+        return error_response
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('answers'), list):
+        return jsonify({'error': 'Missing answers'}), 400
     
+    answer_key = answer_keys.get(session.quiz_id)
+    answers = {}
+    for item in data['answers']:
+        # Ids are checked to be ints first: a list or object can't be looked up in the key
+        question_id = item.get('questionId') if isinstance(item, dict) else None
+        if not isinstance(question_id, int) or question_id not in answer_key.questions:
+            return jsonify({'error': 'Unknown question'}), 400
+        option_id = item.get('selectedOptionId')
+        if option_id is not None and (not isinstance(option_id, int)
+                                      or option_id not in answer_key.questions[question_id][2]):
+            return jsonify({'error': 'Unknown option'}), 400
+        answers[question_id] = option_id
+    
+    autosave.save(attempt_id, answers)
+    return jsonify({'attemptId': attempt_id, 'saved': len(answers)}), 202
+
+@api.route('/api/attempts/<attempt_id>', methods=['GET'])
+def resume_attempt(attempt_id):
+    """Return a started attempt's questions, deadline and saved answers (e.g. after a reload)"""
+    session, error_response = active_session(attempt_id)
+    if error_response:
+        return error_response
+    answer_key = answer_keys.get(session.quiz_id)
+    if answer_key is None:
+        abort(404)
+    
+    saved = autosave.answers(attempt_id)
     return jsonify({
-        'score': score,
-        'total': len(questions),
-        'percentage': round((score / len(questions) * 100), 2) if len(questions) > 0 else 0,
-        'results': results
+        'attemptToken': attempt_id,
+        'quizId': session.quiz_id,
+        'deadline': session.deadline,
+        'questions': answer_key.draw(session.seed, session.count).public_questions(),
+        'answers': [
+            {'questionId': question_id, 'selectedOptionId': option_id}
+            for question_id, option_id in saved.items() if option_id is not None
+        ]
     })
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/quizzes/<int:quiz_id>/submit/batch', methods=['POST'])
+def submit_quiz_batch(quiz_id):
+    """Score many answer sheets against one answer key.
+
+    Request body: {"sheets": [{"id": ..., "answers": [...]}, ...]}. Each
+    result carries the sheet's index and optional id. Per-question details
+    are included only with ?details=true. Results are streamed as NDJSON
+    when the client asks for application/x-ndjson or passes ?format=ndjson.
+    """
+    answer_key = answer_keys.get(quiz_id)
+    if answer_key is None:
+        abort(404)
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('sheets'), list):
+        return jsonify({'error': 'Missing sheets'}), 400
+    
+    sheets = data['sheets']
+    if len(sheets) > MAX_BATCH_SHEETS:
+        return jsonify({'error': f'At most {MAX_BATCH_SHEETS} sheets per batch'}), 400
+    
+    details = request.args.get('details', 'false').lower() == 'true'
+    score = answer_key.score if details else answer_key.score_summary
+    
+    def score_sheets():
+        for index, sheet in enumerate(sheets):
+            result = {'sheet': index}
+            if isinstance(sheet, dict) and 'id' in sheet:
+                result['id'] = sheet['id']
+            answers = answers_to_dict(sheet.get('answers')) if isinstance(sheet, dict) else None
+            if answers is None:
+                result['error'] = 'Invalid answers'
+            else:
+                result.update(score(answers))
+            yield result
+    
+    wants_ndjson = (
+        request.args.get('format') == 'ndjson'
+        or request.accept_mimetypes.best == 'application/x-ndjson'
+    )
+    if wants_ndjson:
+        lines = (json.dumps(result) + '\n' for result in score_sheets())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    return jsonify({'quizId': quiz_id, 'count': len(sheets), 'results': list(score_sheets())})
+
+@api.route('/api/quizzes/<int:quiz_id>/stats', methods=['GET'])
+def get_quiz_stats(quiz_id):
+    """Attempt count, average score, score histogram and per-question and per-option counts.
+
+    Read from counters maintained by the attempt writer, so submissions
+    show up once their batch has been written.
+    """
+    answer_key = answer_keys.get(quiz_id)
+    if answer_key is None:
+        abort(404)
+    return jsonify(quiz_stats(answer_key))
+
+@api.route('/api/quizzes/<int:quiz_id>/leaderboard', methods=['GET'])
+def get_leaderboard(quiz_id):
+    """Best attempts of a quiz (?limit=), and with ?attempt=<id> that attempt's rank.
+
+    Higher scores rank first and earlier submissions win ties in order;
+    equal scores share a rank.
+    """
+    try:
+        limit = int(request.args.get('limit', LEADERBOARD_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= MAX_LEADERBOARD_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_LEADERBOARD_SIZE}'}), 400
+    if answer_keys.get(quiz_id) is None:
+        abort(404)
+    
+    top, attempts, entry = leaderboards.top(quiz_id, limit, request.args.get('attempt'))
+    body = {'quizId': quiz_id, 'attempts': attempts, 'top': top}
+    if 'attempt' in request.args:
+        body['you'] = entry
+    return jsonify(body)
+
+@api.route('/api/quizzes/<int:quiz_id>/results/export', methods=['GET'])
+def export_results(quiz_id):
+    """Stream a quiz's results as CSV or NDJSON.
+
+    Query parameters: format (csv or ndjson), rows (attempts, or answers
+    for one row per answer), since and until (ISO 8601 submission-time
+    range) and after ("<submittedAt>,<attemptId>" of the last attempt
+    received, to resume an interrupted export). Rows are streamed from a
+    server-side cursor in submission order and gzip-compressed on the fly
+    when the client accepts it.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    rows = request.args.get('rows', 'attempts')
+    if rows not in ('attempts', 'answers'):
+        return jsonify({'error': 'rows must be attempts or answers'}), 400
+    try:
+        since = parse_timestamp(request.args['since']) if 'since' in request.args else None
+        until = parse_timestamp(request.args['until']) if 'until' in request.args else None
+        after = parse_cursor(request.args['after']) if 'after' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid since, until or after: {e}'}), 400
+    if answer_keys.get(quiz_id) is None:
+        abort(404)
+    
+    # Attempts still in the write-behind queue belong in the export
+    attempt_writer.flush()
+    
+    columns = ANSWER_COLUMNS if rows == 'answers' else ATTEMPT_COLUMNS
+    render = render_csv if export_format == 'csv' else render_ndjson
+    body = render(iter_results(quiz_id, rows == 'answers', since, until, after), columns)
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename="quiz-{quiz_id}-{rows}.{export_format}"',
+        'Vary': 'Accept-Encoding'
+    }
+    if 'gzip' in request.accept_encodings:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+@api.route('/api/admin/snapshot', methods=['POST'])
+def rebuild_snapshot():
+    """Compile the quiz bank into a new snapshot and map it in this worker.
+
+    Other workers pick the new file up within snapshot.check_interval_seconds.
+    """
+    result = compile_snapshot(snapshots.path)
+    snapshots.configure(snapshots.path)
+    snapshot_reloaded()
+    return jsonify(result), 201
+
+@api.route('/api/health', methods=['GET'])
+@readiness.exempt
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Quiz API is running'}), 200
+    """Health check endpoint; 503 until the worker has warmed up"""
+    if not readiness.ready:
+        return jsonify({'status': 'starting', 'message': 'Quiz API is warming up',
+                        'startup': readiness.status()}), 503
+    return jsonify({'status': 'healthy', 'message': 'Quiz API is running',
+                    'startup': readiness.status()}), 200
+
+@api.route('/api/metrics', methods=['GET'])
+@readiness.exempt
+def get_metrics():
+    """Expose request, SQL and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def create_app():
+    """Build the Flask app without touching the database.
+
+    Engines (one per shard) are created but not connected. The schema
+    upgrade and cache warm-up run in the readiness phase (startup.py),
+    which the ASGI server starts with each worker and which otherwise
+    starts on the first request. The caches and writers are process-wide
+    singletons, so a process serves one app.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    # Submissions must come from /start, so the deadline always applies
+    app.config['REQUIRE_ATTEMPT_TOKEN'] = get_setting('sessions', 'require_token', True)
+
+    init_app(app)
+    attempt_writer.init_app(app)
+    autosave.init_app(app)
+    response_cache.configure()
+    versions.configure()
+    with app.app_context():
+        metrics.init_app(app, db.engine)
+    shards.init_app(app)
+    readiness.init_app(app)
+    admission.init_app(app)
+    app.before_request(snapshots.refresh)
+    quiz_changes.init_app(app)
+    leaderboards.init_app(app)
+
+    app.register_blueprint(api)
+    return app
 
-# Create database tables when app starts
-with app.app_context():
-    db.create_all()
+app = create_app()
 
 if __name__ == '__main__':
+    readiness.run()
     app.run(debug=True, host='0.0.0.0', port=5000)
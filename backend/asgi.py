@@ -0,0 +1,22 @@
+"""ASGI entry point for production serving.
+
+The Flask app is mounted behind an ASGI server (uvicorn) through a2wsgi,
+which runs the synchronous handlers on a bounded thread pool while the
+server's event loop handles connections, keep-alive and slow clients.
+Start it with ``python serve.py`` or ``uvicorn asgi:application``.
+
+When the server starts a worker (the ASGI lifespan startup), the app's
+warm-up begins in the background; ``/api/health`` reports ready once it
+is done.
+"""
+from a2wsgi import WSGIMiddleware
+from app import app
+from config import get_setting
+from startup import readiness
+
+wsgi_application = WSGIMiddleware(app, workers=get_setting('server', 'threads', 32))
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        readiness.start()
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,256 @@
+import atexit
+import itertools
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from sortedcontainers import SortedList
+from sqlalchemy import insert
+from config import get_setting
+from database import db
+from models import Attempt, Answer
+from sharding import shards
+from stats import record_attempts
+
+
+def build_attempt_rows(answer_key, user_answers, result, participant=None, attempt_id=None):
+    """Build the attempt row and its answer rows for a scored submission"""
+    attempt = {
+        'id': attempt_id or uuid.uuid4().hex,
+        'quiz_id': answer_key.quiz_id,
+        'participant': participant,
+        'score': result['score'],
+        'total': result['total'],
+        'submitted_at': datetime.now(timezone.utc)
+    }
+
+    answers = []
+    for question_id, (_, correct_option_id, option_texts) in answer_key.questions.items():
+        selected_option_id = user_answers.get(question_id)
+        if not isinstance(selected_option_id, int) or selected_option_id not in option_texts:
+            selected_option_id = None
+        answers.append({
+            'attempt_id': attempt['id'],
+            'question_id': question_id,
+            'selected_option_id': selected_option_id,
+            'is_correct': selected_option_id is not None and selected_option_id == correct_option_id
+        })
+    return attempt, answers
+
+
+class AttemptWriter:
+    """Write-behind queue that persists attempts off the request path.
+
+    Submissions are queued and a background thread inserts them in
+    multi-row transactions, flushing whenever ``batch_size`` attempts are
+    pending or ``flush_interval`` seconds have passed. Pending attempts are
+    drained on interpreter shutdown. When the queue is full the caller
+    writes synchronously instead of dropping the attempt. Each batch also
+    updates the quiz statistics counters in the same transaction. A batch
+    that fails is retried ``write_retries`` times with a growing delay,
+    then written one attempt at a time, so only attempts that cannot be
+    written on their own are dropped (and logged). Queued attempts carry
+    a sequence number, so flush() waits only for what was queued before it
+    was called, however busy the queue stays.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'queue_depth': ('gauge', 'Attempts waiting in the write queue'),
+        'enqueued': ('counter', 'Attempts queued for the background writer'),
+        'written': ('counter', 'Attempts written to the database'),
+        'retries': ('counter', 'Retries of attempt batches that failed to write'),
+        'failed': ('counter', 'Attempts dropped because they could not be written'),
+        'flushes': ('counter', 'Attempt batches written'),
+        'last_flush_seconds': ('gauge', 'Duration of the latest attempt batch write'),
+        'max_flush_seconds': ('gauge', 'Longest attempt batch write'),
+        'flush_seconds': ('counter', 'Time spent writing attempt batches')
+    }
+
+    def __init__(self, batch_size=500, flush_interval=0.5, max_queue_size=100000, write_retries=3,
+                 retry_delay=0.1):
+        self.app = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_retries = write_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._sequence = itertools.count(1)
+        self._last_sequence = 0
+        self._unwritten = SortedList()
+        self._written = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.retries = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.flush_seconds = 0.0
+
+    def init_app(self, app):
+        """Bind the writer to a Flask app and read its settings from config.json"""
+        self.app = app
+        self.batch_size = get_setting('attempts', 'write_batch_size', self.batch_size)
+        self.flush_interval = get_setting('attempts', 'flush_interval_seconds', self.flush_interval)
+        self._queue.maxsize = get_setting('attempts', 'max_queue_size', self._queue.maxsize)
+        self.write_retries = get_setting('attempts', 'write_retries', self.write_retries)
+        self.retry_delay = get_setting('attempts', 'retry_delay_seconds', self.retry_delay)
+        atexit.register(self.stop)
+
+    def submit(self, attempt, answers):
+        """Queue one attempt (and its answer rows) for persistence"""
+        self._ensure_started()
+        with self._written:
+            sequence = self._last_sequence = next(self._sequence)
+            self._unwritten.add(sequence)
+        try:
+            self._queue.put_nowait((sequence, (attempt, answers)))
+            self.enqueued += 1
+            if self._queue.qsize() >= self.batch_size:
+                self._wake.set()
+        except queue.Full:
+            self._write_queued([(sequence, (attempt, answers))])
+
+    def flush(self):
+        """Write everything queued before the call and wait for in-flight batches holding it"""
+        with self._written:
+            target = self._last_sequence
+        self._wake.set()
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item[0] >= target:
+                break
+        if batch:
+            self._write_queued(batch)
+        with self._written:
+            self._written.wait_for(lambda: not self._unwritten or self._unwritten[0] > target)
+
+    def stop(self):
+        """Stop the background thread after draining the queue"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        """Return counters describing the queue and recent flushes"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'retries': self.retries,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds,
+            'max_flush_seconds': self.max_flush_seconds,
+            'flush_seconds': self.flush_seconds
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='attempt-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            # Collect more rows until the batch is full, the interval runs
+            # out, or flush()/submit() wakes us up.
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._wake.wait(remaining):
+                    break
+            self._wake.clear()
+            self._write_queued(batch)
+
+    def _write_queued(self, batch):
+        """Write (sequence, item) pairs and mark them written, even if some were dropped"""
+        try:
+            self._write([item for _, item in batch])
+        finally:
+            with self._written:
+                for sequence, _ in batch:
+                    self._unwritten.remove(sequence)
+                self._written.notify_all()
+
+    def _write(self, batch):
+        """Insert a batch of attempts and their answers, one transaction per shard"""
+        started = time.perf_counter()
+        with self._write_lock, self.app.app_context():
+            for shard, shard_batch in shards.partition(batch, lambda item: item[0]['quiz_id']).items():
+                with shards.use(shard):
+                    self._write_shard(shard_batch)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.flush_seconds += elapsed
+
+    def _write_shard(self, batch):
+        for retry in range(self.write_retries + 1):
+            if retry:
+                time.sleep(self.retry_delay * 2 ** (retry - 1))
+                self.retries += 1
+            try:
+                self._insert(batch)
+                return
+            except Exception:
+                db.session.rollback()
+                self.app.logger.warning('Error writing %d attempts (try %d of %d)', len(batch), retry + 1,
+                                        self.write_retries + 1, exc_info=True)
+
+        if len(batch) == 1:
+            self.failed += 1
+            self.app.logger.error('Dropping attempt %s that could not be written', batch[0][0]['id'])
+            return
+        # Keep the rest of the batch if only some attempts can't be written
+        for item in batch:
+            try:
+                self._insert([item])
+            except Exception:
+                db.session.rollback()
+                self.failed += 1
+                self.app.logger.exception('Dropping attempt %s that could not be written', item[0]['id'])
+
+    def _insert(self, batch):
+        attempts = [attempt for attempt, _ in batch]
+        answers = [answer for _, attempt_answers in batch for answer in attempt_answers]
+        db.session.execute(insert(Attempt), attempts)
+        if answers:
+            db.session.execute(insert(Answer), answers)
+        record_attempts(batch)
+        db.session.commit()
+        self.written += len(attempts)
+
+
+attempt_writer = AttemptWriter()
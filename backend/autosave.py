@@ -0,0 +1,277 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, insert, select, tuple_
+from config import get_setting
+from database import db, upsert_insert
+from models import SavedAnswer
+from sessions import session_store
+from sharding import shards
+
+# Minimum seconds between purges of stale drafts
+PURGE_INTERVAL = 60
+
+
+class AutosaveBuffer:
+    """Coalesce autosaved answers in memory and write them in batches.
+
+    save() only updates a dict of pending answers per attempt, so repeated
+    saves of the same question between two flushes cost one row write. A
+    background thread upserts everything pending every ``flush_interval``
+    seconds (sooner once ``max_pending`` answers are waiting), deletes the
+    drafts of submitted attempts and purges drafts older than ``retention``
+    seconds, in one transaction per shard (an attempt's shard is the one
+    its saving request was routed to). Reads merge the database with what
+    is still pending or being written, so callers always see the latest
+    save. A shard whose write fails gets its answers back in the pending
+    dict, unless they were saved again or discarded meanwhile, and they
+    are retried by the next flush.
+
+    Pending answers live only in the memory of the worker that took the
+    save. A submission routed to another worker within ``flush_interval``
+    of the last save is scored without them, and the saving worker never
+    learns of that submission; so a flush skips attempts whose session is
+    gone (submitted, or swept after its deadline) instead of writing
+    drafts nobody can submit. A submission that lands between that check
+    and the commit still leaves drafts behind until the purge.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'pending_attempts': ('gauge', 'Attempts with answers waiting to be written'),
+        'pending_answers': ('gauge', 'Autosaved answers waiting to be written'),
+        'saves': ('counter', 'Autosave requests buffered'),
+        'written': ('counter', 'Autosaved answers written to the database'),
+        'failed': ('counter', 'Autosaved answer writes that failed (and were requeued)'),
+        'dropped': ('counter', 'Autosaved answers not written because their attempt was already closed'),
+        'flushes': ('counter', 'Autosave buffer flushes'),
+        'last_flush_seconds': ('gauge', 'Duration of the latest autosave flush')
+    }
+
+    def __init__(self, flush_interval=2.0, max_pending=50000, retention=86400):
+        self.app = None
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention = retention
+        self._pending = {}
+        self._pending_count = 0
+        self._writing = {}
+        self._flushed = 0
+        self._discarded = {}
+        self._shard_of = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_purge = 0.0
+
+        self.saves = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def init_app(self, app):
+        """Bind the buffer to a Flask app and read its settings from config.json"""
+        self.app = app
+        self.flush_interval = get_setting('autosave', 'flush_interval_seconds', self.flush_interval)
+        self.max_pending = get_setting('autosave', 'max_pending_answers', self.max_pending)
+        self.retention = get_setting('autosave', 'retention_seconds', self.retention)
+        atexit.register(self.stop)
+
+    def save(self, attempt_id, answers):
+        """Record {question_id: selected_option_id} for an attempt; the last save of a question wins"""
+        self._ensure_started()
+        with self._lock:
+            pending = self._pending.setdefault(attempt_id, {})
+            before = len(pending)
+            pending.update(answers)
+            self._pending_count += len(pending) - before
+            self._shard_of[attempt_id] = shards.current()
+            self._discarded.pop(attempt_id, None)
+            self.saves += 1
+            full = self._pending_count >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def answers(self, attempt_id):
+        """Return the saved {question_id: selected_option_id} of an attempt"""
+        while True:
+            with self._lock:
+                flushed = self._flushed
+            saved = dict(self._read(attempt_id))
+            with self._lock:
+                # A flush that finished during the read may have committed
+                # answers the read missed after they left the in-flight dict
+                if self._flushed == flushed:
+                    saved.update(self._writing.get(attempt_id, {}))
+                    saved.update(self._pending.get(attempt_id, {}))
+                    return saved
+
+    @staticmethod
+    def _read(attempt_id):
+        # Its own connection, so a retry sees the rows the flush committed
+        with db.session.get_bind().connect() as connection:
+            return connection.execute(
+                select(SavedAnswer.question_id, SavedAnswer.selected_option_id)
+                .where(SavedAnswer.attempt_id == attempt_id)
+            ).all()
+
+    def discard(self, attempt_id):
+        """Forget an attempt's draft once it has been submitted"""
+        with self._lock:
+            self._pending_count -= len(self._pending.pop(attempt_id, {}))
+            self._shard_of.pop(attempt_id, None)
+            self._discarded[attempt_id] = shards.current()
+
+    def flush(self):
+        """Write everything pending now"""
+        self._write()
+
+    def stop(self):
+        """Stop the background thread after a final flush"""
+        if self._thread is None:
+            # Nothing was saved by this process
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def stats(self):
+        """Return counters describing the buffer and recent flushes"""
+        return {
+            'pending_attempts': len(self._pending),
+            'pending_answers': self._pending_count,
+            'saves': self.saves,
+            'written': self.written,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='autosave-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._stop.is_set():
+                self._write()
+
+    def _write(self):
+        """Upsert pending answers and delete discarded drafts, one transaction per shard"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending, self._pending_count = self._pending, {}, 0
+                self._writing = pending
+                discarded, self._discarded = self._discarded, {}
+                shard_of = {attempt_id: self._shard_of.pop(attempt_id, 0) for attempt_id in pending}
+            # Submitted (perhaps by another worker) or expired: the drafts could never be read
+            for attempt_id in [attempt_id for attempt_id in pending if session_store.get(attempt_id) is None]:
+                self.dropped += len(pending.pop(attempt_id))
+            purge = time.monotonic() - self._last_purge >= PURGE_INTERVAL
+            if not pending and not discarded and not purge:
+                return
+
+            started = time.perf_counter()
+            now = datetime.now(timezone.utc)
+            rows = {}
+            for attempt_id, answers in pending.items():
+                rows.setdefault(shard_of[attempt_id], []).extend(
+                    {'attempt_id': attempt_id, 'question_id': question_id,
+                     'selected_option_id': option_id, 'saved_at': now}
+                    for question_id, option_id in answers.items()
+                )
+            deletes = {}
+            for attempt_id, shard in discarded.items():
+                deletes.setdefault(shard, []).append(attempt_id)
+
+            failed = []
+            with self.app.app_context():
+                for shard in range(shards.count):
+                    if purge or shard in rows or shard in deletes:
+                        with shards.use(shard):
+                            if not self._write_shard(rows.get(shard, []), deletes.get(shard), purge, now):
+                                failed.append(shard)
+            with self._lock:
+                for shard in failed:
+                    self._requeue(shard, rows.get(shard, []), deletes.get(shard, []))
+                self._writing = {}
+                self._flushed += 1
+            if purge:
+                self._last_purge = time.monotonic()
+
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - started
+
+    def _write_shard(self, rows, discarded, purge, now):
+        try:
+            if rows:
+                self._upsert(rows)
+            if discarded:
+                db.session.execute(delete(SavedAnswer).where(SavedAnswer.attempt_id.in_(discarded)))
+            if purge:
+                # Drafts of attempts that were never submitted
+                db.session.execute(
+                    delete(SavedAnswer).where(SavedAnswer.saved_at < now - timedelta(seconds=self.retention))
+                )
+            db.session.commit()
+            self.written += len(rows)
+            return True
+        except Exception:
+            db.session.rollback()
+            self.failed += len(rows)
+            self.app.logger.exception('Error writing %d autosaved answers; they will be retried', len(rows))
+            return False
+
+    def _requeue(self, shard, rows, discarded):
+        """Put a failed shard's work back for the next flush; call with _lock held"""
+        for row in rows:
+            attempt_id = row['attempt_id']
+            if attempt_id in self._discarded:
+                continue
+            pending = self._pending.setdefault(attempt_id, {})
+            if row['question_id'] not in pending:
+                pending[row['question_id']] = row['selected_option_id']
+                self._pending_count += 1
+            self._shard_of.setdefault(attempt_id, shard)
+        for attempt_id in discarded:
+            if attempt_id not in self._pending:
+                self._discarded.setdefault(attempt_id, shard)
+
+    @staticmethod
+    def _upsert(rows):
+        statement = upsert_insert(SavedAnswer)
+        if statement is None:
+            keys = [(row['attempt_id'], row['question_id']) for row in rows]
+            db.session.execute(
+                delete(SavedAnswer).where(tuple_(SavedAnswer.attempt_id, SavedAnswer.question_id).in_(keys))
+            )
+            db.session.execute(insert(SavedAnswer), rows)
+            return
+
+        statement = statement.on_conflict_do_update(
+            index_elements=[SavedAnswer.attempt_id, SavedAnswer.question_id],
+            set_={
+                'selected_option_id': statement.excluded.selected_option_id,
+                'saved_at': statement.excluded.saved_at
+            }
+        )
+        db.session.execute(statement, rows)
+
+
+autosave = AutosaveBuffer()
@@ -0,0 +1,498 @@
+"""Benchmark and load-test the quiz API against a synthetic question bank.
+
+Generates a bank (by default 1,000 quizzes x 100 questions x 6 options)
+in a throwaway SQLite database, then drives the list, questions and
+submit endpoints through the Flask test client. For every scenario it
+records p50/p90/p99 latency, throughput and SQL statements per request,
+and writes the results as JSON::
+
+    python benchmark.py --output bench_results.json
+    python benchmark.py --quizzes 100 --questions 50 --requests 500
+
+Each endpoint is measured warm (a few hot quizzes with caches populated)
+and cold (random quizzes with caches cleared before every request, i.e.
+the database path). A burst scenario has many clients submit at once, as
+at the close of a timed exam, and reports latency and the admission
+control outcomes (429s). Worker start-up is measured in fresh processes: the
+time to import the app and the time its warm-up takes to reach ready.
+Write scaling runs several writer processes against 1, 2 and 4 SQLite
+shards and reports attempts written per second for each.
+
+A database given with ``--database`` is benchmarked on top of its
+existing data unless ``--reset`` is passed, which drops every table on
+it and its shards first.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from sqlalchemy import event
+from config import get_setting
+
+
+def synthetic_bank(quizzes, questions, options, seed=0):
+    """Yield quiz dicts in the quiz_data.json format"""
+    rng = random.Random(seed)
+    for quiz_number in range(quizzes):
+        yield {
+            'title': f'Benchmark Quiz {quiz_number:05d}',
+            'questions': [
+                {
+                    'text': f'Benchmark question {quiz_number}-{question_number}?',
+                    'options': [
+                        {'text': f'Option {option_number}', 'is_correct': option_number == correct}
+                        for option_number in range(options)
+                    ]
+                }
+                for question_number, correct in (
+                    (question_number, rng.randrange(options)) for question_number in range(questions)
+                )
+            ]
+        }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """Count SQL statements executed by the current thread"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._thread_id = threading.get_ident()
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread_id:
+            self.count += 1
+
+
+def measure(client, engine, make_request, requests, before_each=None):
+    """Run make_request `requests` times and summarize latency and query counts"""
+    latencies = []
+    with QueryCounter(engine) as counter:
+        started = time.perf_counter()
+        for _ in range(requests):
+            if before_each:
+                before_each()
+            request_started = time.perf_counter()
+            response = make_request(client)
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                raise RuntimeError(f'Request failed with {response.status_code}: {response.data[:200]!r}')
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(counter.count / requests, 2)
+    }
+
+
+def measure_burst(app, make_request, clients=64, requests_per_client=5):
+    """Latency and response statuses with `clients` threads sending requests at the same moment"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def run_client():
+        with app.test_client() as client:
+            barrier.wait()
+            for _ in range(requests_per_client):
+                request_started = time.perf_counter()
+                status = make_request(client).status_code
+                elapsed = time.perf_counter() - request_started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    threads = [threading.Thread(target=run_client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    requests = len(latencies)
+    return {
+        'clients': clients,
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'statuses': statuses
+    }
+
+
+def measure_session_store(sessions=100_000):
+    """Memory footprint and start/sweep cost of the in-memory session store"""
+    from sessions import SessionStore
+
+    store = SessionStore()
+    now = time.time()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(sessions):
+        # Spread deadlines over ten minutes so sweeps evict in small batches
+        store.start(i, f'{i:016x}', None, 60 + i % 600, now=now)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    evicted = store.sweep(now + 10_000)
+    sweep_seconds = time.perf_counter() - started
+    return {
+        'sessions': sessions,
+        'bytes': used,
+        'bytes_per_session': round(used / sessions, 1),
+        'sweep_ms': round(sweep_seconds * 1000, 3),
+        'evicted': evicted
+    }
+
+
+# Run in a fresh interpreter by measure_startup; prints one JSON line
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+from startup import readiness
+ready = readiness.run()
+print(json.dumps({'import': imported - started, 'warmup': time.perf_counter() - imported,
+                  'ready': ready, 'phases_ms': readiness.phases}))
+"""
+
+
+def measure_startup(runs=5):
+    """Median import and warm-up time of a new worker process against the app's database"""
+    samples = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    import_ms = statistics.median(sample['import'] for sample in samples) * 1000
+    warmup_ms = statistics.median(sample['warmup'] for sample in samples) * 1000
+    return {
+        'runs': runs,
+        'import_ms': round(import_ms, 1),
+        'warmup_ms': round(warmup_ms, 1),
+        'ready_ms': round(import_ms + warmup_ms, 1),
+        'ready': all(sample['ready'] for sample in samples),
+        'phases_ms': samples[-1]['phases_ms']
+    }
+
+
+# Run in fresh interpreters by measure_shard_writes. With no start time it
+# creates the schema and the quizzes on every shard; otherwise it waits
+# until the start time, writes attempts and prints one JSON line.
+SHARD_WRITE_SCRIPT = """
+import json, sys, time
+from datetime import datetime, timezone
+from uuid import uuid4
+from app import app
+from attempts import attempt_writer
+from database import db
+from migrations import upgrade_schema
+from models import Question
+from sharding import shards
+
+quizzes, writer, transactions, batch_size, start_at = sys.argv[1:6]
+quizzes, writer, transactions, batch_size = int(quizzes), int(writer), int(transactions), int(batch_size)
+with app.app_context():
+    if start_at == 'setup':
+        from benchmark import synthetic_bank
+        from importer import BulkImporter
+        shards.each(upgrade_schema)
+        BulkImporter().run(synthetic_bank(quizzes, 10, 4))
+        sys.exit()
+    question_ids = {}
+    for rows in shards.each(lambda: db.session.query(Question.id, Question.quiz_id).all()):
+        for question_id, quiz_id in rows:
+            question_ids.setdefault(quiz_id, []).append(question_id)
+    quiz_ids = sorted(question_ids)
+
+time.sleep(max(0.0, float(start_at) - time.time()))
+started = time.perf_counter()
+for transaction in range(transactions):
+    quiz_id = quiz_ids[(writer + transaction) % len(quiz_ids)]
+    for _ in range(batch_size):
+        attempt = {'id': uuid4().hex, 'quiz_id': quiz_id, 'participant': None, 'score': 0,
+                   'total': len(question_ids[quiz_id]), 'submitted_at': datetime.now(timezone.utc)}
+        answers = [{'attempt_id': attempt['id'], 'question_id': question_id,
+                    'selected_option_id': None, 'is_correct': False} for question_id in question_ids[quiz_id]]
+        attempt_writer.submit(attempt, answers)
+    attempt_writer.flush()
+print(json.dumps({'seconds': time.perf_counter() - started, 'written': attempt_writer.written,
+                  'failed': attempt_writer.failed}))
+"""
+
+
+def measure_shard_writes(shard_counts=(1, 2, 4), writers=4, transactions=200, batch_size=10, quizzes=40):
+    """Attempt write throughput of `writers` processes against 1, 2, 4... SQLite shards.
+
+    Every count gets fresh database files. Each writer commits
+    ``transactions`` batches of ``batch_size`` attempts (with their answer
+    rows) for quizzes spread over all shards, so SQLite's one-writer-per-file
+    lock is shared by fewer writers as shards are added.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for count in shard_counts:
+        folder = tempfile.mkdtemp()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(folder, 'shard0.db')}",
+            QUIZ_SHARDS=','.join(f"sqlite:///{os.path.join(folder, f'shard{shard}.db')}" for shard in range(1, count))
+        )
+        env.pop('QUIZ_SNAPSHOT', None)
+
+        def run(writer, start_at):
+            return subprocess.Popen(
+                [sys.executable, '-c', SHARD_WRITE_SCRIPT, str(quizzes), str(writer), str(transactions),
+                 str(batch_size), start_at],
+                cwd=directory, env=env, stdout=subprocess.PIPE, text=True
+            )
+
+        setup = run(0, 'setup')
+        setup.communicate()
+        if setup.returncode:
+            raise RuntimeError(f'Setting up {count} shards failed')
+
+        # Writers load the app first and start writing at the same moment
+        start_at = str(time.time() + 2.0)
+        processes = [run(writer, start_at) for writer in range(writers)]
+        samples = []
+        for process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise RuntimeError(f'A shard writer failed with {count} shards')
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+        elapsed = max(sample['seconds'] for sample in samples)
+        written = sum(sample['written'] for sample in samples)
+        results[str(count)] = {
+            'shards': count,
+            'writers': writers,
+            'attempts': written,
+            'failed': sum(sample['failed'] for sample in samples),
+            'seconds': round(elapsed, 3),
+            'attempts_per_second': round(written / elapsed, 1) if elapsed else 0.0
+        }
+    return results
+
+
+def run_benchmark(quizzes=1000, questions=100, options=6, requests=200, hot_quizzes=10, seed=0, reset=False,
+                  sessions=100_000, startup_runs=5, burst_clients=64, shard_counts=(1, 2, 4)):
+    """Build a synthetic bank in the app's database and benchmark the hot endpoints.
+
+    With reset, every table of the app's database and its shards is dropped first.
+    """
+    from app import app, db
+    from importer import BulkImporter
+    from migrations import upgrade_schema
+    from models import Quiz, Question
+    from sharding import shards
+    from attempts import attempt_writer
+    from scoring import answer_keys
+    from response_cache import response_cache
+    from startup import readiness
+
+    rng = random.Random(seed)
+    results = {}
+    # The submit scenarios measure scoring, not the /start round trip
+    app.config['REQUIRE_ATTEMPT_TOKEN'] = False
+
+    with app.app_context():
+        if reset:
+            shards.each(lambda: db.metadata.drop_all(db.session.get_bind()))
+        shards.each(upgrade_schema)
+        readiness.run()
+        importer = BulkImporter().run(synthetic_bank(quizzes, questions, options, seed))
+        engine = db.engine
+        quiz_ids = sorted(quiz_id for rows in shards.each(lambda: db.session.query(Quiz.id).all())
+                          for (quiz_id,) in rows)
+        question_ids = {}
+        for rows in shards.each(lambda: db.session.query(Question.id, Question.quiz_id).all()):
+            for question_id, quiz_id in rows:
+                question_ids.setdefault(quiz_id, []).append(question_id)
+
+    generation = {
+        'rows': importer.rows,
+        'seconds': round(importer.seconds, 3),
+        'rows_per_second': round(importer.rows_per_second, 1)
+    }
+
+    def clear_caches():
+        answer_keys.clear()
+        response_cache.clear()
+
+    def get_list(client, quiz_id):
+        return client.get('/api/quizzes')
+
+    def get_questions(client, quiz_id):
+        return client.get(f'/api/quizzes/{quiz_id}/questions')
+
+    def submit(client, quiz_id):
+        answers = [
+            {'questionId': question_id, 'selectedOptionId': rng.randrange(1, quizzes * questions * options)}
+            for question_id in question_ids.get(quiz_id, [])
+        ]
+        return client.post(f'/api/quizzes/{quiz_id}/submit', json={'answers': answers})
+
+    scenarios = [
+        ('list', get_list),
+        ('questions', get_questions),
+        ('submit', submit)
+    ]
+
+    # Warm runs model many students taking the same few quizzes; cold runs
+    # spread requests over the whole bank with caches cleared each time.
+    hot_ids = rng.sample(quiz_ids, min(hot_quizzes, len(quiz_ids)))
+
+    with app.test_client() as client:
+        for name, make_request in scenarios:
+            for quiz_id in hot_ids:
+                make_request(client, quiz_id)
+            results[name] = measure(
+                client, engine, lambda c: make_request(c, rng.choice(hot_ids)), requests
+            )
+            results[f'{name}_cold'] = measure(
+                client, engine, lambda c: make_request(c, rng.choice(quiz_ids)), requests,
+                before_each=clear_caches
+            )
+
+    if burst_clients:
+        burst_quiz = rng.choice(hot_ids)
+        results['submit_burst'] = measure_burst(app, lambda c: submit(c, burst_quiz), burst_clients)
+
+    attempt_writer.flush()
+    results['attempt_writer'] = attempt_writer.stats()
+    results['session_store'] = measure_session_store(sessions)
+    if startup_runs:
+        results['startup'] = measure_startup(startup_runs)
+    if shard_counts:
+        results['shard_writes'] = measure_shard_writes(shard_counts, transactions=requests)
+
+    return {
+        'config': {
+            'quizzes': quizzes,
+            'questions_per_quiz': questions,
+            'options_per_question': options,
+            'requests_per_scenario': requests,
+            'hot_quizzes': hot_quizzes,
+            'sessions': sessions,
+            'startup_runs': startup_runs,
+            'burst_clients': burst_clients,
+            'shard_counts': list(shard_counts),
+            'seed': seed
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': str(engine.url)
+        },
+        'generation': generation,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the quiz API')
+    parser.add_argument('--quizzes', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--options', type=int, default=6)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--hot-quizzes', type=int, default=10, help='quizzes hit by the warm runs')
+    parser.add_argument('--sessions', type=int, default=100_000, help='sessions held by the session store test')
+    parser.add_argument('--burst-clients', type=int, default=64, help='clients submitting at once in the burst test')
+    parser.add_argument('--startup-runs', type=int, default=5, help='worker processes started to time start-up')
+    parser.add_argument('--shard-counts', default='1,2,4',
+                        help='comma-separated shard counts for the write scaling test ("" to skip)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='database URI (default: a temporary SQLite file)')
+    parser.add_argument('--reset', action='store_true',
+                        help='drop every table of --database and its shards before generating the bank')
+    parser.add_argument('--output', default='bench_results.json', help='where to write the JSON results')
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL and QUIZ_SHARDS on import, so set them first
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+        reset = args.reset
+    else:
+        # Only the throwaway files are ever reset, including stand-ins for configured shards
+        folder = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(folder, 'bench.db')}"
+        configured = os.environ.get('QUIZ_SHARDS')
+        extra_shards = len(configured.split(',')) if configured else len(get_setting('sharding', 'shards', []))
+        if extra_shards:
+            os.environ['QUIZ_SHARDS'] = ','.join(f"sqlite:///{os.path.join(folder, f'bench{shard}.db')}"
+                                                 for shard in range(1, extra_shards + 1))
+        reset = True
+
+    report = run_benchmark(args.quizzes, args.questions, args.options, args.requests,
+                           args.hot_quizzes, args.seed, reset=reset, sessions=args.sessions,
+                           startup_runs=args.startup_runs, burst_clients=args.burst_clients,
+                           shard_counts=[int(count) for count in args.shard_counts.split(',') if count])
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Generated {report['generation']['rows']} rows "
+          f"({report['generation']['rows_per_second']:,.0f} rows/sec)")
+    print(f"{'scenario':<18}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}")
+    for name, result in report['results'].items():
+        if 'queries_per_request' in result:
+            print(f"{name:<18}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+                  f"{result['throughput_rps']:>10}{result['queries_per_request']:>10}")
+    burst = report['results'].get('submit_burst')
+    if burst:
+        print(f"\nSubmit burst: {burst['clients']} clients, p50 {burst['p50_ms']} ms, p99 {burst['p99_ms']} ms, "
+              f"statuses {burst['statuses']}")
+    sessions = report['results']['session_store']
+    print(f"\nSession store: {sessions['sessions']:,} sessions in {sessions['bytes'] / 2**20:.1f} MiB "
+          f"({sessions['bytes_per_session']} bytes each)")
+    startup = report['results'].get('startup')
+    if startup:
+        print(f"Worker start-up: import {startup['import_ms']} ms + warm-up {startup['warmup_ms']} ms "
+              f"= ready in {startup['ready_ms']} ms")
+    shard_writes = report['results'].get('shard_writes')
+    if shard_writes:
+        print("Attempt writes: " + ', '.join(
+            f"{result['shards']} shard(s) {result['attempts_per_second']:,.0f}/s" for result in shard_writes.values()
+        ))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Quiz content changes shared between worker processes.
+
+Writes that change a quiz set ``quiz.updated_at`` (Unix time) in their own
+transaction, through ``touch()`` or the column default of a new quiz. The
+column is what every process sees: each one polls it at most every
+``check_interval`` seconds and hands the ids of quizzes changed since its
+previous poll to the registered listeners, which drop their cached
+copies; the snapshot store asks it which quizzes changed after the
+snapshot was built, so edits are honoured after a restart too. Polls look
+``lookback`` seconds further back than the previous one, so a transaction
+that commits a little after the time it wrote is not missed.
+"""
+import threading
+import time
+from sqlalchemy import select, update
+from config import get_setting
+from database import db
+from models import Quiz
+from sharding import shards
+
+
+class QuizChangeFeed:
+    """Publish quiz changes through the database and poll for other processes' changes"""
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'polls': ('counter', 'Polls of quiz.updated_at'),
+        'changes': ('counter', 'Quiz changes seen by polls')
+    }
+
+    def __init__(self, check_interval=1.0, lookback=5.0):
+        self.check_interval = check_interval
+        self.lookback = lookback
+        self.polls = 0
+        self.changes = 0
+        self._since = None
+        self._next_check = 0.0
+        self._seen = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read settings and poll before each request once start() has run"""
+        self.check_interval = get_setting('change_feed', 'check_interval_seconds', self.check_interval)
+        self.lookback = get_setting('change_feed', 'lookback_seconds', self.lookback)
+        app.before_request(self.poll)
+
+    def on_change(self, listener):
+        """Register listener({quiz_id: updated_at}), run for changes seen by a poll (usable as a decorator)"""
+        self._listeners.append(listener)
+        return listener
+
+    def start(self):
+        """Report changes from now on; needs the schema (a warm-up step)"""
+        self._since = time.time()
+        self._seen = {}
+        self._next_check = time.monotonic() + self.check_interval
+
+    def touch(self, quiz_ids):
+        """Mark quizzes as changed in the current transaction and return the time stored; the caller commits"""
+        updated_at = time.time()
+        db.session.execute(update(Quiz).where(Quiz.id.in_(quiz_ids)).values(updated_at=updated_at))
+        return updated_at
+
+    def current(self):
+        """{quiz_id: updated_at} of every quiz on every shard"""
+        return {quiz_id: updated_at for rows in shards.each(lambda: self._read(None)) for quiz_id, updated_at in rows}
+
+    def changed_since(self, timestamp):
+        """{quiz_id: updated_at} of the quizzes on every shard changed after timestamp (minus the lookback)"""
+        return {quiz_id: updated_at for rows in shards.each(lambda: self._read(timestamp - self.lookback))
+                for quiz_id, updated_at in rows}
+
+    def poll(self):
+        """Run the listeners for quizzes changed since the previous poll"""
+        now = time.monotonic()
+        if self._since is None or now < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            polled_at = time.time()
+            rows = [row for shard_rows in shards.each(lambda: self._read(self._since - self.lookback))
+                    for row in shard_rows]
+            changed = {quiz_id: updated_at for quiz_id, updated_at in rows if self._seen.get(quiz_id) != updated_at}
+            # Only rows inside the next lookback window can be reported again
+            self._seen = dict(rows)
+            self._since = polled_at
+            self.polls += 1
+            self.changes += len(changed)
+        finally:
+            self._lock.release()
+        if changed:
+            for listener in self._listeners:
+                listener(changed)
+
+    @staticmethod
+    def _read(since):
+        # Its own connection, so the poll doesn't hold a transaction open in the request's session
+        with db.session.get_bind().connect() as connection:
+            statement = select(Quiz.id, Quiz.updated_at)
+            if since is not None:
+                statement = statement.where(Quiz.updated_at >= since)
+            return connection.execute(statement).all()
+
+    def stats(self):
+        return {'polls': self.polls, 'changes': self.changes}
+
+
+quiz_changes = QuizChangeFeed()
@@ -0,0 +1,22 @@
+import json
+import os
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
+
+def load_config(path=CONFIG_PATH):
+    """Load config.json, returning an empty config if it is missing or invalid"""
+    if not os.path.exists(path):
+        return {}
+    
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading config file: {e}")
+        return {}
+
+config = load_config()
+
+def get_setting(section, name, default=None):
+    """Return config[section][name], or default when it is not set"""
+    return config.get(section, {}).get(name, default)
@@ -0,0 +1,149 @@
+import pytest
+import json
+import os
+import tempfile
+import threading
+
+# Point the app at a throwaway database before it is imported
+TEST_DIR = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TEST_DIR, 'test_quiz.db')}")
+os.environ.setdefault('QUIZ_SNAPSHOT', os.path.join(TEST_DIR, 'quiz_bank.snap'))
+
+from sqlalchemy import event
+from app import app, db
+from models import Quiz, Question, Option
+from scoring import answer_keys
+from attempts import attempt_writer
+from http_cache import versions
+from response_cache import response_cache
+from metrics import metrics
+from sessions import session_store
+from autosave import autosave
+from leaderboard import leaderboards
+from snapshot import snapshots
+from startup import readiness
+from changes import quiz_changes
+
+# Tests that need the change feed poll it themselves, so it never adds queries to measured requests
+quiz_changes.check_interval = 3600
+leaderboards.check_interval = 3600
+# Importing the app does no database work; warm it up once like a worker would
+readiness.run()
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app"""
+    app.config['TESTING'] = True
+    # Most tests submit directly; test_submit_requires_attempt_token covers the default
+    app.config['REQUIRE_ATTEMPT_TOKEN'] = False
+    
+    answer_keys.clear()
+    leaderboards.clear()
+    response_cache.clear()
+    response_cache.configure()
+    metrics.reset()
+    session_store.clear()
+    if os.path.exists(snapshots.path):
+        os.remove(snapshots.path)
+    snapshots.configure()
+    
+    with app.test_client() as client:
+        with app.app_context():
+            # Tests without this fixture, such as the benchmark, may leave rows behind
+            db.drop_all()
+            db.create_all()
+            setup_test_data()
+            versions.load(quiz_changes.current())
+        yield client
+    
+    attempt_writer.flush()
+    autosave.flush()
+    with app.app_context():
+        db.drop_all()
+
+def setup_test_data():
+    """Setup test quiz data"""
+    # Create a test quiz
+    quiz = Quiz(title="Test Quiz")
+    db.session.add(quiz)
+    db.session.flush()
+    
+    # Add questions
+    q1 = Question(text="What is 2 + 2?", quiz_id=quiz.id)
+    db.session.add(q1)
+    db.session.flush()
+    
+    # Add options for question 1
+    db.session.add(Option(text="3", is_correct=False, question_id=q1.id))
+    db.session.add(Option(text="4", is_correct=True, question_id=q1.id))
+    db.session.add(Option(text="5", is_correct=False, question_id=q1.id))
+    db.session.add(Option(text="6", is_correct=False, question_id=q1.id))
+    
+    q2 = Question(text="What is the capital of France?", quiz_id=quiz.id)
+    db.session.add(q2)
+    db.session.flush()
+    
+    # Add options for question 2
+    db.session.add(Option(text="London", is_correct=False, question_id=q2.id))
+    db.session.add(Option(text="Paris", is_correct=True, question_id=q2.id))
+    db.session.add(Option(text="Berlin", is_correct=False, question_id=q2.id))
+    db.session.add(Option(text="Madrid", is_correct=False, question_id=q2.id))
+    
+    q3 = Question(text="What is 10 / 2?", quiz_id=quiz.id)
+    db.session.add(q3)
+    db.session.flush()
+    
+    # Add options for question 3
+    db.session.add(Option(text="3", is_correct=False, question_id=q3.id))
+    db.session.add(Option(text="4", is_correct=False, question_id=q3.id))
+    db.session.add(Option(text="5", is_correct=True, question_id=q3.id))
+    db.session.add(Option(text="6", is_correct=False, question_id=q3.id))
+    
+    db.session.commit()
+
+def count_queries(fn):
+    """Run fn and return the number of SQL statements it executed in this thread"""
+    statements = []
+    thread_id = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Ignore background writes such as the attempt write-behind queue
+        if threading.get_ident() == thread_id:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+def add_questions(quiz_id, count, options_per_question=4):
+    """Add count generated questions to an existing quiz"""
+    with app.app_context():
+        for i in range(count):
+            question = Question(text=f"Generated question {i}?", quiz_id=quiz_id)
+            db.session.add(question)
+            for j in range(options_per_question):
+                db.session.add(Option(text=f"Option {j}", is_correct=(j == 0), question=question))
+        db.session.commit()
+
+def submit_first_options(client):
+    """Submit the first option for every question of quiz 1"""
+    questions = json.loads(client.get('/api/quizzes/1/questions').data)
+    answers = [
+        {"questionId": q['id'], "selectedOptionId": q['options'][0]['id']}
+        for q in questions
+    ]
+    return client.post('/api/quizzes/1/submit',
+                       data=json.dumps({'answers': answers}),
+                       content_type='application/json')
+
+def make_question(text, correct=0, options=3):
+    """Build a question payload"""
+    return {
+        'text': text,
+        'options': [{'text': f'Option {i}', 'is_correct': i == correct} for i in range(options)]
+    }
@@ -1,19 +1,117 @@
+from contextvars import ContextVar
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from config import get_setting
 import os
 
+# Engine db.session uses instead of the default one while it is set (see sharding.py)
+session_bind = ContextVar('session_bind', default=None)
+
+class RoutingSession(Session):
+    """Session that binds to session_bind when one is set"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = session_bind.get()
+        if bind is None and engine is not None:
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Create a SQLAlchemy instance
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def init_app(app):
-    """Initialize the database with the Flask app"""
-    # Create instance folder if it doesn't exist
+# Pragmas applied to every new SQLite connection unless overridden in config.json
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,
+    'mmap_size': 134217728,
+    'foreign_keys': 'ON'
+}
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def get_database_uri():
+    """Resolve the database URI from the environment, config.json or the default file"""
     instance_path = os.path.join(os.path.dirname(__file__), 'instance')
+    uri = os.environ.get('DATABASE_URL') or get_setting('database', 'uri')
+    if uri:
+        return uri
+
+    # Create instance folder if it doesn't exist
     if not os.path.exists(instance_path):
         os.makedirs(instance_path)
-    
-    # Configure database
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(instance_path, "quiz.db")}'
+    name = get_setting('database', 'name', 'quiz.db')
+    return f'sqlite:///{os.path.join(instance_path, name)}'
+
+def get_engine_options(uri):
+    """Build SQLAlchemy engine options for uri from config.json and the environment"""
+    url = make_url(uri)
+    options = {'pool_pre_ping': True}
+
+    # In-memory SQLite uses a single static connection, so pool sizing doesn't apply
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    for name, env_name, default in [
+        ('pool_size', 'DB_POOL_SIZE', 10),
+        ('max_overflow', 'DB_MAX_OVERFLOW', 20),
+        ('pool_recycle', 'DB_POOL_RECYCLE', 1800),
+        ('pool_timeout', 'DB_POOL_TIMEOUT', 30)
+    ]:
+        value = os.environ.get(env_name, get_setting('database', name, default))
+        options[name] = int(value)
+    return options
+
+def upsert_insert(model):
+    """Return an INSERT for model that supports on_conflict_do_update, or None if the dialect has none"""
+    make_insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    return make_insert(model) if make_insert else None
+
+def warm_pool(connections=None):
+    """Open pooled connections ahead of traffic and return how many were opened.
+
+    Defaults to the pool's configured size, so the first requests of a
+    worker don't pay for connecting (and for the SQLite pragmas).
+    """
+    engine = db.session.get_bind()
+    if connections is None:
+        size = getattr(engine.pool, 'size', None)
+        connections = size() if callable(size) else 1
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure a new SQLite connection for concurrent readers and writers"""
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    pragmas.update(get_setting('database', 'sqlite_pragmas', {}))
+
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+def init_app(app):
+    """Initialize the database with the Flask app"""
+    # Configure database; an explicitly configured app keeps its URI
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or get_database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', get_engine_options(uri))
+
     # Initialize app with database
     db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', apply_sqlite_pragmas)
@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from sqlalchemy import select, and_, or_
+from database import db
+from models import Attempt, Answer
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 1000
+
+# Rows rendered into one chunk of the response body
+ROWS_PER_CHUNK = 500
+
+ATTEMPT_COLUMNS = ('attemptId', 'participant', 'score', 'total', 'submittedAt')
+ANSWER_COLUMNS = ATTEMPT_COLUMNS + ('questionId', 'selectedOptionId', 'isCorrect')
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into the naive UTC datetimes stored in the database"""
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_cursor(value):
+    """Parse an "<submittedAt>,<attemptId>" resume cursor; raises ValueError"""
+    submitted_at, _, attempt_id = value.partition(',')
+    if not attempt_id:
+        raise ValueError('cursor must be "<submittedAt>,<attemptId>"')
+    return parse_timestamp(submitted_at), attempt_id
+
+
+def iter_results(quiz_id, answers=False, since=None, until=None, after=None):
+    """Iterate result rows of a quiz as tuples in (submitted_at, attempt id) order.
+
+    The query is executed right away, while db.session is bound to the
+    quiz's shard; rows are then read through a server-side cursor
+    FETCH_SIZE at a time, so memory does not grow with the export.
+    ``after`` is a (submitted_at, attempt_id) cursor; with ``answers``
+    there is one row per answer and the cursor resumes after a whole
+    attempt.
+    """
+    columns = [Attempt.id, Attempt.participant, Attempt.score, Attempt.total, Attempt.submitted_at]
+    if answers:
+        columns += [Answer.question_id, Answer.selected_option_id, Answer.is_correct]
+    statement = select(*columns).where(Attempt.quiz_id == quiz_id)
+    if answers:
+        statement = statement.join(Answer, Answer.attempt_id == Attempt.id)
+    if since is not None:
+        statement = statement.where(Attempt.submitted_at >= since)
+    if until is not None:
+        statement = statement.where(Attempt.submitted_at < until)
+    if after is not None:
+        after_time, after_id = after
+        statement = statement.where(or_(
+            Attempt.submitted_at > after_time,
+            and_(Attempt.submitted_at == after_time, Attempt.id > after_id)
+        ))
+    order = [Attempt.submitted_at, Attempt.id] + ([Answer.id] if answers else [])
+
+    result = db.session.execute(
+        statement.order_by(*order),
+        execution_options={'stream_results': True, 'yield_per': FETCH_SIZE}
+    )
+    return (tuple(row[:4]) + (row[4].isoformat(),) + tuple(row[5:]) for row in result)
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_csv(rows, columns):
+    """Render rows as CSV text chunks, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def render_ndjson(rows, columns):
+    """Render rows as NDJSON text chunks, one object per line"""
+    for chunk in _chunks(rows):
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in chunk)
+
+
+def gzip_stream(chunks):
+    """Compress text chunks into a gzip stream as they are produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
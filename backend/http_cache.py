@@ -0,0 +1,101 @@
+import time
+from datetime import datetime, timezone
+from flask import request, make_response
+from config import get_setting
+
+# Version key for the quiz listing; individual quizzes use their id
+QUIZ_LIST = 'quizzes'
+
+# Appended to the ETag of gzip-encoded responses
+GZIP_SUFFIX = '-gzip'
+
+
+class ContentVersions:
+    """Content versions used to answer conditional GETs, taken from quiz.updated_at.
+
+    A quiz's version is the updated_at every write stores with it (see
+    changes.py) and the listing's is the newest of them, so every worker
+    derives the same strong ETag and Last-Modified from the database and a
+    conditional request validates wherever it lands. Versions are loaded at
+    warm-up and kept current by the write endpoints and the change feed, so
+    a conditional request is answered with 304 from memory without
+    touching the ORM. Last-Modified has one-second resolution, so it is
+    only sent once ``settle_seconds`` have passed since the change: a
+    later write in the same second would otherwise not change it.
+    """
+
+    def __init__(self, settle_seconds=5.0):
+        self.settle_seconds = settle_seconds
+        self._versions = {}
+
+    def configure(self):
+        """Wait as long as the change feed looks back before sending Last-Modified"""
+        self.settle_seconds = get_setting('change_feed', 'lookback_seconds', self.settle_seconds)
+
+    def load(self, updated_at):
+        """Start from {quiz_id: updated_at} of every quiz"""
+        self._versions = dict(updated_at)
+        self._versions[QUIZ_LIST] = max(updated_at.values(), default=0.0)
+
+    def get(self, key):
+        """Return (etag, last_modified) for key; last_modified is None while the version is settling"""
+        updated_at = self._versions.get(key, 0.0)
+        last_modified = None
+        if time.time() - updated_at >= self.settle_seconds:
+            last_modified = datetime.fromtimestamp(int(updated_at), timezone.utc)
+        return f'{key}-{updated_at!r}', last_modified
+
+    def bump(self, key, updated_at):
+        """Record that the content behind key was changed at updated_at"""
+        if updated_at > self._versions.get(key, 0.0):
+            self._versions[key] = updated_at
+
+    def clear(self):
+        """Forget every version"""
+        self._versions.clear()
+
+
+versions = ContentVersions()
+
+
+def not_modified(key):
+    """Return a 304 response if the client's cached copy of key is current"""
+    etag, last_modified = versions.get(key)
+    encoding = None
+
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+        if not matched and request.if_none_match.contains(etag + GZIP_SUFFIX):
+            matched, encoding = True, 'gzip'
+    elif request.if_modified_since and last_modified is not None:
+        matched = request.if_modified_since >= last_modified
+    else:
+        matched = False
+
+    if not matched:
+        return None
+    return add_cache_headers(('', 304), key, encoding)
+
+
+def add_cache_headers(response, key, encoding=None):
+    """Attach ETag, Last-Modified and Cache-Control headers for key to a response.
+
+    A gzip-encoded body is a different representation, so it gets its own
+    strong ETag.
+    """
+    response = make_response(response)
+    etag, last_modified = versions.get(key)
+    if encoding == 'gzip':
+        etag += GZIP_SUFFIX
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    max_age = get_setting('http_cache', 'max_age_seconds', 0)
+    response.cache_control.public = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        # Always revalidate; the 304 path is cheap
+        response.cache_control.no_cache = True
+    return response
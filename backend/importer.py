@@ -0,0 +1,261 @@
+import json
+import time
+from sqlalchemy import insert, select, update, func
+from database import db
+from models import Quiz, Question, Option
+from changes import quiz_changes
+from search import index_quizzes, index_questions
+from sharding import shards
+
+# Number of questions written per transaction
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_quiz_file(path, read_size=65536):
+    """Yield quiz dicts from a file without loading it whole.
+
+    JSON-lines files (.jsonl / .ndjson) hold one quiz per line. Anything
+    else is read as {"quizzes": [...]} and the array is decoded one
+    element at a time.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        yield from _iter_array_items(f, 'quizzes', read_size)
+
+
+def _iter_array_items(f, key, read_size):
+    """Incrementally decode the items of the array stored under key"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+    # Find the opening bracket of the array
+    marker = f'"{key}"'
+    while True:
+        start = buffer.find(marker)
+        if start != -1:
+            bracket = buffer.find('[', start + len(marker))
+            if bracket != -1:
+                pos = bracket + 1
+                break
+        if eof:
+            raise ValueError(f'No "{key}" array found')
+        read_more()
+
+    while True:
+        # Skip separators between items
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            read_more()
+
+        if pos >= len(buffer):
+            raise ValueError(f'Unterminated "{key}" array')
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            read_more()
+            continue
+
+        yield item
+        # Drop consumed text so the buffer stays around one item long
+        buffer = buffer[end:]
+        pos = 0
+
+
+def insert_questions(quiz_id, questions, first_position=1):
+    """Insert questions and their options for one quiz with executemany.
+
+    Returns the new question ids in input order and adds them to the search
+    index. The caller owns the transaction.
+    """
+    if not questions:
+        return []
+
+    question_ids = db.session.execute(
+        insert(Question).returning(Question.id, sort_by_parameter_order=True),
+        [
+            {'text': question['text'], 'quiz_id': quiz_id, 'position': position}
+            for position, question in enumerate(questions, start=first_position)
+        ]
+    ).scalars().all()
+
+    option_rows = [
+        {'text': option['text'], 'is_correct': bool(option.get('is_correct', False)), 'question_id': question_id}
+        for question_id, question in zip(question_ids, questions)
+        for option in question['options']
+    ]
+    if option_rows:
+        db.session.execute(insert(Option), option_rows)
+    index_questions(question_ids)
+    return question_ids
+
+
+class BulkImporter:
+    """Stream quizzes into the database in chunked transactions.
+
+    Each chunk is written with multi-row INSERTs and committed on its own.
+    With ``upsert`` enabled, quizzes are matched by title and questions by
+    text within a quiz, so nothing has to be dropped first. New questions
+    are appended; for existing questions, options are matched by text,
+    their correctness is updated and missing options are added. Options
+    are never deleted because recorded answers may reference them. New
+    quizzes are placed across the shards and each quiz's questions are
+    written to its shard.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
+        self.chunk_size = chunk_size
+        self.upsert = upsert
+        self.quizzes = 0
+        self.questions = 0
+        self.options = 0
+        self.seconds = 0.0
+
+    @property
+    def rows(self):
+        return self.quizzes + self.questions + self.options
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def run(self, quizzes):
+        """Import an iterable of quiz dicts and return self"""
+        started = time.perf_counter()
+        chunk = []
+        chunk_questions = 0
+
+        for quiz in quizzes:
+            chunk.append(quiz)
+            chunk_questions += len(quiz.get('questions', []))
+            if chunk_questions >= self.chunk_size:
+                self._write_chunk(chunk)
+                chunk, chunk_questions = [], 0
+
+        if chunk:
+            self._write_chunk(chunk)
+
+        self.seconds = time.perf_counter() - started
+        return self
+
+    def _write_chunk(self, chunk):
+        try:
+            quiz_ids = self._quiz_ids([quiz['title'] for quiz in chunk])
+            for quiz, quiz_id in zip(chunk, quiz_ids):
+                with shards.use(shards.shard_for(quiz_id)):
+                    self._write_questions(quiz_id, quiz.get('questions', []))
+                    if self.upsert:
+                        # Running workers drop their cached copies of merged quizzes
+                        quiz_changes.touch([quiz_id])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _quiz_ids(self, titles):
+        """Return an id for each title, inserting the quizzes that don't exist"""
+        if not self.upsert:
+            return self._insert_quizzes(titles)
+
+        statement = select(Quiz.title, func.min(Quiz.id)).where(Quiz.title.in_(set(titles))).group_by(Quiz.title)
+        existing = {}
+        for rows in shards.each(lambda: db.session.execute(statement).all()):
+            for title, quiz_id in rows:
+                existing[title] = min(quiz_id, existing.get(title, quiz_id))
+
+        new_titles = [title for title in dict.fromkeys(titles) if title not in existing]
+        existing.update(zip(new_titles, self._insert_quizzes(new_titles)))
+        return [existing[title] for title in titles]
+
+    def _insert_quizzes(self, titles):
+        if not titles:
+            return []
+        if shards.count == 1:
+            new_ids = db.session.execute(
+                insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True),
+                [{'title': title} for title in titles]
+            ).scalars().all()
+            index_quizzes(new_ids)
+        else:
+            new_ids = [self._insert_sharded_quiz(title) for title in titles]
+        self.quizzes += len(titles)
+        return new_ids
+
+    @staticmethod
+    def _insert_sharded_quiz(title):
+        shard = shards.place()
+        with shards.use(shard):
+            quiz_id = db.session.execute(
+                insert(Quiz).values(id=shards.next_quiz_id(shard), title=title).returning(Quiz.id)
+            ).scalar_one()
+            index_quizzes([quiz_id])
+        return quiz_id
+
+    def _write_questions(self, quiz_id, questions):
+        first_position = 1
+        if self.upsert:
+            existing = dict(db.session.execute(
+                select(Question.text, Question.id).where(Question.quiz_id == quiz_id)
+            ).all())
+            matched = [question for question in questions if question['text'] in existing]
+            questions = [question for question in questions if question['text'] not in existing]
+
+            if matched:
+                self._merge_options([existing[question['text']] for question in matched], matched)
+
+            last_position = db.session.execute(
+                select(func.max(Question.position)).where(Question.quiz_id == quiz_id)
+            ).scalar()
+            first_position = (last_position or 0) + 1
+
+        insert_questions(quiz_id, questions, first_position)
+        self.questions += len(questions)
+        self.options += sum(len(question['options']) for question in questions)
+
+    def _merge_options(self, question_ids, questions):
+        """Update correctness of known options and add new ones"""
+        existing = {
+            (question_id, text): option_id
+            for option_id, question_id, text in db.session.execute(
+                select(Option.id, Option.question_id, Option.text).where(Option.question_id.in_(question_ids))
+            )
+        }
+
+        updates = []
+        inserts = []
+        for question_id, question in zip(question_ids, questions):
+            for option in question['options']:
+                is_correct = bool(option.get('is_correct', False))
+                option_id = existing.get((question_id, option['text']))
+                if option_id is None:
+                    inserts.append({'text': option['text'], 'is_correct': is_correct, 'question_id': question_id})
+                else:
+                    updates.append({'id': option_id, 'is_correct': is_correct})
+
+        if updates:
+            db.session.execute(update(Option), updates)
+        if inserts:
+            db.session.execute(insert(Option), inserts)
+            index_questions({row['question_id'] for row in inserts})
+        self.options += len(inserts)
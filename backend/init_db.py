@@ -1,23 +1,12 @@
-import json
+import argparse
 import os
 from app import app, db
+from importer import BulkImporter, iter_quiz_file, DEFAULT_CHUNK_SIZE
+from migrations import upgrade_schema
+from sharding import shards
+from snapshot import compile_snapshot
 from models import Quiz, Question, Option
 
-def load_quiz_data_from_json(json_file='quiz_data.json'):
-    """Load quiz data from JSON file"""
-    json_path = os.path.join(os.path.dirname(__file__), json_file)
-    
-    if not os.path.exists(json_path):
-        print(f"Warning: {json_file} not found. Using default data.")
-        return get_default_quiz_data()
-    
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading JSON file: {e}")
-        return get_default_quiz_data()
-
 def get_default_quiz_data():
     """Return default quiz data if JSON file is not available"""
     return {
@@ -198,58 +187,67 @@ def get_default_quiz_data():
         ]
     }
 
-def initialize_database():
-    """Initialize database with quiz data"""
+def iter_quizzes(path=None):
+    """Yield quizzes from path (streamed), quiz_data.json, or the default data"""
+    if path is None:
+        path = os.path.join(os.path.dirname(__file__), 'quiz_data.json')
+        if not os.path.exists(path):
+            print("Warning: quiz_data.json not found. Using default data.")
+            return iter(get_default_quiz_data()['quizzes'])
+    return iter_quiz_file(path)
+
+def initialize_database(path=None, upsert=False, chunk_size=DEFAULT_CHUNK_SIZE, snapshot=False):
+    """Initialize database with quiz data.
+
+    By default all tables are dropped and recreated. With upsert=True the
+    existing data is kept and the file is merged into it. With
+    snapshot=True the quiz bank snapshot is compiled afterwards.
+    """
     with app.app_context():
-        # Drop all tables and recreate them
-        print("Dropping existing tables...")
-        db.drop_all()
-        
-        print("Creating new tables...")
-        db.create_all()
-        
-        # Load quiz data
-        print("Loading quiz data...")
-        quiz_data = load_quiz_data_from_json()
-        
-        # Add quizzes to database
-        for quiz_info in quiz_data['quizzes']:
-            print(f"\nAdding quiz: {quiz_info['title']}")
-            quiz = Quiz(title=quiz_info['title'])
-            db.session.add(quiz)
-            db.session.flush()  # Get the quiz ID
+        if upsert:
+            print("Upgrading schema (keeping existing data)...")
+            shards.each(upgrade_schema)
+        else:
+            # Drop all tables and recreate them
+            print("Dropping existing tables...")
+            shards.each(lambda: db.metadata.drop_all(db.session.get_bind()))
             
-            for question_info in quiz_info['questions']:
-                question = Question(
-                    text=question_info['text'],
-                    quiz_id=quiz.id
-                )
-                db.session.add(question)
-                db.session.flush()  # Get the question ID
-                
-                for option_info in question_info['options']:
-                    option = Option(
-                        text=option_info['text'],
-                        is_correct=option_info['is_correct'],
-                        question_id=question.id
-                    )
-                    db.session.add(option)
-                
-                print(f"  - Added question: {question_info['text'][:50]}...")
+            print("Creating new tables...")
+            shards.each(lambda: db.metadata.create_all(db.session.get_bind()))
         
-        # Commit all changes
-        db.session.commit()
+        # Stream quiz data into the database
+        print("Loading quiz data...")
+        importer = BulkImporter(chunk_size=chunk_size, upsert=upsert).run(iter_quizzes(path))
         print("\n✓ Database initialized successfully!")
+        print(f"  - Imported {importer.rows} rows in {importer.seconds:.2f}s "
+              f"({importer.rows_per_second:,.0f} rows/sec)")
         
         # Display summary
-        total_quizzes = Quiz.query.count()
-        total_questions = Question.query.count()
-        total_options = Option.query.count()
+        total_quizzes = sum(shards.each(Quiz.query.count))
+        total_questions = sum(shards.each(Question.query.count))
+        total_options = sum(shards.each(Option.query.count))
         
         print(f"\nDatabase Summary:")
+        if shards.count > 1:
+            print(f"  - Shards: {shards.count}")
         print(f"  - Total Quizzes: {total_quizzes}")
         print(f"  - Total Questions: {total_questions}")
         print(f"  - Total Options: {total_options}")
+        
+        if snapshot:
+            result = compile_snapshot()
+            print(f"\n✓ Snapshot written to {result['path']} ({result['bytes']:,} bytes)")
 
 if __name__ == '__main__':
-    initialize_database()
+    parser = argparse.ArgumentParser(description='Load quizzes into the database')
+    parser.add_argument('file', nargs='?', help='quiz file (.json with a "quizzes" array, or .jsonl); '
+                                                'defaults to quiz_data.json')
+    parser.add_argument('--upsert', action='store_true',
+                        help='merge into the existing data instead of dropping all tables')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='questions written per transaction')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='compile the memory-mapped quiz bank snapshot after loading')
+    args = parser.parse_args()
+    
+    initialize_database(args.file, upsert=args.upsert, chunk_size=args.chunk_size, snapshot=args.snapshot)
@@ -0,0 +1,209 @@
+import time
+from threading import Lock
+from sqlalchemy import select
+from sortedcontainers import SortedList
+from config import get_setting
+from database import db
+from models import Attempt
+from sharding import shards
+
+
+class QuizLeaderboard:
+    """Attempts of one quiz ordered best first.
+
+    Entries are (-score, submitted_at, attempt_id, participant, total)
+    tuples; attempt ids are unique, so ordering never looks past them.
+    SortedList keeps inserts, rank lookups and top-N slices logarithmic.
+    """
+    __slots__ = ('entries', 'by_attempt')
+
+    def __init__(self):
+        self.entries = SortedList()
+        self.by_attempt = {}
+
+    def add(self, attempt_id, participant, score, total, submitted_at):
+        if attempt_id in self.by_attempt:
+            return
+        entry = (-score, submitted_at, attempt_id, participant, total)
+        self.entries.add(entry)
+        self.by_attempt[attempt_id] = entry
+
+    def rank(self, attempt_id):
+        """1-based rank of an attempt, or None if it is not on the board"""
+        entry = self.by_attempt.get(attempt_id)
+        if entry is None:
+            return None
+        # Attempts with the same score share the rank of the first of them
+        return self.entries.bisect_left((entry[0],)) + 1
+
+    def top(self, limit):
+        """The best limit attempts as dicts"""
+        return [
+            _entry_dict(entry, self.entries.bisect_left((entry[0],)) + 1)
+            for entry in self.entries.islice(0, limit)
+        ]
+
+    def entry(self, attempt_id):
+        """One attempt as a dict with its rank, or None"""
+        entry = self.by_attempt.get(attempt_id)
+        return _entry_dict(entry, self.rank(attempt_id)) if entry else None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _entry_dict(entry, rank):
+    negative_score, submitted_at, attempt_id, participant, total = entry
+    return {
+        'rank': rank,
+        'attemptId': attempt_id,
+        'participant': participant,
+        'score': -negative_score,
+        'total': total,
+        'submittedAt': submitted_at.isoformat()
+    }
+
+
+class Leaderboards:
+    """Per-quiz leaderboards held in memory and fed by submit_quiz.
+
+    A quiz's board is loaded from the attempt table (through the
+    quiz_id/score index) the first time it is used in this process, and
+    every later submission is added as it is scored, before the attempt
+    writer has persisted it. Attempts scored by another worker are picked
+    up by sync(), which runs before requests at most every
+    ``check_interval`` seconds and adds the attempts of loaded boards
+    written since the previous sync (looking ``lookback`` seconds further
+    back, like the quiz change feed).
+
+    A board is loaded under a lock of its own quiz, so the load doesn't
+    hold up the other boards. At most ``max_boards`` are kept; the least
+    recently used one is dropped (and reloaded when needed again) beyond
+    that.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'loaded': ('gauge', 'Leaderboards held in memory'),
+        'attempts_synced': ('counter', 'Attempts of other workers added to leaderboards')
+    }
+
+    def __init__(self, check_interval=1.0, lookback=5.0, max_boards=1000):
+        self._boards = {}
+        self._used = {}
+        self._loading = {}
+        self._lock = Lock()
+        self.max_boards = max_boards
+        self.check_interval = check_interval
+        self.lookback = lookback
+        self.synced = 0
+        self._since = None
+        self._next_check = 0.0
+        self._sync_lock = Lock()
+
+    def init_app(self, app):
+        """Read settings and sync before each request"""
+        self.check_interval = get_setting('change_feed', 'check_interval_seconds', self.check_interval)
+        self.lookback = get_setting('change_feed', 'lookback_seconds', self.lookback)
+        self.max_boards = get_setting('quiz_settings', 'max_loaded_leaderboards', self.max_boards)
+        app.before_request(self.sync)
+
+    def board(self, quiz_id):
+        """Return the leaderboard of quiz_id, loading it from the database if needed"""
+        board = self._boards.get(quiz_id)
+        if board is not None:
+            self._used[quiz_id] = time.monotonic()
+            return board
+
+        # Only users of this quiz wait for the load; other boards stay available
+        with self._lock:
+            load_lock, _ = self._loading.setdefault(quiz_id, (Lock(), time.time()))
+        with load_lock:
+            board = self._boards.get(quiz_id)
+            if board is None:
+                board = QuizLeaderboard()
+                rows = db.session.execute(
+                    select(Attempt.id, Attempt.participant, Attempt.score, Attempt.total, Attempt.submitted_at)
+                    .where(Attempt.quiz_id == quiz_id)
+                )
+                for attempt_id, participant, score, total, submitted_at in rows:
+                    board.add(attempt_id, participant, score, total, submitted_at)
+                with self._lock:
+                    self._boards[quiz_id] = board
+                    self._used[quiz_id] = time.monotonic()
+                    del self._loading[quiz_id]
+                    self._evict()
+        return board
+
+    def _evict(self):
+        # Least recently used boards beyond max_boards are reloaded when next needed
+        while len(self._boards) > self.max_boards:
+            quiz_id = min(self._boards, key=lambda board_id: self._used.get(board_id, 0.0))
+            del self._boards[quiz_id]
+            self._used.pop(quiz_id, None)
+
+    def record(self, attempt):
+        """Add a scored attempt row (as built by build_attempt_rows) and return its rank"""
+        board = self.board(attempt['quiz_id'])
+        with self._lock:
+            board.add(attempt['id'], attempt['participant'], attempt['score'], attempt['total'],
+                      attempt['submitted_at'].replace(tzinfo=None))
+            return board.rank(attempt['id'])
+
+    def top(self, quiz_id, limit, attempt_id=None):
+        """Return (top entries, number of attempts, the given attempt's entry or None)"""
+        board = self.board(quiz_id)
+        with self._lock:
+            return board.top(limit), len(board), board.entry(attempt_id) if attempt_id else None
+
+    def sync(self):
+        """Add attempts other processes wrote since the previous sync to the loaded boards"""
+        now = time.monotonic()
+        if now < self._next_check or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            with self._lock:
+                # Boards loaded after the first sync read every attempt written before it; one still
+                # loading may have read before this sync, so the next one looks back to its start
+                synced_at = min([time.time()] + [started for _, started in self._loading.values()])
+                quiz_ids = list(self._boards)
+            since, self._since = self._since, synced_at
+            if since is None or not quiz_ids:
+                return
+            for shard, shard_quiz_ids in shards.partition(quiz_ids, lambda quiz_id: quiz_id).items():
+                with shards.use(shard):
+                    rows = self._read(shard_quiz_ids, since - self.lookback)
+                with self._lock:
+                    for quiz_id, attempt_id, participant, score, total, submitted_at in rows:
+                        board = self._boards.get(quiz_id)
+                        if board is not None and attempt_id not in board.by_attempt:
+                            board.add(attempt_id, participant, score, total, submitted_at)
+                            self.synced += 1
+        finally:
+            self._sync_lock.release()
+
+    @staticmethod
+    def _read(quiz_ids, since):
+        # Its own connection, so the sync doesn't hold a transaction open in the request's session
+        with db.session.get_bind().connect() as connection:
+            return connection.execute(
+                select(Attempt.quiz_id, Attempt.id, Attempt.participant, Attempt.score, Attempt.total,
+                       Attempt.submitted_at)
+                .where(Attempt.written_at >= since, Attempt.quiz_id.in_(quiz_ids))
+            ).all()
+
+    def stats(self):
+        return {'loaded': len(self._boards), 'attempts_synced': self.synced}
+
+    def clear(self):
+        """Drop every board so the next use reloads it"""
+        with self._lock:
+            self._boards.clear()
+            self._used.clear()
+
+    def __len__(self):
+        return len(self._boards)
+
+
+leaderboards = Leaderboards()
@@ -0,0 +1,231 @@
+import cProfile
+import io
+import pstats
+import time
+from threading import Lock
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from config import get_setting
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Upper bounds of the SQL-statements-per-request histogram buckets
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Metrics:
+    """Per-route latency, SQL instrumentation and slow-request logging.
+
+    Request timing hooks into Flask's before/after request handlers and SQL
+    statements are timed through SQLAlchemy cursor events. Admission
+    control reports its decisions and queue waits per route. Statements run
+    while handling a request are attributed to it; background work (such as
+    the attempt writer) is only counted in the totals. Requests slower than
+    ``metrics.slow_request_ms`` are logged, and when ``metrics.profiling``
+    is enabled a request carrying ``X-Profile: 1`` is run under cProfile
+    and its top functions are logged.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.app = None
+        self.slow_request_seconds = 0.5
+        self.profiling = False
+        self.collectors = []
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.latency = {}
+            self.sql_per_request = {}
+            self.responses = {}
+            self.admissions = {}
+            self.queue_wait = {}
+            self.sql_statements = 0
+            self.sql_seconds = 0.0
+            self.slow_requests = 0
+
+    def init_app(self, app, engine):
+        """Register request hooks on app and SQL hooks on engine"""
+        self.app = app
+        self.slow_request_seconds = get_setting('metrics', 'slow_request_ms', 500) / 1000
+        self.profiling = get_setting('metrics', 'profiling', False)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        self.instrument(engine)
+
+    def instrument(self, engine):
+        """Time the SQL statements of another engine (such as a shard)"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def add_collector(self, prefix, collect, described):
+        """Export the values of collect() under prefix for /api/metrics.
+
+        collect returns {name: value} and described maps each name to its
+        (metric type, help text); counters get the conventional _total suffix.
+        """
+        self.collectors.append((prefix, collect, described))
+
+    def record_admission(self, key, outcome, waited):
+        """Count an admission decision for a (route, method) and the time it queued"""
+        with self._lock:
+            outcome_key = key + (outcome,)
+            self.admissions[outcome_key] = self.admissions.get(outcome_key, 0) + 1
+            self.queue_wait.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(waited)
+
+    def _before_request(self):
+        g.metrics_sql_count = 0
+        g.metrics_sql_seconds = 0.0
+        g.metrics_profiler = None
+        if self.profiling and request.headers.get('X-Profile') == '1':
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (route, request.method)
+        sql_count = g.get('metrics_sql_count', 0)
+        sql_seconds = g.get('metrics_sql_seconds', 0.0)
+
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.sql_per_request.setdefault(key, Histogram(SQL_COUNT_BUCKETS)).observe(sql_count)
+            status_key = key + (response.status_code,)
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+            if elapsed >= self.slow_request_seconds:
+                self.slow_requests += 1
+
+        if elapsed >= self.slow_request_seconds:
+            self.app.logger.warning(
+                'Slow request: %s %s -> %s in %.1f ms (%d SQL statements, %.1f ms in SQL)',
+                request.method, request.full_path.rstrip('?'), response.status_code,
+                elapsed * 1000, sql_count, sql_seconds * 1000
+            )
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(25)
+            self.app.logger.info('Profile for %s %s:\n%s', request.method, request.path, output.getvalue())
+
+        response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.2f}, sql;dur={sql_seconds * 1000:.2f}'
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_seconds += elapsed
+        if has_request_context() and 'metrics_started' in g:
+            g.metrics_sql_count = g.get('metrics_sql_count', 0) + 1
+            g.metrics_sql_seconds = g.get('metrics_sql_seconds', 0.0) + elapsed
+
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('metrics_started'):
+            connection.info['metrics_started'].pop()
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            self._render_histograms(
+                lines, 'quiz_http_request_duration_seconds', 'Request latency by route', self.latency
+            )
+            self._render_histograms(
+                lines, 'quiz_http_request_sql_statements', 'SQL statements per request by route',
+                self.sql_per_request
+            )
+
+            lines.append('# HELP quiz_http_responses_total Responses by route and status code')
+            lines.append('# TYPE quiz_http_responses_total counter')
+            for (route, method, status), count in sorted(self.responses.items()):
+                lines.append(f'quiz_http_responses_total{_labels(route=route, method=method, status=status)} {count}')
+
+            self._render_histograms(
+                lines, 'quiz_admission_queue_wait_seconds', 'Time spent queued by admission control',
+                self.queue_wait
+            )
+            lines.append('# HELP quiz_admission_requests_total Admission decisions by route and outcome')
+            lines.append('# TYPE quiz_admission_requests_total counter')
+            for (route, method, outcome), count in sorted(self.admissions.items()):
+                lines.append(
+                    f'quiz_admission_requests_total{_labels(route=route, method=method, outcome=outcome)} {count}'
+                )
+
+            for name, help_text, value in [
+                ('quiz_sql_statements_total', 'SQL statements executed', self.sql_statements),
+                ('quiz_sql_seconds_total', 'Time spent executing SQL', self.sql_seconds),
+                ('quiz_slow_requests_total', 'Requests slower than the slow-request threshold', self.slow_requests)
+            ]:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name} {value}')
+
+        for prefix, collect, described in self.collectors:
+            for key, value in collect().items():
+                kind, help_text = described[key]
+                name = prefix + key + ('_total' if kind == 'counter' else '')
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (route, method), histogram in sorted(histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{_labels(route=route, method=method, le=bound)} {count}')
+            lines.append(f'{name}_bucket{_labels(route=route, method=method, le="+Inf")} {histogram.count}')
+            lines.append(f'{name}_sum{_labels(route=route, method=method)} {histogram.sum}')
+            lines.append(f'{name}_count{_labels(route=route, method=method)} {histogram.count}')
+
+
+metrics = Metrics()
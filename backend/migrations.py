@@ -0,0 +1,56 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from database import db
+import models  # registers every table on db.metadata
+import search  # registers the full-text index DDL
+
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models without dropping data.
+
+    Missing tables are created, missing columns are added with
+    ALTER TABLE ... ADD COLUMN and missing indexes are created. Every step
+    is idempotent, so this is safe to run on every start. The full-text
+    search index is built if it is empty. Must be called
+    inside an app context; it upgrades the database db.session is bound
+    to, so run it once per shard.
+    """
+    engine = db.session.get_bind()
+    db.metadata.create_all(engine)
+
+    applied = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+                applied.append(f'add column {table.name}.{column.name}')
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=connection)
+                    applied.append(f'create index {index.name}')
+
+    if search.ensure_index():
+        applied.append(f'build {search.SEARCH_TABLE}')
+    return applied
+
+
+if __name__ == '__main__':
+    from app import app
+    from sharding import shards
+
+    with app.app_context():
+        changes = [change for shard_changes in shards.each(upgrade_schema) for change in shard_changes]
+
+    if changes:
+        print("Applied migrations:")
+        for change in changes:
+            print(f"  - {change}")
+    else:
+        print("Database schema is up to date.")
@@ -1,3 +1,4 @@
+import time
 from database import db
 
 class Quiz(db.Model):
@@ -5,8 +6,11 @@ class Quiz(db.Model):
     __tablename__ = 'quiz'
     
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    questions = db.relationship('Question', backref='quiz', lazy=True, cascade="all, delete-orphan")
+    title = db.Column(db.String(100), nullable=False, index=True)
+    # Unix time of the last change to the quiz or its questions (see changes.py)
+    updated_at = db.Column(db.Float, nullable=False, default=time.time, server_default='0', index=True)
+    questions = db.relationship('Question', backref='quiz', lazy=True, cascade="all, delete-orphan",
+                                order_by='(Question.position, Question.id)')
     
     def __repr__(self):
         return f'<Quiz {self.id}: {self.title}>'
@@ -18,7 +22,14 @@ class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(300), nullable=False)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
-    options = db.relationship('Option', backref='question', lazy=True, cascade="all, delete-orphan")
+    position = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    options = db.relationship('Option', backref='question', lazy=True, cascade="all, delete-orphan",
+                              order_by='Option.id')
+    
+    # Serves lookups by quiz_id as well as ordered question fetches
+    __table_args__ = (
+        db.Index('ix_question_quiz_id_position', 'quiz_id', 'position'),
+    )
     
     def __repr__(self):
         return f'<Question {self.id}: {self.text[:50]}...>'
@@ -32,5 +43,96 @@ class Option(db.Model):
     is_correct = db.Column(db.Boolean, default=False, nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
     
+    # Serves lookups by question_id as well as correct-answer lookups
+    __table_args__ = (
+        db.Index('ix_option_question_id_is_correct', 'question_id', 'is_correct'),
+    )
+    
     def __repr__(self):
         return f'<Option {self.id}: {self.text[:30]}... (Correct: {self.is_correct})>'
+
+class Attempt(db.Model):
+    """Attempt model representing one scored quiz submission"""
+    __tablename__ = 'attempt'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    participant = db.Column(db.String(100), nullable=True)
+    score = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=False)
+    # Unix time the attempt writer inserted the row; other workers poll it (see leaderboard.py)
+    written_at = db.Column(db.Float, nullable=False, default=time.time, server_default='0', index=True)
+    answers = db.relationship('Answer', backref='attempt', lazy=True, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        db.Index('ix_attempt_quiz_id_score', 'quiz_id', 'score', 'submitted_at'),
+        db.Index('ix_attempt_quiz_id_submitted_at', 'quiz_id', 'submitted_at', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<Attempt {self.id}: quiz {self.quiz_id} ({self.score}/{self.total})>'
+
+class Answer(db.Model):
+    """Answer model representing the option chosen for one question of an attempt"""
+    __tablename__ = 'answer'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    attempt_id = db.Column(db.String(32), db.ForeignKey('attempt.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    selected_option_id = db.Column(db.Integer, db.ForeignKey('option.id'), nullable=True)
+    is_correct = db.Column(db.Boolean, default=False, nullable=False)
+    
+    def __repr__(self):
+        return f'<Answer {self.id}: question {self.question_id} (Correct: {self.is_correct})>'
+
+class SavedAnswer(db.Model):
+    """Autosaved answer of an attempt that has not been submitted yet.
+
+    The attempt row only exists after submission, so attempt_id is not a
+    foreign key; rows are removed on submit or once they are stale.
+    """
+    __tablename__ = 'saved_answer'
+    
+    attempt_id = db.Column(db.String(32), primary_key=True)
+    question_id = db.Column(db.Integer, primary_key=True)
+    selected_option_id = db.Column(db.Integer, nullable=True)
+    saved_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<SavedAnswer {self.attempt_id}: question {self.question_id} -> {self.selected_option_id}>'
+
+class QuizStat(db.Model):
+    """Running totals over the scored attempts of a quiz"""
+    __tablename__ = 'quiz_stat'
+    
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    total_sum = db.Column(db.Integer, nullable=False, default=0)
+
+class ScoreBucket(db.Model):
+    """Number of attempts of a quiz whose percentage falls in one histogram bucket"""
+    __tablename__ = 'score_bucket'
+    
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class QuestionStat(db.Model):
+    """How often a question was served, answered and answered correctly"""
+    __tablename__ = 'question_stat'
+    
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    shown = db.Column(db.Integer, nullable=False, default=0)
+    answered = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+class OptionStat(db.Model):
+    """How often an option was picked"""
+    __tablename__ = 'option_stat'
+    
+    option_id = db.Column(db.Integer, db.ForeignKey('option.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    picks = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,165 @@
+import gzip
+from collections import OrderedDict
+from threading import Lock
+from config import get_setting
+
+# Bytes charged per entry besides its body: the CachedBody, the LRU and
+# prefix index slots and the key tuple (measured at about 500 bytes)
+ENTRY_OVERHEAD = 512
+
+
+class CachedBody:
+    """A pre-encoded JSON response body, with a lazily built gzip variant"""
+    __slots__ = ('body', 'gzipped', 'headers', 'overhead')
+
+    def __init__(self, body, headers=None, overhead=0):
+        self.body = body
+        self.gzipped = None
+        self.headers = headers
+        self.overhead = overhead
+
+    @property
+    def size(self):
+        return self.overhead + len(self.body) + (len(self.gzipped) if self.gzipped is not None else 0)
+
+
+class ResponseCache:
+    """Bounded LRU of ready-to-send response bodies.
+
+    Entries are keyed by a tuple such as ('questions', quiz_id) and hold the
+    encoded JSON bytes, so a hit is served without building or encoding any
+    Python objects. The write endpoints invalidate the keys they affect.
+    Every entry is charged its body, gzip variant, key and headers plus
+    ``entry_overhead`` bytes against ``max_bytes``, and at most
+    ``max_entries`` are kept, so many small entries (e.g. listing pages for
+    arbitrary cursors) can't outgrow the limit; least recently used
+    entries are evicted first. Keys are indexed by their first element,
+    so invalidate_prefix() only touches the entries it drops.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'entries': ('gauge', 'Cached responses'),
+        'max_entries': ('gauge', 'Most cached responses kept'),
+        'bytes': ('gauge', 'Bytes charged for cached responses'),
+        'max_bytes': ('gauge', 'Most bytes charged for cached responses'),
+        'hits': ('counter', 'Responses served from the cache'),
+        'misses': ('counter', 'Cache lookups that found nothing'),
+        'evictions': ('counter', 'Responses evicted to stay within the limits')
+    }
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, gzip_min_bytes=1024, gzip_enabled=True, max_entries=10000,
+                 entry_overhead=ENTRY_OVERHEAD):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entry_overhead = entry_overhead
+        self.gzip_min_bytes = gzip_min_bytes
+        self.gzip_enabled = gzip_enabled
+        self._entries = OrderedDict()
+        self._by_prefix = {}
+        self._lock = Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self):
+        """Read limits from the response_cache section of config.json"""
+        self.max_bytes = get_setting('response_cache', 'max_bytes', self.max_bytes)
+        self.max_entries = get_setting('response_cache', 'max_entries', self.max_entries)
+        self.gzip_min_bytes = get_setting('response_cache', 'gzip_min_bytes', self.gzip_min_bytes)
+        self.gzip_enabled = get_setting('response_cache', 'gzip', self.gzip_enabled)
+
+    def get(self, key):
+        """Return the CachedBody for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, headers=None):
+        """Cache an encoded body (and extra response headers) under key and return its CachedBody"""
+        overhead = self.entry_overhead + len(repr(key))
+        if headers:
+            overhead += sum(len(name) + len(value) for name, value in headers.items())
+        entry = CachedBody(body, headers, overhead)
+        with self._lock:
+            self._remove(key)
+            if entry.size <= self.max_bytes and self.max_entries > 0:
+                self._entries[key] = entry
+                self._by_prefix.setdefault(key[0], set()).add(key)
+                self.current_bytes += entry.size
+                self._evict()
+        return entry
+
+    def gzipped(self, key, entry):
+        """Return the gzip variant of entry, or None if it isn't worth compressing"""
+        if not self.gzip_enabled or len(entry.body) < self.gzip_min_bytes:
+            return None
+        if entry.gzipped is None:
+            compressed = gzip.compress(entry.body, compresslevel=6)
+            with self._lock:
+                if entry.gzipped is None:
+                    entry.gzipped = compressed
+                    # Only count the variant if the entry is still cached
+                    if self._entries.get(key) is entry:
+                        self.current_bytes += len(compressed)
+                        self._evict()
+        return entry.gzipped
+
+    def invalidate(self, key):
+        """Drop the entry for key"""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_prefix(self, first):
+        """Drop every entry whose key starts with first, e.g. all pages of a listing"""
+        with self._lock:
+            for key in list(self._by_prefix.get(first, ())):
+                self._remove(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._by_prefix.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage"""
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+            self._unindex(key)
+
+    def _unindex(self, key):
+        keys = self._by_prefix.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_prefix[key[0]]
+
+    def _evict(self):
+        while (self.current_bytes > self.max_bytes or len(self._entries) > self.max_entries) and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self._unindex(key)
+            self.evictions += 1
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,194 @@
+import random
+from threading import Lock
+from sqlalchemy.orm import selectinload
+from models import Quiz, Question
+from snapshot import snapshots
+
+
+class AnswerKey:
+    """Everything needed to score a quiz, detached from the ORM.
+
+    ``questions`` maps question_id -> (question_text, correct_option_id,
+    {option_id: option_text}) and keeps the quiz's question order.
+    """
+    __slots__ = ('quiz_id', 'questions', 'correct_pairs')
+
+    def __init__(self, quiz_id, questions):
+        self.quiz_id = quiz_id
+        self.questions = questions
+        # (question_id, correct_option_id) pairs for the summary-only scorer
+        self.correct_pairs = tuple(
+            (question_id, correct_option_id)
+            for question_id, (_, correct_option_id, _) in questions.items()
+            if correct_option_id is not None
+        )
+
+    @classmethod
+    def from_quiz(cls, quiz):
+        """Build an answer key from a Quiz with its questions and options loaded"""
+        questions = {}
+        for question in quiz.questions:
+            correct_option_id = None
+            option_texts = {}
+            for option in question.options:
+                option_texts[option.id] = option.text
+                if option.is_correct and correct_option_id is None:
+                    correct_option_id = option.id
+            questions[question.id] = (question.text, correct_option_id, option_texts)
+        return cls(quiz.id, questions)
+
+    def draw(self, seed, count=None):
+        """Return the key for one attempt: count questions drawn from this quiz
+        (all of them by default), with questions and options shuffled.
+
+        The draw depends only on the quiz id, its questions and seed, so the
+        same seed reproduces the same questions in the same order.
+        """
+        rng = random.Random(f'{self.quiz_id}:{seed}')
+        question_ids = list(self.questions)
+        if count is not None and count < len(question_ids):
+            question_ids = rng.sample(question_ids, count)
+        else:
+            rng.shuffle(question_ids)
+
+        questions = {}
+        for question_id in question_ids:
+            question_text, correct_option_id, option_texts = self.questions[question_id]
+            option_ids = list(option_texts)
+            rng.shuffle(option_ids)
+            questions[question_id] = (
+                question_text, correct_option_id, {option_id: option_texts[option_id] for option_id in option_ids}
+            )
+        return AnswerKey(self.quiz_id, questions)
+
+    def public_questions(self):
+        """The questions payload served to students, in this key's order and without correct answers"""
+        return [
+            {
+                'id': question_id,
+                'text': question_text,
+                'options': [{'id': option_id, 'text': option_text} for option_id, option_text in option_texts.items()]
+            }
+            for question_id, (question_text, _, option_texts) in self.questions.items()
+        ]
+
+    def score(self, user_answers):
+        """Score a {question_id: selected_option_id} mapping against this key"""
+        score = 0
+        results = []
+
+        for question_id, (question_text, correct_option_id, option_texts) in self.questions.items():
+            user_answer_id = user_answers.get(question_id)
+
+            is_correct = correct_option_id is not None and user_answer_id == correct_option_id
+            if is_correct:
+                score += 1
+
+            results.append({
+                'questionId': question_id,
+                'questionText': question_text,
+                'userAnswer': option_texts.get(user_answer_id, "Not Answered"),
+                'correctAnswer': option_texts[correct_option_id] if correct_option_id is not None else "N/A",
+                'isCorrect': is_correct
+            })
+
+        summary = self._summary(score)
+        summary['results'] = results
+        return summary
+
+    def score_summary(self, user_answers):
+        """Score answers without building per-question results"""
+        score = 0
+        for question_id, correct_option_id in self.correct_pairs:
+            if user_answers.get(question_id) == correct_option_id:
+                score += 1
+        return self._summary(score)
+
+    def _summary(self, score):
+        total = len(self.questions)
+        return {
+            'score': score,
+            'total': total,
+            'percentage': round((score / total * 100), 2) if total > 0 else 0
+        }
+
+
+class AnswerKeyCache:
+    """In-process cache of AnswerKey objects keyed by quiz_id.
+
+    Keys are built on first use, from the mapped quiz bank snapshot when it
+    holds the quiz and otherwise with a single eager-loading query, and
+    then served without touching the database until the quiz is
+    invalidated by one of the write endpoints. The cache is per process;
+    writes made by another worker invalidate it when the quiz change feed
+    (changes.py) next reports them.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = Lock()
+        # quiz_id -> [lock, users]; one build per quiz, different quizzes build concurrently
+        self._building = {}
+
+    def get(self, quiz_id):
+        """Return the AnswerKey for quiz_id, or None if the quiz does not exist"""
+        key = self._keys.get(quiz_id)
+        if key is not None:
+            return key
+
+        with self._lock:
+            building = self._building.setdefault(quiz_id, [Lock(), 0])
+            building[1] += 1
+        try:
+            with building[0]:
+                key = self._keys.get(quiz_id)
+                if key is None:
+                    generation = self._generation(quiz_id)
+                    key = self._build(quiz_id)
+                    if key is None:
+                        return None
+                    with self._lock:
+                        # An invalidation during the build means the key may predate the write
+                        if self._generation(quiz_id) == generation:
+                            self._keys[quiz_id] = key
+            return key
+        finally:
+            with self._lock:
+                building[1] -= 1
+                if not building[1]:
+                    del self._building[quiz_id]
+
+    def _generation(self, quiz_id):
+        return self._epoch, self._generations.get(quiz_id, 0)
+
+    @staticmethod
+    def _build(quiz_id):
+        snapshot = snapshots.lookup(quiz_id)
+        if snapshot is not None:
+            return AnswerKey(quiz_id, snapshot.questions(quiz_id))
+
+        quiz = Quiz.query.options(
+            selectinload(Quiz.questions).selectinload(Question.options)
+        ).filter_by(id=quiz_id).first()
+        return AnswerKey.from_quiz(quiz) if quiz is not None else None
+
+    def invalidate(self, quiz_id):
+        """Drop the cached key for quiz_id so the next lookup rebuilds it"""
+        with self._lock:
+            self._generations[quiz_id] = self._generations.get(quiz_id, 0) + 1
+            self._keys.pop(quiz_id, None)
+
+    def clear(self):
+        """Drop every cached key"""
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._keys.clear()
+
+    def __len__(self):
+        return len(self._keys)
+
+
+answer_keys = AnswerKeyCache()
@@ -0,0 +1,161 @@
+from sqlalchemy import DDL, event, text, bindparam, or_
+from database import db
+from models import Quiz, Question, Option
+
+# One FTS5 document per quiz (its title) and per question (its text, with
+# the option texts in a second column). Questions use their id as rowid and
+# quizzes the negated id, so a document can be replaced by rowid without
+# scanning the index.
+SEARCH_TABLE = 'search_index'
+
+# bm25 weights per column (kind, quiz_id, text, options): a hit in a title
+# or question text counts more than one in the options
+RANK_WEIGHTS = (0.0, 0.0, 4.0, 1.0)
+
+event.listen(db.metadata, 'after_create', DDL(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        kind UNINDEXED, quiz_id UNINDEXED, text, options,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+""").execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL(
+    f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+).execute_if(dialect='sqlite'))
+
+INDEX_QUIZZES = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, kind, quiz_id, text, options)
+SELECT -quiz.id, 'quiz', quiz.id, quiz.title, ''
+FROM quiz
+"""
+
+INDEX_QUESTIONS = f"""
+INSERT INTO {SEARCH_TABLE} (rowid, kind, quiz_id, text, options)
+SELECT question.id, 'question', question.quiz_id, question.text,
+       (SELECT group_concat(option.text, ' ') FROM option WHERE option.question_id = question.id)
+FROM question
+"""
+
+RANKED_SEARCH = f"""
+SELECT rowid, kind, quiz_id, text, bm25({SEARCH_TABLE}, {', '.join(map(str, RANK_WEIGHTS))}) AS rank
+FROM {SEARCH_TABLE}
+WHERE {SEARCH_TABLE} MATCH :query{{filters}}
+ORDER BY rank, rowid
+LIMIT :limit OFFSET :offset
+"""
+
+
+def fts_available():
+    """Whether the current database has the FTS5 index"""
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def rebuild():
+    """Re-index every quiz and question from the main tables; the caller commits"""
+    if not fts_available():
+        return
+    db.session.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+    db.session.execute(text(INDEX_QUIZZES))
+    db.session.execute(text(INDEX_QUESTIONS))
+
+
+def ensure_index():
+    """Fill the index when it is empty but the bank is not (e.g. after an upgrade).
+
+    Returns True if the index was rebuilt.
+    """
+    if not fts_available():
+        return False
+    indexed = db.session.execute(text(f'SELECT 1 FROM {SEARCH_TABLE} LIMIT 1')).first()
+    if indexed or not db.session.query(Quiz.id).first():
+        return False
+    rebuild()
+    db.session.commit()
+    return True
+
+
+def _reindex(insert_sql, key_column, rowids, ids):
+    # Deleting by rowid first turns the insert into an upsert
+    db.session.execute(
+        text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN :rowids').bindparams(bindparam('rowids', expanding=True)),
+        {'rowids': rowids}
+    )
+    db.session.execute(
+        text(f'{insert_sql} WHERE {key_column} IN :ids').bindparams(bindparam('ids', expanding=True)),
+        {'ids': ids}
+    )
+
+
+def index_quizzes(quiz_ids):
+    """(Re-)index quiz titles; runs in the caller's transaction"""
+    quiz_ids = list(quiz_ids)
+    if fts_available() and quiz_ids:
+        _reindex(INDEX_QUIZZES, 'quiz.id', [-quiz_id for quiz_id in quiz_ids], quiz_ids)
+
+
+def index_questions(question_ids):
+    """(Re-)index questions with their options; runs in the caller's transaction"""
+    question_ids = list(question_ids)
+    if fts_available() and question_ids:
+        _reindex(INDEX_QUESTIONS, 'question.id', question_ids, question_ids)
+
+
+def to_match_query(query):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix"""
+    words = query.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(query, kind=None, quiz_id=None, limit=20, offset=0):
+    """Return one page of search hits, best match first"""
+    if not fts_available():
+        return _search_like(query, kind, quiz_id, limit, offset)
+
+    match = to_match_query(query)
+    if match is None:
+        return []
+
+    filters = ''
+    params = {'query': match, 'limit': limit, 'offset': offset}
+    if kind:
+        filters += ' AND kind = :kind'
+        params['kind'] = kind
+    if quiz_id is not None:
+        filters += ' AND quiz_id = :quiz_id'
+        params['quiz_id'] = quiz_id
+
+    rows = db.session.execute(text(RANKED_SEARCH.format(filters=filters)), params)
+    return [
+        {'kind': row.kind, 'id': abs(row.rowid), 'quizId': row.quiz_id, 'text': row.text,
+         'score': round(-row.rank, 4)}
+        for row in rows
+    ]
+
+
+def _search_like(query, kind, quiz_id, limit, offset):
+    """Unranked substring search for databases without FTS5"""
+    pattern = f'%{query.strip()}%'
+    hits = []
+    if kind in (None, 'quiz'):
+        quizzes = Quiz.query.filter(Quiz.title.ilike(pattern))
+        if quiz_id is not None:
+            quizzes = quizzes.filter(Quiz.id == quiz_id)
+        hits += [
+            {'kind': 'quiz', 'id': quiz.id, 'quizId': quiz.id, 'text': quiz.title, 'score': 0}
+            for quiz in quizzes.order_by(Quiz.id).limit(offset + limit)
+        ]
+    if kind in (None, 'question'):
+        questions = Question.query.filter(or_(
+            Question.text.ilike(pattern),
+            Question.options.any(Option.text.ilike(pattern))
+        ))
+        if quiz_id is not None:
+            questions = questions.filter(Question.quiz_id == quiz_id)
+        hits += [
+            {'kind': 'question', 'id': question.id, 'quizId': question.quiz_id, 'text': question.text, 'score': 0}
+            for question in questions.order_by(Question.id).limit(offset + limit)
+        ]
+    return hits[offset:offset + limit]
@@ -0,0 +1,45 @@
+"""Launch the quiz API under uvicorn with several worker processes.
+
+Settings come from the "app" and "server" sections of config.json and can
+be overridden from the command line, e.g.::
+
+    python serve.py --workers 4 --port 5000
+
+Every worker is a separate process with its own caches and connection
+pool, so size ``pool_size`` in the database section per worker; the
+caches follow other workers' writes by polling the database (see
+changes.py and leaderboard.py). The
+worker count is passed on in QUIZ_WORKERS, so that with several workers
+attempt sessions are kept in the shared SQLite store.
+"""
+import argparse
+import os
+import secrets
+import uvicorn
+from config import get_setting
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the quiz API over ASGI')
+    parser.add_argument('--host', default=get_setting('app', 'host', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=get_setting('app', 'port', 5000))
+    parser.add_argument('--workers', type=int,
+                        default=get_setting('server', 'workers') or os.cpu_count() or 1)
+    parser.add_argument('--backlog', type=int, default=get_setting('server', 'backlog', 2048))
+    args = parser.parse_args()
+
+    # Read by every worker when it creates its session store
+    os.environ['QUIZ_WORKERS'] = str(args.workers)
+    # Workers must sign and verify draw tokens with the same key
+    os.environ.setdefault('QUIZ_SECRET_KEY', get_setting('app', 'secret_key', None) or secrets.token_hex(32))
+    uvicorn.run(
+        'asgi:application',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=get_setting('server', 'keep_alive_seconds', 5),
+        log_level='info'
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from config import get_setting
+
+
+class QuizSession:
+    """One started attempt: which draw was served and when time runs out"""
+    __slots__ = ('token', 'quiz_id', 'seed', 'count', 'deadline')
+
+    def __init__(self, token, quiz_id, seed, count, deadline):
+        self.token = token
+        self.quiz_id = quiz_id
+        self.seed = seed
+        self.count = count
+        self.deadline = deadline
+
+
+class SessionStore:
+    """In-memory store of active quiz sessions with TTL eviction.
+
+    Sessions are kept in a dict by token and filed in a timing wheel: a
+    dict of buckets keyed by the tick (``resolution`` seconds) in which
+    they expire. A sweep pops the buckets of the ticks that have passed,
+    so its cost is proportional to the sessions it evicts, never to the
+    number still active. Sweeps run on every start(). Deadlines are wall
+    clock (time.time()) so they mean the same thing in every worker.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'active': ('gauge', 'Attempt sessions started and not yet submitted or expired'),
+        'started': ('counter', 'Attempt sessions started'),
+        'finished': ('counter', 'Attempt sessions submitted'),
+        'expired': ('counter', 'Attempt sessions swept after their deadline')
+    }
+
+    def __init__(self, grace=5.0, resolution=1.0):
+        self.grace = grace
+        self.resolution = resolution
+        self._sessions = {}
+        self._wheel = {}
+        self._next_tick = None
+        self._lock = threading.Lock()
+        self.started = 0
+        self.finished = 0
+        self.expired = 0
+
+    def _tick(self, timestamp):
+        return int(timestamp // self.resolution)
+
+    def start(self, quiz_id, seed, count, time_limit, now=None):
+        """Open a session that must be finished within time_limit seconds"""
+        now = time.time() if now is None else now
+        session = QuizSession(uuid.uuid4().hex, quiz_id, seed, count, now + time_limit)
+        with self._lock:
+            self._sweep(now)
+            self._sessions[session.token] = session
+            self._wheel.setdefault(self._tick(session.deadline + self.grace) + 1, []).append(session.token)
+            self.started += 1
+        return session
+
+    def get(self, token):
+        """Return the active session for token, or None"""
+        return self._sessions.get(token)
+
+    def finish(self, token):
+        """Remove and return the session for token, or None if it is unknown or was already finished"""
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if session is not None:
+                self.finished += 1
+        return session
+
+    def sweep(self, now=None):
+        """Evict every session whose deadline and grace period have passed"""
+        with self._lock:
+            return self._sweep(time.time() if now is None else now)
+
+    def _sweep(self, now):
+        now_tick = self._tick(now)
+        if self._next_tick is None:
+            self._next_tick = now_tick
+        if now_tick < self._next_tick:
+            return 0
+
+        # After a long idle spell, visit the occupied buckets instead of every tick
+        if now_tick - self._next_tick > len(self._wheel):
+            ticks = sorted(tick for tick in self._wheel if tick <= now_tick)
+        else:
+            ticks = range(self._next_tick, now_tick + 1)
+
+        evicted = 0
+        for tick in ticks:
+            for token in self._wheel.pop(tick, ()):
+                if self._sessions.pop(token, None) is not None:
+                    evicted += 1
+        self._next_tick = now_tick + 1
+        self.expired += evicted
+        return evicted
+
+    def clear(self):
+        """Drop every session"""
+        with self._lock:
+            self._sessions.clear()
+            self._wheel.clear()
+            self._next_tick = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Session counters for the metrics endpoint"""
+        return {
+            'active': len(self._sessions),
+            'started': self.started,
+            'finished': self.finished,
+            'expired': self.expired
+        }
+
+
+class SqliteSessionStore(SessionStore):
+    """Session store kept in a SQLite file so sessions survive restarts.
+
+    Every worker that opens the same file shares the sessions. Expired
+    rows are deleted through the index on ``expires_at`` whenever a
+    session is started.
+    """
+
+    def __init__(self, path, grace=5.0, resolution=1.0):
+        super().__init__(grace, resolution)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA busy_timeout = 5000')
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS quiz_session (
+                token TEXT PRIMARY KEY, quiz_id INTEGER NOT NULL, seed TEXT NOT NULL,
+                count INTEGER, deadline REAL NOT NULL, expires_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS ix_quiz_session_expires_at ON quiz_session (expires_at)'
+        )
+
+    def start(self, quiz_id, seed, count, time_limit, now=None):
+        now = time.time() if now is None else now
+        session = QuizSession(uuid.uuid4().hex, quiz_id, seed, count, now + time_limit)
+        with self._lock:
+            self._sweep(now)
+            self._connection.execute(
+                'INSERT INTO quiz_session VALUES (?, ?, ?, ?, ?, ?)',
+                (session.token, quiz_id, seed, count, session.deadline, session.deadline + self.grace)
+            )
+            self.started += 1
+        return session
+
+    def get(self, token):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT token, quiz_id, seed, count, deadline FROM quiz_session WHERE token = ?', (token,)
+            ).fetchone()
+        return QuizSession(*row) if row else None
+
+    def finish(self, token):
+        with self._lock:
+            row = self._connection.execute(
+                'DELETE FROM quiz_session WHERE token = ? RETURNING token, quiz_id, seed, count, deadline', (token,)
+            ).fetchone()
+            if row is not None:
+                self.finished += 1
+        return QuizSession(*row) if row else None
+
+    def _sweep(self, now):
+        evicted = self._connection.execute('DELETE FROM quiz_session WHERE expires_at < ?', (now,)).rowcount
+        self.expired += evicted
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM quiz_session')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT count(*) FROM quiz_session').fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats['active'] = len(self)
+        return stats
+
+
+def create_session_store():
+    """Build the session store selected by the sessions section of config.json.
+
+    The default, "auto", keeps sessions in memory in a single process and
+    in the shared SQLite store when serve.py runs several workers
+    (QUIZ_WORKERS), since a submission may reach a different worker than
+    the /start that opened its session.
+    """
+    grace = get_setting('sessions', 'grace_seconds', 5)
+    resolution = get_setting('sessions', 'sweep_resolution_seconds', 1)
+    path = os.environ.get('SESSION_DB') or get_setting('sessions', 'sqlite_path', None)
+    store = get_setting('sessions', 'store', 'auto')
+    shared = store == 'auto' and int(os.environ.get('QUIZ_WORKERS') or 1) > 1
+    if store == 'sqlite' or shared or os.environ.get('SESSION_DB'):
+        path = path or os.path.join(os.path.dirname(__file__), 'instance', 'sessions.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SqliteSessionStore(path, grace, resolution)
+    return SessionStore(grace, resolution)
+
+
+session_store = create_session_store()
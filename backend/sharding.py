@@ -0,0 +1,182 @@
+"""Horizontal sharding of the quiz data by quiz id.
+
+The main database is shard 0; ``sharding.shards`` in config.json (or the
+comma-separated ``QUIZ_SHARDS`` variable) lists further databases, as
+URIs or as SQLite file names in the instance folder. A quiz lives in one
+shard together with its questions, options, attempts, saved answers,
+statistics and search entries, so each shard has its own write lock and
+write load spreads across them.
+
+A quiz's shard follows from its id, ``(quiz_id - 1) % N``. New quizzes
+are placed round-robin and take the next id of their shard's residue
+class, so ids stay unique across shards (changing N means moving data;
+check_placement() refuses a shard list that doesn't match the data).
+The next id is ``MAX(id) + N`` evaluated inside the INSERT, which is only
+race-free under SQLite's database-wide write lock, so with more than one
+shard every database must be SQLite.
+While a shard is selected, ``db.session`` binds to its engine, so the
+rest of the code keeps using ``db.session``: requests whose URL has a
+quiz_id are routed before the view runs, background writers select the
+shard of each batch, and work spanning all quizzes (the quiz listing,
+search, warm-up, migrations) runs once per shard with ``each()`` and
+merges the results.
+"""
+import itertools
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import make_url
+from config import get_setting
+from database import db, session_bind, get_engine_options, apply_sqlite_pragmas
+from metrics import metrics
+from models import Quiz
+
+# Shard db.session is bound to, None outside use() and routed requests
+_current_shard = ContextVar('quiz_shard', default=None)
+
+
+def resolve_shard_uri(entry):
+    """A database URI, or a SQLite file name in the instance folder"""
+    if '://' in entry:
+        return entry
+    return f"sqlite:///{os.path.join(os.path.dirname(__file__), 'instance', entry)}"
+
+
+class ShardMap:
+    """The shard engines and the routing of quiz ids to them"""
+
+    def __init__(self):
+        self.engines = []
+        self._placement = itertools.count()
+
+    def init_app(self, app):
+        """Create the shard engines and route requests by their quiz_id"""
+        with app.app_context():
+            self.configure()
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def configure(self, uris=None):
+        """Use the main database as shard 0 plus one engine per further URI; needs an app context"""
+        if uris is None:
+            configured = os.environ.get('QUIZ_SHARDS')
+            uris = configured.split(',') if configured else get_setting('sharding', 'shards', [])
+        uris = [resolve_shard_uri(entry) for entry in uris]
+        if uris and any(make_url(uri).get_backend_name() != 'sqlite' for uri in [db.engine.url] + uris):
+            raise RuntimeError('Sharding needs SQLite databases: new quiz ids rely on its write lock')
+
+        for engine in self.engines[1:]:
+            engine.dispose()
+        self.engines = [db.engine]
+        for uri in uris:
+            engine = create_engine(uri, **get_engine_options(uri))
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', apply_sqlite_pragmas)
+            metrics.instrument(engine)
+            self.engines.append(engine)
+
+    def check_placement(self):
+        """Raise RuntimeError if a shard holds quizzes whose id maps to another shard; needs the schema"""
+        if self.count == 1:
+            return
+        for shard, engine in enumerate(self.engines):
+            with engine.connect() as connection:
+                misplaced = connection.execute(
+                    select(func.count()).select_from(Quiz).where((Quiz.id - 1) % self.count != shard)
+                ).scalar()
+            if misplaced:
+                raise RuntimeError(f'Shard {shard} holds {misplaced} quizzes whose id belongs to another of the '
+                                   f'{self.count} shards; the shard list does not match the data')
+
+    @property
+    def count(self):
+        return len(self.engines) or 1
+
+    def shard_for(self, quiz_id):
+        """Index of the shard holding quiz_id"""
+        return (quiz_id - 1) % self.count
+
+    def current(self):
+        """Index of the shard db.session is bound to"""
+        shard = _current_shard.get()
+        return 0 if shard is None else shard
+
+    @contextmanager
+    def use(self, shard):
+        """Bind db.session to a shard for the duration of the block"""
+        tokens = self._select(shard)
+        try:
+            yield
+        finally:
+            self._restore(tokens)
+
+    def each(self, work):
+        """Run work() once per shard with db.session bound to it; return the results in shard order"""
+        results = []
+        for shard in range(self.count):
+            with self.use(shard):
+                results.append(work())
+        return results
+
+    def partition(self, items, quiz_id_of):
+        """Group items by the shard of their quiz as {shard: [item, ...]}"""
+        if self.count == 1:
+            return {0: list(items)} if items else {}
+        groups = {}
+        for item in items:
+            groups.setdefault(self.shard_for(quiz_id_of(item)), []).append(item)
+        return groups
+
+    def route(self, quiz_id):
+        """Bind db.session to the shard of quiz_id for the rest of the request"""
+        self.route_shard(self.shard_for(quiz_id))
+
+    def route_shard(self, shard):
+        g.setdefault('shard_tokens', []).append(self._select(shard))
+
+    def place(self):
+        """Choose the shard of a new quiz (round-robin)"""
+        return next(self._placement) % self.count
+
+    def place_quiz(self, quiz):
+        """Place a new Quiz in a shard, route the request there and assign its id.
+
+        With a single database nothing changes and the id is autoincremented.
+        """
+        if self.count == 1:
+            return
+        shard = self.place()
+        self.route_shard(shard)
+        quiz.id = self.next_quiz_id(shard)
+
+    def next_quiz_id(self, shard):
+        """SQL for the next free quiz id of shard.
+
+        It is evaluated inside the INSERT, under the shard's write lock, so
+        concurrent writers cannot take the same id.
+        """
+        return select(func.coalesce(func.max(Quiz.id), shard + 1 - self.count) + self.count).scalar_subquery()
+
+    def _select(self, shard):
+        engine = self.engines[shard] if self.count > 1 else None
+        return _current_shard.set(shard), session_bind.set(engine)
+
+    @staticmethod
+    def _restore(tokens):
+        shard_token, bind_token = tokens
+        session_bind.reset(bind_token)
+        _current_shard.reset(shard_token)
+
+    def _before_request(self):
+        quiz_id = (request.view_args or {}).get('quiz_id')
+        if quiz_id is not None and self.count > 1:
+            self.route(quiz_id)
+
+    def _teardown_request(self, exception=None):
+        for tokens in reversed(g.pop('shard_tokens', [])):
+            self._restore(tokens)
+
+
+shards = ShardMap()
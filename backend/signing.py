@@ -0,0 +1,58 @@
+"""HMAC-signed tokens for state the server hands to a client and must get back unchanged.
+
+A token is ``<payload>.<signature>``: the payload is URL-safe base64 of
+compact JSON and the signature an HMAC-SHA256 of it. The key comes from
+QUIZ_SECRET_KEY or ``app.secret_key`` in config.json; without one each
+process makes up its own, so serve.py generates a key for all of its
+workers when none is configured.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from config import get_setting
+
+
+def get_secret_key():
+    """The configured signing key, or a random one for this process"""
+    return os.environ.get('QUIZ_SECRET_KEY') or get_setting('app', 'secret_key', None) or secrets.token_hex(32)
+
+
+def _encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class Signer:
+    """Sign JSON payloads and verify them on the way back"""
+
+    def __init__(self, key=None):
+        self.key = (key or get_secret_key()).encode('utf-8')
+
+    def _signature(self, payload):
+        return _encode(hmac.new(self.key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def sign(self, data):
+        """Return a token carrying data"""
+        payload = _encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return f'{payload}.{self._signature(payload)}'
+
+    def unsign(self, token):
+        """Return the data of a token signed with this key, or None if it is malformed or forged"""
+        if not isinstance(token, str):
+            return None
+        payload, _, signature = token.partition('.')
+        try:
+            if not signature or not hmac.compare_digest(signature, self._signature(payload)):
+                return None
+            return json.loads(_decode(payload))
+        except (TypeError, ValueError):
+            return None
+
+
+signer = Signer()
@@ -0,0 +1,330 @@
+"""Compiled, memory-mapped snapshot of the quiz bank.
+
+``compile_snapshot`` writes every quiz, question and option into one
+read-only binary file; workers mmap it, so the bank is held once in the
+OS page cache and shared by every process instead of being loaded into
+each worker through the ORM. Layout (little-endian):
+
+    header    magic, format version, build time, quiz/question/option counts
+    quizzes   (id, title offset, title length, first question, question count, updated_at), sorted by id
+    questions (id, text offset, text length, first option, option count, correct option id or 0)
+    options   (id, text offset, text length)
+    strings   UTF-8 text referenced by the offsets above
+
+Questions are stored in quiz order and options in id order, so a quiz is
+a binary search over the quiz table followed by contiguous reads. Each
+quiz keeps the ``quiz.updated_at`` it was compiled at, so any process can
+tell whether the database holds a newer version (see changes.py).
+Compile with ``python init_db.py --snapshot``, ``python snapshot.py`` or
+``POST /api/admin/snapshot``.
+"""
+import heapq
+import io
+import mmap
+import os
+import struct
+import threading
+import time
+from sqlalchemy import select
+from changes import quiz_changes
+from config import get_setting
+from database import db
+from models import Quiz, Question, Option
+from sharding import shards
+
+MAGIC = b'QZBK'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<4sIdIII')
+QUIZ_RECORD = struct.Struct('<IIIIId')
+QUESTION_RECORD = struct.Struct('<IIIIII')
+OPTION_RECORD = struct.Struct('<III')
+
+
+def get_snapshot_path():
+    """Where the snapshot lives: QUIZ_SNAPSHOT, config.json, or instance/quiz_bank.snap"""
+    return (
+        os.environ.get('QUIZ_SNAPSHOT')
+        or get_setting('snapshot', 'path', None)
+        or os.path.join(os.path.dirname(__file__), 'instance', 'quiz_bank.snap')
+    )
+
+
+def compile_snapshot(path=None):
+    """Write the current quiz bank to a snapshot file and return its counts.
+
+    The file is written next to the target and renamed over it, so workers
+    that still map the previous snapshot keep reading a consistent file.
+    """
+    path = path or get_snapshot_path()
+    built_at = time.time()
+
+    strings = io.BytesIO()
+
+    def add_string(text):
+        data = text.encode('utf-8')
+        offset = strings.tell()
+        strings.write(data)
+        return offset, len(data)
+
+    quiz_records = []
+    question_records = []
+    option_records = []
+    for quiz_id, title, updated_at, questions in heapq.merge(*shards.each(_read_quiz_bank)):
+        quiz_records.append(QUIZ_RECORD.pack(
+            quiz_id, *add_string(title), len(question_records), len(questions), updated_at
+        ))
+        for question_id, text, correct_option_id, options in questions:
+            question_records.append(QUESTION_RECORD.pack(
+                question_id, *add_string(text), len(option_records), len(options), correct_option_id
+            ))
+            for option_id, option_text in options:
+                option_records.append(OPTION_RECORD.pack(option_id, *add_string(option_text)))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, built_at,
+                            len(quiz_records), len(question_records), len(option_records)))
+        for records in (quiz_records, question_records, option_records):
+            f.write(b''.join(records))
+        f.write(strings.getbuffer())
+    os.replace(temporary_path, path)
+
+    return {
+        'path': path,
+        'quizzes': len(quiz_records),
+        'questions': len(question_records),
+        'options': len(option_records),
+        'bytes': os.path.getsize(path),
+        'builtAt': built_at
+    }
+
+
+def _read_quiz_bank():
+    """The quizzes of the current shard as (id, title, updated_at, questions) sorted by id.
+
+    Each question is (id, text, correct option id or 0, [(option id, text)]).
+    Question and option ids are only unique within a shard, so shards are
+    read separately and merged by quiz id. Quizzes are read first: a write
+    that lands while the questions are read has a later updated_at than
+    the one recorded, so the quiz counts as changed.
+    """
+    quizzes = db.session.execute(select(Quiz.id, Quiz.title, Quiz.updated_at).order_by(Quiz.id)).all()
+
+    options_by_question = {}
+    for option_id, question_id, text in db.session.execute(
+        select(Option.id, Option.question_id, Option.text).order_by(Option.question_id, Option.id)
+    ):
+        options_by_question.setdefault(question_id, []).append((option_id, text))
+    correct_by_question = {}
+    for option_id, question_id in db.session.execute(
+        select(Option.id, Option.question_id).where(Option.is_correct).order_by(Option.id)
+    ):
+        correct_by_question.setdefault(question_id, option_id)
+
+    questions_by_quiz = {}
+    for question_id, quiz_id, text in db.session.execute(
+        select(Question.id, Question.quiz_id, Question.text).order_by(Question.quiz_id, Question.position, Question.id)
+    ):
+        questions_by_quiz.setdefault(quiz_id, []).append((
+            question_id, text, correct_by_question.get(question_id, 0), options_by_question.get(question_id, [])
+        ))
+
+    return [
+        (quiz_id, title, updated_at, questions_by_quiz.get(quiz_id, []))
+        for quiz_id, title, updated_at in quizzes
+    ]
+
+
+class QuizBankSnapshot:
+    """Read-only view over one mapped snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.built_at, self.quiz_count, self.question_count, self.option_count = (
+            HEADER.unpack_from(self._map, 0)
+        )
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} quiz bank snapshot')
+
+        self._quizzes = HEADER.size
+        self._questions = self._quizzes + self.quiz_count * QUIZ_RECORD.size
+        self._options = self._questions + self.question_count * QUESTION_RECORD.size
+        self._strings = self._options + self.option_count * OPTION_RECORD.size
+
+    def _text(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _find_quiz(self, quiz_id):
+        low, high = 0, self.quiz_count
+        while low < high:
+            middle = (low + high) // 2
+            record = QUIZ_RECORD.unpack_from(self._map, self._quizzes + middle * QUIZ_RECORD.size)
+            if record[0] < quiz_id:
+                low = middle + 1
+            elif record[0] > quiz_id:
+                high = middle
+            else:
+                return record
+        return None
+
+    def __contains__(self, quiz_id):
+        return self._find_quiz(quiz_id) is not None
+
+    def title(self, quiz_id):
+        """Title of a quiz, or None if it is not in the snapshot"""
+        record = self._find_quiz(quiz_id)
+        return self._text(record[1], record[2]) if record else None
+
+    def updated_at(self, quiz_id):
+        """The quiz.updated_at a quiz was compiled at, or None if it is not in the snapshot"""
+        record = self._find_quiz(quiz_id)
+        return record[5] if record else None
+
+    def questions(self, quiz_id):
+        """The quiz's questions as {question_id: (text, correct_option_id, {option_id: text})}, or None"""
+        record = self._find_quiz(quiz_id)
+        if record is None:
+            return None
+
+        _, _, _, first_question, question_count, _ = record
+        questions = {}
+        for index in range(first_question, first_question + question_count):
+            question_id, text_offset, text_length, first_option, option_count, correct_option_id = (
+                QUESTION_RECORD.unpack_from(self._map, self._questions + index * QUESTION_RECORD.size)
+            )
+            option_texts = {}
+            for option_index in range(first_option, first_option + option_count):
+                option_id, option_offset, option_length = OPTION_RECORD.unpack_from(
+                    self._map, self._options + option_index * OPTION_RECORD.size
+                )
+                option_texts[option_id] = self._text(option_offset, option_length)
+            questions[question_id] = (self._text(text_offset, text_length), correct_option_id or None, option_texts)
+        return questions
+
+    def close(self):
+        self._map.close()
+
+
+def _holds(snapshot, quiz_id, updated_at):
+    compiled_at = snapshot.updated_at(quiz_id)
+    return compiled_at is not None and compiled_at >= updated_at
+
+
+class SnapshotStore:
+    """The process's handle on the current snapshot file.
+
+    The file is re-checked at most every ``check_interval`` seconds and
+    remapped when it has been replaced, after which the reload listeners
+    run (the app clears its caches). Quizzes changed after the snapshot was
+    built, by any process according to ``quiz.updated_at``, are served
+    from the database until a newer snapshot includes them.
+    """
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'loaded': ('gauge', 'Whether a quiz bank snapshot is mapped'),
+        'quizzes': ('gauge', 'Quizzes in the mapped snapshot'),
+        'reloads': ('counter', 'Snapshot reloads'),
+        'changed_quizzes': ('gauge', 'Quizzes changed since the snapshot was built')
+    }
+
+    def __init__(self):
+        self.path = None
+        self.check_interval = 1.0
+        self.snapshot = None
+        self.reloads = 0
+        self._identity = None
+        self._next_check = 0.0
+        self._changed = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def configure(self, path=None):
+        """Read settings and map the snapshot if one exists"""
+        self.path = path or get_snapshot_path()
+        self.check_interval = get_setting('snapshot', 'check_interval_seconds', self.check_interval)
+        self._identity = None
+        self._next_check = 0.0
+        self._replace(None)
+        self.refresh()
+
+    def on_reload(self, listener):
+        """Register a callable run whenever a new snapshot is mapped (usable as a decorator)"""
+        self._listeners.append(listener)
+        return listener
+
+    def refresh(self):
+        """Remap the snapshot if the file changed since the last check"""
+        now = time.monotonic()
+        if self.path is None or now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + self.check_interval
+            try:
+                stat = os.stat(self.path)
+                identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                identity = None
+            if identity == self._identity:
+                return
+            self._identity = identity
+            try:
+                snapshot = QuizBankSnapshot(self.path) if identity else None
+            except ValueError:
+                # Written by an older version: serve from the database until it is recompiled
+                snapshot = None
+            self._replace(snapshot)
+            self.reloads += 1
+        for listener in self._listeners:
+            listener()
+
+    def _replace(self, snapshot):
+        # The old map is left to the garbage collector: a request may still be reading it
+        changed = set()
+        if snapshot is not None:
+            changed = {
+                quiz_id for quiz_id, updated_at in quiz_changes.changed_since(snapshot.built_at).items()
+                if not _holds(snapshot, quiz_id, updated_at)
+            }
+        self._changed = changed
+        self.snapshot = snapshot
+
+    def invalidate(self, quiz_id, updated_at=None):
+        """Stop serving quiz_id from the current snapshot, unless it already holds the quiz as of updated_at"""
+        snapshot = self.snapshot
+        if updated_at is not None and snapshot is not None and _holds(snapshot, quiz_id, updated_at):
+            return
+        self._changed.add(quiz_id)
+
+    def lookup(self, quiz_id):
+        """Return the snapshot if it holds current content for quiz_id, else None"""
+        snapshot = self.snapshot
+        if snapshot is None or quiz_id in self._changed or quiz_id not in snapshot:
+            return None
+        return snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            'loaded': int(snapshot is not None),
+            'quizzes': snapshot.quiz_count if snapshot else 0,
+            'reloads': self.reloads,
+            'changed_quizzes': len(self._changed)
+        }
+
+
+snapshots = SnapshotStore()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        result = compile_snapshot()
+    print(f"Compiled {result['quizzes']} quizzes, {result['questions']} questions and "
+          f"{result['options']} options into {result['path']} ({result['bytes']:,} bytes)")
@@ -0,0 +1,124 @@
+"""Warm-up and readiness of a worker.
+
+Importing and creating the app does no database work. Everything a
+worker needs before it serves traffic quickly (schema upgrade, pooled
+connections, the quiz bank snapshot, the answer keys of the most played
+quizzes) runs as registered warm-up steps, either in the background when
+the ASGI server starts the worker or on the first request. Until they
+have finished, ``/api/health`` answers 503 so load balancers keep traffic
+away, and other requests wait up to ``startup.request_wait_seconds``.
+"""
+import threading
+import time
+from flask import current_app, jsonify, request
+from config import get_setting
+
+
+class Readiness:
+    """Run the warm-up steps once and gate requests until they are done"""
+
+    # (metric type, help) of every stats() value, for /api/metrics
+    STATS = {
+        'ready': ('gauge', 'Whether warm-up has finished'),
+        'warmup_seconds': ('gauge', 'Duration of the warm-up')
+    }
+
+    def __init__(self, request_wait=30.0):
+        self.app = None
+        self.request_wait = request_wait
+        self.state = 'idle'
+        self.error = None
+        self.phases = {}
+        self.seconds = 0.0
+        self._steps = []
+        self._exempt = set()
+        self._ready = threading.Event()
+        self._run_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        """Bind to a Flask app, read settings and gate its requests"""
+        self.app = app
+        self.request_wait = get_setting('startup', 'request_wait_seconds', self.request_wait)
+        app.before_request(self._before_request)
+
+    def add_step(self, name, step):
+        """Register a warm-up step; steps run in order inside an app context"""
+        self._steps.append((name, step))
+
+    def exempt(self, view):
+        """Let a view answer before the worker is ready (usable as a decorator)"""
+        self._exempt.add(view)
+        return view
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """Run the warm-up in a background thread unless it is running or done"""
+        with self._start_lock:
+            if self.ready or (self._thread is not None and self._thread.is_alive()):
+                return
+            self.state = 'starting'
+            self._thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+            self._thread.start()
+
+    def run(self):
+        """Run every warm-up step now and return whether the worker is ready"""
+        with self._run_lock:
+            if self.ready:
+                return True
+            self.state = 'starting'
+            self.error = None
+            self.phases = {}
+            started = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    for name, step in self._steps:
+                        step_started = time.perf_counter()
+                        step()
+                        self.phases[name] = round((time.perf_counter() - step_started) * 1000, 2)
+            except Exception as e:
+                self.state = 'failed'
+                self.error = str(e)
+                self.app.logger.exception(f"Warm-up failed: {e}")
+                return False
+            finally:
+                self.seconds = time.perf_counter() - started
+
+            self.state = 'ready'
+            self._ready.set()
+            return True
+
+    def wait(self, timeout=None):
+        """Block until the worker is ready or timeout expires; return whether it is ready"""
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """Readiness as reported by /api/health"""
+        status = {'state': self.state, 'phasesMs': self.phases}
+        if self.error:
+            status['error'] = self.error
+        return status
+
+    def stats(self):
+        return {'ready': int(self.ready), 'warmup_seconds': round(self.seconds, 4)}
+
+    def _before_request(self):
+        if self.ready:
+            return None
+        # A failed warm-up is retried by the next request
+        self.start()
+        if current_app.view_functions.get(request.endpoint) in self._exempt:
+            return None
+        if self.wait(self.request_wait):
+            return None
+        response = jsonify({'error': 'Service is starting', 'state': self.state})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+
+readiness = Readiness()
@@ -0,0 +1,216 @@
+"""Incrementally maintained quiz statistics.
+
+Every batch the attempt writer persists is folded into counter tables
+(quiz totals, a score histogram, per-question and per-option counts) in
+the same transaction, so reading a quiz's statistics never scans its
+attempts. ``python stats.py`` rebuilds the counters from the full attempt
+history in streaming chunks, e.g. after a restore or a change to the
+aggregation::
+
+    python stats.py --chunk-size 10000
+"""
+import argparse
+import time
+from sqlalchemy import delete, select, update, insert
+from database import db, upsert_insert
+from models import Attempt, Answer, QuizStat, ScoreBucket, QuestionStat, OptionStat
+
+# Score histogram buckets are tenths of the percentage; a perfect score gets its own bucket
+HISTOGRAM_BUCKETS = 10
+
+# Attempt-answer rows read per chunk by the recompute job
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def score_bucket(score, total):
+    """Histogram bucket (0-10) of a score"""
+    return score * HISTOGRAM_BUCKETS // total if total else 0
+
+
+class StatsDelta:
+    """Counter increments accumulated from a batch of scored attempts"""
+    __slots__ = ('quizzes', 'buckets', 'questions', 'options')
+
+    def __init__(self):
+        self.quizzes = {}
+        self.buckets = {}
+        self.questions = {}
+        self.options = {}
+
+    def add_attempt(self, quiz_id, score, total):
+        attempts, score_sum, total_sum = self.quizzes.get(quiz_id, (0, 0, 0))
+        self.quizzes[quiz_id] = (attempts + 1, score_sum + score, total_sum + total)
+        key = (quiz_id, score_bucket(score, total))
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def add_answer(self, quiz_id, question_id, selected_option_id, is_correct):
+        _, shown, answered, correct = self.questions.get(question_id, (quiz_id, 0, 0, 0))
+        self.questions[question_id] = (
+            quiz_id, shown + 1, answered + (selected_option_id is not None), correct + bool(is_correct)
+        )
+        if selected_option_id is not None:
+            _, picks = self.options.get(selected_option_id, (quiz_id, 0))
+            self.options[selected_option_id] = (quiz_id, picks + 1)
+
+    def __bool__(self):
+        return bool(self.quizzes)
+
+    def apply(self):
+        """Add the increments to the counter tables; the caller commits"""
+        _increment(QuizStat, ['quiz_id'], ['attempts', 'score_sum', 'total_sum'], [
+            {'quiz_id': quiz_id, 'attempts': attempts, 'score_sum': score_sum, 'total_sum': total_sum}
+            for quiz_id, (attempts, score_sum, total_sum) in self.quizzes.items()
+        ])
+        _increment(ScoreBucket, ['quiz_id', 'bucket'], ['attempts'], [
+            {'quiz_id': quiz_id, 'bucket': bucket, 'attempts': attempts}
+            for (quiz_id, bucket), attempts in self.buckets.items()
+        ])
+        _increment(QuestionStat, ['question_id'], ['shown', 'answered', 'correct'], [
+            {'question_id': question_id, 'quiz_id': quiz_id, 'shown': shown, 'answered': answered, 'correct': correct}
+            for question_id, (quiz_id, shown, answered, correct) in self.questions.items()
+        ])
+        _increment(OptionStat, ['option_id'], ['picks'], [
+            {'option_id': option_id, 'quiz_id': quiz_id, 'picks': picks}
+            for option_id, (quiz_id, picks) in self.options.items()
+        ])
+
+
+def _increment(model, key_names, counter_names, rows):
+    """Insert rows, or add their counters to the existing rows with the same key"""
+    if not rows:
+        return
+    table = model.__table__
+    statement = upsert_insert(model)
+    if statement is not None:
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key_names],
+            set_={name: table.c[name] + statement.excluded[name] for name in counter_names}
+        )
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        key = [table.c[name] == row[name] for name in key_names]
+        result = db.session.execute(
+            update(table).where(*key).values({name: table.c[name] + row[name] for name in counter_names})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(row))
+
+
+def record_attempts(batch):
+    """Fold a batch of (attempt, answers) rows into the counters; the caller commits"""
+    delta = StatsDelta()
+    for attempt, answers in batch:
+        delta.add_attempt(attempt['quiz_id'], attempt['score'], attempt['total'])
+        for answer in answers:
+            delta.add_answer(attempt['quiz_id'], answer['question_id'], answer['selected_option_id'],
+                             answer['is_correct'])
+    delta.apply()
+
+
+def recompute(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rebuild every counter from the attempt history in one transaction.
+
+    Attempts and their answers are streamed from a server-side cursor and
+    folded in chunks, so memory is bounded by the chunk size and the size
+    of the question bank, not by the number of attempts. Returns the
+    number of attempts processed.
+    """
+    for model in (QuizStat, ScoreBucket, QuestionStat, OptionStat):
+        db.session.execute(delete(model))
+
+    rows = db.session.execute(
+        select(Attempt.id, Attempt.quiz_id, Attempt.score, Attempt.total,
+               Answer.question_id, Answer.selected_option_id, Answer.is_correct)
+        .outerjoin(Answer, Answer.attempt_id == Attempt.id)
+        .order_by(Attempt.id),
+        execution_options={'yield_per': chunk_size}
+    )
+
+    attempts = 0
+    last_attempt_id = None
+    for chunk in rows.partitions():
+        delta = StatsDelta()
+        for row in chunk:
+            if row.id != last_attempt_id:
+                delta.add_attempt(row.quiz_id, row.score, row.total)
+                last_attempt_id = row.id
+                attempts += 1
+            if row.question_id is not None:
+                delta.add_answer(row.quiz_id, row.question_id, row.selected_option_id, row.is_correct)
+        delta.apply()
+
+    db.session.commit()
+    return attempts
+
+
+def most_played(limit):
+    """Ids of the quizzes with the most scored attempts, most played first"""
+    return db.session.execute(
+        select(QuizStat.quiz_id).order_by(QuizStat.attempts.desc()).limit(limit)
+    ).scalars().all()
+
+
+def quiz_stats(answer_key):
+    """Read the statistics of one quiz from the counter tables.
+
+    Question and option texts come from the cached answer key. Correct
+    options are not revealed.
+    """
+    quiz_id = answer_key.quiz_id
+    totals = db.session.get(QuizStat, quiz_id)
+    buckets = dict(db.session.execute(
+        select(ScoreBucket.bucket, ScoreBucket.attempts).where(ScoreBucket.quiz_id == quiz_id)
+    ).all())
+    questions = {
+        row.question_id: row
+        for row in db.session.execute(select(QuestionStat).where(QuestionStat.quiz_id == quiz_id)).scalars()
+    }
+    picks = dict(db.session.execute(
+        select(OptionStat.option_id, OptionStat.picks).where(OptionStat.quiz_id == quiz_id)
+    ).all())
+
+    attempts = totals.attempts if totals else 0
+    question_list = []
+    for question_id, (question_text, _, option_texts) in answer_key.questions.items():
+        stat = questions.get(question_id)
+        shown = stat.shown if stat else 0
+        question_list.append({
+            'questionId': question_id,
+            'text': question_text,
+            'shown': shown,
+            'answered': stat.answered if stat else 0,
+            'correct': stat.correct if stat else 0,
+            'correctRate': round(stat.correct / shown, 4) if shown else None,
+            'options': [
+                {'optionId': option_id, 'text': option_text, 'picks': picks.get(option_id, 0)}
+                for option_id, option_text in option_texts.items()
+            ]
+        })
+
+    return {
+        'quizId': quiz_id,
+        'attempts': attempts,
+        'averageScore': round(totals.score_sum / attempts, 2) if attempts else None,
+        'averagePercentage': round(totals.score_sum / totals.total_sum * 100, 2) if attempts and totals.total_sum else None,
+        'histogram': [
+            {'minPercentage': bucket * 100 // HISTOGRAM_BUCKETS, 'attempts': buckets.get(bucket, 0)}
+            for bucket in range(HISTOGRAM_BUCKETS + 1)
+        ],
+        'questions': question_list
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild quiz statistics from the attempt history')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows folded per chunk')
+    args = parser.parse_args()
+
+    from app import app
+    from sharding import shards
+
+    with app.app_context():
+        started = time.perf_counter()
+        count = sum(shards.each(lambda: recompute(args.chunk_size)))
+    print(f"Recomputed statistics from {count} attempts in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,55 @@
+import threading
+import time
+from admission import admission, AdmissionLimit
+from conftest import submit_first_options
+
+def test_admission_limit_queues_in_order_and_rejects():
+    """Test the concurrency limit, FIFO hand-over and both kinds of rejection"""
+    limit = AdmissionLimit(concurrency=1, queue_size=2, queue_timeout=5)
+    assert limit.acquire() == ('admitted', 0.0)
+    
+    order = []
+    def wait_for_slot(name):
+        outcome, _ = limit.acquire()
+        order.append((name, outcome))
+        limit.release()
+    
+    threads = []
+    for name in ['first', 'second']:
+        thread = threading.Thread(target=wait_for_slot, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while limit.queued < len(threads):
+            time.sleep(0.001)
+    
+    assert limit.acquire() == ('rejected_full', 0.0)
+    limit.release(0.2)
+    for thread in threads:
+        thread.join()
+    assert order == [('first', 'queued'), ('second', 'queued')]
+    assert limit.active == 0
+    
+    limit.acquire()
+    outcome, waited = limit.acquire(timeout=0.01)
+    assert outcome == 'rejected_timeout' and waited >= 0.01
+    assert limit.queued == 0
+
+def test_saturated_route_answers_429(client, monkeypatch):
+    """Test that a saturated route rejects with Retry-After and reports it in the metrics"""
+    monkeypatch.setattr(admission, 'limits', {})
+    limit = admission.limit('POST /api/quizzes/<int:quiz_id>/submit', concurrency=1)
+    
+    limit.acquire()
+    response = submit_first_options(client)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    
+    limit.release()
+    assert submit_first_options(client).status_code == 200
+    assert limit.active == 0
+    
+    text = client.get('/api/metrics').data.decode()
+    route = 'route="/api/quizzes/<int:quiz_id>/submit",method="POST"'
+    assert f'quiz_admission_requests_total{{{route},outcome="rejected_full"}} 1' in text
+    assert f'quiz_admission_requests_total{{{route},outcome="admitted"}} 1' in text
+    assert f'quiz_admission_queue_wait_seconds_count{{{route}}} 2' in text
@@ -0,0 +1,28 @@
+import asyncio
+import json
+from asgi import application
+
+def test_asgi_application_serves_routes(client):
+    """Test the ASGI entry point end to end"""
+    async def call():
+        messages = []
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': '/api/quizzes/1/questions',
+            'raw_path': b'/api/quizzes/1/questions', 'query_string': b'',
+            'headers': [], 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)
+        }
+        
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        
+        async def send(message):
+            messages.append(message)
+        
+        await application(scope, receive, send)
+        return messages
+    
+    messages = asyncio.run(call())
+    assert messages[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    assert len(json.loads(body)) == 3
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from app import app, db
+from models import Attempt
+from scoring import answer_keys
+from attempts import attempt_writer, build_attempt_rows
+
+def test_submission_is_persisted(client):
+    """Test that a submission is written to the attempt tables"""
+    questions = json.loads(client.get('/api/quizzes/1/questions').data)
+    answers = [
+        {"questionId": questions[0]['id'], "selectedOptionId": questions[0]['options'][1]['id']},  # 4 (correct)
+        {"questionId": questions[1]['id'], "selectedOptionId": questions[1]['options'][0]['id']}   # London (wrong)
+    ]
+    
+    response = client.post('/api/quizzes/1/submit',
+                          data=json.dumps({'answers': answers, 'participant': 'alice'}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    attempt_id = json.loads(response.data)['attemptId']
+    
+    attempt_writer.flush()
+    assert attempt_writer.stats()['queue_depth'] == 0
+    
+    with app.app_context():
+        attempt = db.session.get(Attempt, attempt_id)
+        assert attempt.participant == 'alice'
+        assert (attempt.score, attempt.total) == (1, 3)
+        
+        saved = {answer.question_id: answer for answer in attempt.answers}
+        assert len(saved) == 3
+        assert saved[questions[0]['id']].is_correct is True
+        assert saved[questions[1]['id']].selected_option_id == questions[1]['options'][0]['id']
+        assert saved[questions[2]['id']].selected_option_id is None
+
+def test_attempt_writer_keeps_the_writable_part_of_a_failing_batch(client, monkeypatch):
+    """Test that a batch that keeps failing is retried, then written attempt by attempt"""
+    monkeypatch.setattr(attempt_writer, 'retry_delay', 0)
+    with app.app_context():
+        answer_key = answer_keys.get(1)
+        result = answer_key.score_summary({})
+        first = build_attempt_rows(answer_key, {}, result, 'first')
+        attempt_writer.submit(*first)
+        attempt_writer.flush()
+        
+        # The same attempt id again fails every try; the other attempt of the batch is kept
+        duplicate = build_attempt_rows(answer_key, {}, result, 'again', attempt_id=first[0]['id'])
+        other = build_attempt_rows(answer_key, {}, result, 'other')
+        before = attempt_writer.stats()
+        attempt_writer.submit(*duplicate)
+        attempt_writer.submit(*other)
+        attempt_writer.flush()
+        after = attempt_writer.stats()
+        
+        assert after['failed'] == before['failed'] + 1
+        assert after['written'] == before['written'] + 1
+        assert after['retries'] >= before['retries'] + attempt_writer.write_retries
+        assert db.session.get(Attempt, other[0]['id']).participant == 'other'
+        assert db.session.get(Attempt, first[0]['id']).participant == 'first'
+
+def test_attempt_writer_flush_returns_while_submissions_keep_coming(client):
+    """Test that flush() waits for earlier attempts only, not for a queue that never drains"""
+    with app.app_context():
+        answer_key = answer_keys.get(1)
+        result = answer_key.score_summary({})
+    stop = threading.Event()
+    
+    def keep_submitting():
+        while not stop.is_set():
+            attempt_writer.submit(*build_attempt_rows(answer_key, {}, result, 'burst'))
+    
+    earlier = build_attempt_rows(answer_key, {}, result, 'earlier')
+    attempt_writer.submit(*earlier)
+    submitter = threading.Thread(target=keep_submitting)
+    submitter.start()
+    try:
+        started = time.monotonic()
+        attempt_writer.flush()
+        assert time.monotonic() - started < 10
+        with app.app_context():
+            assert db.session.get(Attempt, earlier[0]['id']) is not None
+    finally:
+        stop.set()
+        submitter.join()
+    attempt_writer.flush()
+    assert attempt_writer.stats()['queue_depth'] == 0
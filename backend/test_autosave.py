@@ -0,0 +1,114 @@
+import json
+from app import app, db
+from models import Option, SavedAnswer
+from sessions import session_store
+from autosave import autosave
+
+def test_autosave_coalesces_and_submit_uses_saved_answers(client):
+    """Test autosaving answers during an attempt and submitting without resending them"""
+    started = json.loads(client.post('/api/quizzes/1/start').data)
+    token = started['attemptToken']
+    first, second = started['questions'][:2]
+    with app.app_context():
+        correct = dict(db.session.query(Option.question_id, Option.id).filter(Option.is_correct))
+    
+    def patch(question, option_id):
+        return client.patch(f'/api/attempts/{token}/answers',
+                            data=json.dumps({'answers': [{'questionId': question['id'], 'selectedOptionId': option_id}]}),
+                            content_type='application/json')
+    
+    wrong = next(option['id'] for option in first['options'] if option['id'] != correct[first['id']])
+    assert patch(first, wrong).status_code == 202
+    assert patch(first, correct[first['id']]).status_code == 202
+    assert autosave.stats()['pending_answers'] == 1
+    
+    autosave.flush()
+    assert patch(second, correct[second['id']]).status_code == 202
+    with app.app_context():
+        assert SavedAnswer.query.count() == 1
+    
+    # Saved answers survive a reload, merged from the database and the buffer
+    resumed = json.loads(client.get(f'/api/attempts/{token}').data)
+    assert resumed['questions'] == started['questions']
+    assert sorted(answer['selectedOptionId'] for answer in resumed['answers']) == sorted(
+        [correct[first['id']], correct[second['id']]]
+    )
+    
+    response = client.post('/api/quizzes/1/submit', data=json.dumps({'attemptToken': token}),
+                           content_type='application/json')
+    assert json.loads(response.data)['score'] == 2
+    
+    autosave.flush()
+    with app.app_context():
+        assert SavedAnswer.query.count() == 0
+    assert patch(first, wrong).status_code == 410
+
+def test_autosave_rejects_unknown_questions(client):
+    """Test validation of autosaved answers"""
+    token = json.loads(client.post('/api/quizzes/1/start').data)['attemptToken']
+    response = client.patch(f'/api/attempts/{token}/answers',
+                            data=json.dumps({'answers': [{'questionId': 999, 'selectedOptionId': 1}]}),
+                            content_type='application/json')
+    assert response.status_code == 400
+    response = client.patch(f'/api/attempts/{token}/answers', data=json.dumps({}),
+                            content_type='application/json')
+    assert response.status_code == 400
+    for answer in [{'questionId': [1], 'selectedOptionId': 1}, {'questionId': 1, 'selectedOptionId': {'id': 1}}]:
+        response = client.patch(f'/api/attempts/{token}/answers', data=json.dumps({'answers': [answer]}),
+                                content_type='application/json')
+        assert response.status_code == 400
+    assert client.get('/api/attempts/unknown').status_code == 410
+
+def test_autosave_retries_answers_a_failed_flush_could_not_write(client, monkeypatch):
+    """Test that answers of a failed flush are kept, still readable and written by the next flush"""
+    started = json.loads(client.post('/api/quizzes/1/start').data)
+    token = started['attemptToken']
+    question = started['questions'][0]
+    first, second = question['options'][0]['id'], question['options'][1]['id']
+    
+    def patch(option_id):
+        return client.patch(f'/api/attempts/{token}/answers',
+                            data=json.dumps({'answers': [{'questionId': question['id'], 'selectedOptionId': option_id}]}),
+                            content_type='application/json')
+    
+    def fail(rows):
+        raise RuntimeError('database unavailable')
+    
+    assert patch(first).status_code == 202
+    upsert = autosave._upsert
+    monkeypatch.setattr(autosave, '_upsert', fail)
+    failed = autosave.stats()['failed']
+    autosave.flush()
+    assert autosave.stats()['failed'] == failed + 1
+    assert autosave.stats()['pending_answers'] == 1
+    
+    resumed = json.loads(client.get(f'/api/attempts/{token}').data)
+    assert resumed['answers'] == [{'questionId': question['id'], 'selectedOptionId': first}]
+    
+    # A newer save wins over the requeued answer
+    assert patch(second).status_code == 202
+    monkeypatch.setattr(autosave, '_upsert', upsert)
+    autosave.flush()
+    assert autosave.stats()['pending_answers'] == 0
+    resumed = json.loads(client.get(f'/api/attempts/{token}').data)
+    assert resumed['answers'] == [{'questionId': question['id'], 'selectedOptionId': second}]
+
+def test_autosave_does_not_write_drafts_of_attempts_submitted_elsewhere(client):
+    """Test that a flush skips answers of an attempt another worker has already submitted"""
+    started = json.loads(client.post('/api/quizzes/1/start').data)
+    token = started['attemptToken']
+    question = started['questions'][0]
+    response = client.patch(f'/api/attempts/{token}/answers',
+                            data=json.dumps({'answers': [{'questionId': question['id'],
+                                                          'selectedOptionId': question['options'][0]['id']}]}),
+                            content_type='application/json')
+    assert response.status_code == 202
+    
+    # The shared session store is how this worker learns of the other one's submission
+    assert session_store.finish(token) is not None
+    dropped = autosave.stats()['dropped']
+    autosave.flush()
+    assert autosave.stats()['dropped'] == dropped + 1
+    assert autosave.stats()['pending_answers'] == 0
+    with app.app_context():
+        assert SavedAnswer.query.count() == 0
@@ -0,0 +1,22 @@
+import json
+from benchmark import run_benchmark
+
+def test_benchmark_smoke():
+    """Test that the benchmark suite runs and reports every scenario"""
+    report = run_benchmark(quizzes=3, questions=4, options=3, requests=5, hot_quizzes=2, reset=True, sessions=1000,
+                           startup_runs=1, burst_clients=4, shard_counts=(2,))
+    
+    assert report['generation']['rows'] == 3 + 12 + 36
+    for name in ['list', 'questions', 'submit', 'list_cold', 'questions_cold', 'submit_cold']:
+        result = report['results'][name]
+        assert result['requests'] == 5
+        assert result['p99_ms'] >= result['p50_ms']
+    assert report['results']['questions']['queries_per_request'] == 0
+    assert report['results']['questions_cold']['queries_per_request'] == 3
+    assert report['results']['session_store']['evicted'] == 1000
+    assert report['results']['submit_burst']['requests'] == 20
+    assert report['results']['startup']['ready']
+    assert set(report['results']['startup']['phases_ms']) == {'schema', 'connection_pool', 'change_feed', 'snapshot', 'answer_keys'}
+    shard_writes = report['results']['shard_writes']['2']
+    assert shard_writes['failed'] == 0 and shard_writes['attempts'] == 4 * 5 * 10
+    json.dumps(report)
@@ -0,0 +1,64 @@
+import json
+from conftest import count_queries, make_question
+
+def test_bulk_add_questions(client):
+    """Test adding many questions in one request with per-item errors"""
+    questions = [
+        make_question('Bulk question 1?'),
+        make_question('x' * 301),
+        make_question('Bulk question 2?', options=1),
+        make_question('Bulk question 3?', correct=None)
+    ]
+    
+    def add():
+        response = client.post('/api/quizzes/1/questions/bulk',
+                               data=json.dumps({'questions': questions + [make_question('Bulk question 4?')]}),
+                               content_type='application/json')
+        assert response.status_code == 201
+        return json.loads(response.data)
+    
+    # One transaction: a handful of statements no matter how many questions
+    statements = count_queries(add)
+    assert statements <= 9
+    
+    result = json.loads(client.get('/api/quizzes/1/questions').data)
+    assert [q['text'] for q in result[3:]] == ['Bulk question 1?', 'Bulk question 4?']
+    assert len(result[3]['options']) == 3
+
+def test_bulk_add_reports_errors_and_atomic_mode(client):
+    """Test error reporting and the all-or-nothing mode"""
+    questions = [make_question('Good?'), make_question('Bad?', options=7)]
+    
+    response = client.post('/api/quizzes/1/questions/bulk',
+                          data=json.dumps({'questions': questions}),
+                          content_type='application/json')
+    assert response.status_code == 201
+    result = json.loads(response.data)
+    assert len(result['question_ids']) == 1
+    assert result['errors'] == [{'index': 1, 'error': 'A question must have between 2 and 6 options'}]
+    
+    response = client.post('/api/quizzes/1/questions/bulk?atomic=true',
+                          data=json.dumps({'questions': questions}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    assert len(json.loads(client.get('/api/quizzes/1/questions').data)) == 4
+
+def test_import_quiz(client):
+    """Test creating a whole quiz in one request"""
+    response = client.post('/api/quizzes/import',
+                          data=json.dumps({
+                              'title': 'Imported Quiz',
+                              'questions': [make_question(f'Imported {i}?', correct=i % 3) for i in range(20)]
+                          }),
+                          content_type='application/json')
+    assert response.status_code == 201
+    quiz_id = json.loads(response.data)['id']
+    
+    questions = json.loads(client.get(f'/api/quizzes/{quiz_id}/questions').data)
+    assert len(questions) == 20
+    assert 'Imported Quiz' in [quiz['title'] for quiz in json.loads(client.get('/api/quizzes').data)]
+    
+    response = client.post('/api/quizzes/import',
+                          data=json.dumps({'title': 'Empty'}),
+                          content_type='application/json')
+    assert response.status_code == 400
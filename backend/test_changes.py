@@ -0,0 +1,23 @@
+import json
+from app import app, db
+from models import Question
+from changes import quiz_changes
+
+def test_changes_made_by_another_process_invalidate_caches(client):
+    """Test that a poll of quiz.updated_at drops caches of quizzes changed elsewhere"""
+    client.post('/api/admin/snapshot')
+    assert len(json.loads(client.get('/api/quizzes/1/questions').data)) == 3
+    etag = client.get('/api/quizzes/1/questions').headers['ETag']
+    
+    # Another worker adds a question; this process's caches are not told
+    with app.app_context():
+        db.session.add(Question(text='From another worker?', quiz_id=1, position=4))
+        quiz_changes.touch([1])
+        db.session.commit()
+    assert len(json.loads(client.get('/api/quizzes/1/questions').data)) == 3
+    
+    quiz_changes._next_check = 0
+    response = client.get('/api/quizzes/1/questions', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)) == 4
+    assert quiz_changes.stats()['changes'] >= 1
@@ -0,0 +1,177 @@
+import pytest
+import json
+import sqlite3
+import threading
+from flask import Flask
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import OperationalError
+from database import init_app, db, get_engine_options
+from importer import BulkImporter, iter_quiz_file
+from migrations import upgrade_schema
+from models import Quiz, Question, Option
+from search import search
+
+@pytest.fixture
+def file_app(tmp_path):
+    """Create a Flask app bound to a fresh SQLite file"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "load.db"}'
+    init_app(app)
+
+    with app.app_context():
+        db.create_all()
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def test_sqlite_pragmas_applied(file_app):
+    """Test that new connections use WAL and a busy timeout"""
+    with file_app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+
+def test_engine_options_for_file_and_memory():
+    """Test that pool options are only set for pooled engines"""
+    file_options = get_engine_options('sqlite:////tmp/quiz.db')
+    assert file_options['pool_size'] == 10
+    assert file_options['pool_recycle'] == 1800
+
+    assert 'pool_size' not in get_engine_options('sqlite:///:memory:')
+
+def test_concurrent_writes_do_not_lock(file_app):
+    """Load test: concurrent writers and readers never see 'database is locked'"""
+    threads_count = 8
+    writes_per_thread = 25
+    errors = []
+
+    def worker(worker_id):
+        with file_app.app_context():
+            for i in range(writes_per_thread):
+                try:
+                    quiz = Quiz(title=f'Quiz {worker_id}-{i}')
+                    question = Question(text='What is 2 + 2?', quiz=quiz)
+                    db.session.add(Option(text='4', is_correct=True, question=question))
+                    db.session.add(Option(text='5', is_correct=False, question=question))
+                    db.session.add(quiz)
+                    db.session.commit()
+                    Quiz.query.count()
+                except OperationalError as e:
+                    db.session.rollback()
+                    errors.append(str(e))
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with file_app.app_context():
+        assert Quiz.query.count() == threads_count * writes_per_thread
+        assert Option.query.count() == threads_count * writes_per_thread * 2
+
+def test_upgrade_schema_adds_indexes_to_existing_database(tmp_path):
+    """Test migrating a database created before indexes and positions existed"""
+    path = tmp_path / 'old.db'
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE quiz (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL);
+        CREATE TABLE question (id INTEGER PRIMARY KEY, text VARCHAR(300) NOT NULL,
+                               quiz_id INTEGER NOT NULL REFERENCES quiz (id));
+        CREATE TABLE option (id INTEGER PRIMARY KEY, text VARCHAR(200) NOT NULL,
+                             is_correct BOOLEAN NOT NULL, question_id INTEGER NOT NULL REFERENCES question (id));
+        INSERT INTO quiz VALUES (1, 'Old Quiz');
+        INSERT INTO question VALUES (1, 'Second?', 1), (2, 'First?', 1);
+        INSERT INTO option VALUES (1, 'Yes', 1, 1), (2, 'No', 0, 1);
+    """)
+    connection.close()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_app(app)
+
+    with app.app_context():
+        changes = upgrade_schema()
+        assert 'add column question.position' in changes
+        assert 'create index ix_question_quiz_id_position' in changes
+        assert 'create index ix_option_question_id_is_correct' in changes
+        assert 'build search_index' in changes
+        assert upgrade_schema() == []
+        assert [hit['id'] for hit in search('yes')] == [1]
+
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('option')}
+        assert 'ix_option_question_id_is_correct' in indexes
+
+        quiz = db.session.get(Quiz, 1)
+        assert [question.text for question in quiz.questions] == ['Second?', 'First?']
+        assert [option.text for option in quiz.questions[0].options] == ['Yes', 'No']
+
+        db.session.remove()
+        db.engine.dispose()
+
+def make_quiz(title, question_count, correct_index=0):
+    """Build a quiz dict in the quiz_data.json format"""
+    return {
+        'title': title,
+        'questions': [
+            {
+                'text': f'{title} question {i}?',
+                'options': [{'text': f'Option {j}', 'is_correct': j == correct_index} for j in range(4)]
+            }
+            for i in range(question_count)
+        ]
+    }
+
+def test_iter_quiz_file_streams_json_and_jsonl(tmp_path):
+    """Test that both file formats are decoded item by item"""
+    quizzes = [make_quiz(f'Quiz {i}', 3) for i in range(5)]
+
+    json_path = tmp_path / 'quizzes.json'
+    json_path.write_text(json.dumps({'quizzes': quizzes}, indent=2))
+    # A tiny read size forces items to straddle read boundaries
+    assert list(iter_quiz_file(str(json_path), read_size=7)) == quizzes
+
+    jsonl_path = tmp_path / 'quizzes.jsonl'
+    jsonl_path.write_text('\n'.join(json.dumps(quiz) for quiz in quizzes))
+    assert list(iter_quiz_file(str(jsonl_path))) == quizzes
+
+def test_bulk_import_and_upsert(file_app):
+    """Test chunked import and merging a second import into existing data"""
+    with file_app.app_context():
+        importer = BulkImporter(chunk_size=5).run([make_quiz('Alpha', 4), make_quiz('Beta', 3)])
+        assert (importer.quizzes, importer.questions, importer.options) == (2, 7, 28)
+
+        alpha = Quiz.query.filter_by(title='Alpha').one()
+        assert [question.position for question in alpha.questions] == [1, 2, 3, 4]
+
+        # Same questions with a different correct option, plus one new question
+        updated = make_quiz('Alpha', 5, correct_index=2)
+        importer = BulkImporter(upsert=True).run([updated])
+        assert (importer.quizzes, importer.questions) == (0, 1)
+
+        db.session.expire_all()
+        assert Quiz.query.count() == 2
+        alpha = Quiz.query.filter_by(title='Alpha').one()
+        assert len(alpha.questions) == 5
+        assert alpha.questions[-1].position == 5
+        assert all(
+            [option.text for option in question.options if option.is_correct] == ['Option 2']
+            for question in alpha.questions
+        )
+
+def test_bulk_import_keeps_search_index_in_sync(file_app):
+    """Test that imported quizzes and merged options are searchable"""
+    with file_app.app_context():
+        BulkImporter().run([make_quiz('Gamma', 2)])
+        assert [hit['kind'] for hit in search('gamma', kind='quiz')] == ['quiz']
+        assert search('Extra') == []
+
+        quiz = make_quiz('Gamma', 2)
+        quiz['questions'][0]['options'].append({'text': 'Extra option', 'is_correct': False})
+        BulkImporter(upsert=True).run([quiz])
+        hits = search('Extra')
+        assert len(hits) == 1 and hits[0]['kind'] == 'question'
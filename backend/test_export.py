@@ -0,0 +1,37 @@
+import csv
+import gzip
+import json
+
+def test_results_export_streams_csv_and_ndjson(client):
+    """Test streaming exports, resuming from a cursor and gzip"""
+    for participant in ['ann', 'ben', 'cat']:
+        questions = json.loads(client.get('/api/quizzes/1/questions').data)
+        answers = [{'questionId': q['id'], 'selectedOptionId': q['options'][0]['id']} for q in questions]
+        client.post('/api/quizzes/1/submit', data=json.dumps({'answers': answers, 'participant': participant}),
+                    content_type='application/json')
+    
+    response = client.get('/api/quizzes/1/results/export?format=csv')
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(response.get_data(as_text=True).splitlines()))
+    assert [row['participant'] for row in rows] == ['ann', 'ben', 'cat']
+    
+    response = client.get('/api/quizzes/1/results/export?format=ndjson&rows=answers')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 9
+    assert set(lines[0]) == {'attemptId', 'participant', 'score', 'total', 'submittedAt',
+                             'questionId', 'selectedOptionId', 'isCorrect'}
+    
+    # Resume after the first attempt
+    cursor = f"{rows[0]['submittedAt']},{rows[0]['attemptId']}"
+    response = client.get('/api/quizzes/1/results/export', query_string={'format': 'ndjson', 'after': cursor})
+    assert [json.loads(line)['participant'] for line in response.get_data(as_text=True).splitlines()] == ['ben', 'cat']
+    
+    response = client.get('/api/quizzes/1/results/export?format=csv', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(response.data).decode().splitlines()) == 4
+    
+    response = client.get('/api/quizzes/1/results/export', query_string={'since': '2999-01-01T00:00:00Z'})
+    assert response.get_data(as_text=True).splitlines() == ['attemptId,participant,score,total,submittedAt']
+    assert client.get('/api/quizzes/1/results/export?format=xml').status_code == 400
+    assert client.get('/api/quizzes/1/results/export?after=nonsense').status_code == 400
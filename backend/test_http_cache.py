@@ -0,0 +1,69 @@
+import json
+from datetime import datetime, timezone
+from app import app, db
+from models import Quiz
+from http_cache import versions, ContentVersions
+from changes import quiz_changes
+from conftest import count_queries, make_question
+
+def test_conditional_get_returns_304_without_queries(client, monkeypatch):
+    """Test that a matching If-None-Match is answered from memory"""
+    # The test data was just written; don't wait for Last-Modified to settle
+    monkeypatch.setattr(versions, 'settle_seconds', 0)
+    for url in ['/api/quizzes', '/api/quizzes/1', '/api/quizzes/1/questions']:
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert 'no-cache' in response.headers['Cache-Control']
+        assert response.headers['Last-Modified']
+        
+        def revalidate():
+            cached = client.get(url, headers={'If-None-Match': etag})
+            assert cached.status_code == 304
+            assert cached.headers['ETag'] == etag
+        
+        assert count_queries(revalidate) == 0
+
+def test_etag_changes_after_write(client):
+    """Test that the write endpoints invalidate ETags"""
+    questions_etag = client.get('/api/quizzes/1/questions').headers['ETag']
+    list_etag = client.get('/api/quizzes').headers['ETag']
+    
+    client.post('/api/quizzes/1/questions',
+                data=json.dumps({
+                    'text': 'What is 1 + 1?',
+                    'options': [
+                        {'text': '2', 'is_correct': True},
+                        {'text': '3', 'is_correct': False}
+                    ]
+                }),
+                content_type='application/json')
+    
+    response = client.get('/api/quizzes/1/questions', headers={'If-None-Match': questions_etag})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)) == 4
+    assert client.get('/api/quizzes', headers={'If-None-Match': list_etag}).status_code == 304
+    
+    client.post('/api/quizzes',
+                data=json.dumps({'title': 'Another Quiz'}),
+                content_type='application/json')
+    assert client.get('/api/quizzes', headers={'If-None-Match': list_etag}).status_code == 200
+
+def test_validators_agree_across_workers_and_settle_before_last_modified(client):
+    """Test that ETags come from quiz.updated_at and Last-Modified waits out its one-second resolution"""
+    client.post('/api/quizzes/1/questions', data=json.dumps(make_question('Validated?')),
+                content_type='application/json')
+    response = client.get('/api/quizzes/1/questions')
+    
+    # A worker that just started derives the same validators from the database
+    with app.app_context():
+        other_worker = ContentVersions()
+        other_worker.load(quiz_changes.current())
+    assert response.headers['ETag'] == f'"{other_worker.get(1)[0]}"'
+    
+    # Another write in the same second must not be hidden by If-Modified-Since
+    assert 'Last-Modified' not in response.headers
+    with app.app_context():
+        updated_at = db.session.get(Quiz, 1).updated_at
+    since = datetime.fromtimestamp(int(updated_at), timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    assert client.get('/api/quizzes/1/questions', headers={'If-Modified-Since': since}).status_code == 200
@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from datetime import datetime
+from app import app, db
+from models import Quiz, Attempt
+from attempts import attempt_writer
+from leaderboard import leaderboards
+
+def test_leaderboard_ranks_submissions(client):
+    """Test ranks in submit responses and the leaderboard endpoint"""
+    with app.app_context():
+        questions = db.session.get(Quiz, 1).questions
+        correct = [next(option.id for option in question.options if option.is_correct) for question in questions]
+    
+    def submit(participant, correct_count):
+        answers = [{'questionId': question.id, 'selectedOptionId': option_id}
+                   for question, option_id in zip(questions, correct[:correct_count])]
+        response = client.post('/api/quizzes/1/submit',
+                               data=json.dumps({'answers': answers, 'participant': participant}),
+                               content_type='application/json')
+        return json.loads(response.data)
+    
+    assert submit('ada', 2)['rank'] == 1
+    assert submit('bob', 3)['rank'] == 1
+    assert submit('cy', 1)['rank'] == 3
+    dee = submit('dee', 2)
+    assert dee['rank'] == 2  # ties share a rank
+    
+    board = json.loads(client.get(f"/api/quizzes/1/leaderboard?limit=3&attempt={dee['attemptId']}").data)
+    assert board['attempts'] == 4
+    assert [(entry['participant'], entry['rank']) for entry in board['top']] == [('bob', 1), ('ada', 2), ('dee', 2)]
+    assert board['you']['rank'] == 2 and board['you']['score'] == 2
+    
+    # After a restart the boards are rebuilt from the attempt table
+    attempt_writer.flush()
+    leaderboards.clear()
+    rebuilt = json.loads(client.get(f"/api/quizzes/1/leaderboard?limit=3&attempt={dee['attemptId']}").data)
+    assert rebuilt['top'] == board['top'] and rebuilt['you'] == board['you']
+    
+    # Attempts another worker writes are added by the next sync
+    with app.app_context():
+        db.session.add(Attempt(id='elsewhere', quiz_id=1, participant='eve', score=3, total=3,
+                               submitted_at=datetime(2000, 1, 1)))
+        db.session.commit()
+    leaderboards._next_check = 0
+    synced = json.loads(client.get('/api/quizzes/1/leaderboard?limit=1').data)
+    assert synced['attempts'] == 5 and synced['top'][0]['participant'] == 'eve'
+    
+    assert client.get('/api/quizzes/1/leaderboard?limit=0').status_code == 400
+    assert client.get('/api/quizzes/999/leaderboard').status_code == 404
+
+def test_leaderboard_loads_do_not_block_other_quizzes(client, monkeypatch):
+    """Test that a board being loaded only holds up its own quiz and that loaded boards are capped"""
+    quiz_id = json.loads(client.post('/api/quizzes', data=json.dumps({'title': 'Other board'}),
+                                     content_type='application/json').data)['id']
+    load_lock = threading.Lock()
+    load_lock.acquire()
+    leaderboards._loading[quiz_id] = (load_lock, time.time())
+    
+    def load():
+        with app.app_context():
+            leaderboards.board(quiz_id)
+    
+    waiting = threading.Thread(target=load)
+    waiting.start()
+    try:
+        assert client.get('/api/quizzes/1/leaderboard').status_code == 200
+        assert waiting.is_alive()
+    finally:
+        load_lock.release()
+        waiting.join()
+        leaderboards._loading.pop(quiz_id, None)
+    
+    leaderboards.clear()
+    monkeypatch.setattr(leaderboards, 'max_boards', 1)
+    assert client.get(f'/api/quizzes/{quiz_id}/leaderboard').status_code == 200
+    assert client.get('/api/quizzes/1/leaderboard').status_code == 200
+    assert len(leaderboards) == 1
@@ -0,0 +1,41 @@
+from app import app
+from response_cache import response_cache
+from metrics import metrics
+
+def test_metrics_endpoint(client):
+    """Test that per-route latency and SQL counts are exported"""
+    response_cache.clear()
+    client.get('/api/quizzes/1/questions')
+    client.get('/api/quizzes/1/questions')
+    
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode()
+    
+    route = 'route="/api/quizzes/<int:quiz_id>/questions",method="GET"'
+    assert f'quiz_http_request_duration_seconds_count{{{route}}} 2' in text
+    assert f'quiz_http_request_sql_statements_sum{{{route}}} 3' in text
+    assert f'quiz_http_responses_total{{{route},status="200"}} 2' in text
+    assert 'quiz_response_cache_hits_total 1' in text
+    assert '# TYPE quiz_response_cache_hits_total counter' in text
+    assert '# TYPE quiz_attempt_writer_queue_depth gauge' in text
+    # Every metric is described
+    names = {line.split()[2] for line in text.splitlines() if line.startswith('# TYPE')}
+    assert names == {line.split()[2] for line in text.splitlines() if line.startswith('# HELP')}
+
+def test_slow_request_log_and_profile(client, caplog):
+    """Test the slow-request log and per-request profiling"""
+    metrics.slow_request_seconds = 0
+    metrics.profiling = True
+    try:
+        with caplog.at_level('INFO', logger=app.logger.name):
+            response = client.get('/api/quizzes', headers={'X-Profile': '1'})
+    finally:
+        metrics.slow_request_seconds = 0.5
+        metrics.profiling = False
+    
+    assert 'sql;dur=' in response.headers['Server-Timing']
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith('Slow request: GET /api/quizzes') for message in messages)
+    assert any('Profile for GET /api/quizzes' in message and 'cumulative' in message for message in messages)
@@ -0,0 +1,40 @@
+import json
+
+def test_quiz_list_keyset_pagination(client):
+    """Test paging through the quiz list with cursors"""
+    for i in range(4):
+        client.post('/api/quizzes', data=json.dumps({'title': f'Paged Quiz {i}'}),
+                    content_type='application/json')
+    
+    seen = []
+    url = '/api/quizzes?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = json.loads(response.data)
+        assert len(page) <= 2
+        seen.extend(quiz['id'] for quiz in page)
+        url = None
+        if 'X-Next-Cursor' in response.headers:
+            assert 'rel="next"' in response.headers['Link']
+            url = f"/api/quizzes?limit=2&after={response.headers['X-Next-Cursor']}"
+    
+    assert seen == [1, 2, 3, 4, 5]
+    assert client.get('/api/quizzes?limit=0').status_code == 400
+    assert client.get('/api/quizzes?after=abc').status_code == 400
+
+def test_quiz_list_fields_and_prefix(client):
+    """Test sparse fields and the title prefix filter"""
+    for title in ['Physics 101', 'Physics 102', 'Chemistry']:
+        client.post('/api/quizzes', data=json.dumps({'title': title}),
+                    content_type='application/json')
+    
+    response = client.get('/api/quizzes?prefix=Phys&fields=title')
+    assert json.loads(response.data) == [{'title': 'Physics 101'}, {'title': 'Physics 102'}]
+    assert client.get('/api/quizzes?fields=password').status_code == 400
+    
+    # Every cached page is invalidated when a quiz is created
+    client.post('/api/quizzes', data=json.dumps({'title': 'Physics 103'}),
+                content_type='application/json')
+    response = client.get('/api/quizzes?prefix=Phys&fields=title')
+    assert len(json.loads(response.data)) == 3
@@ -0,0 +1,58 @@
+import gzip
+from response_cache import response_cache
+from conftest import count_queries
+
+def test_questions_served_from_response_cache(client):
+    """Test that repeated question fetches reuse the encoded body"""
+    first = client.get('/api/quizzes/1/questions')
+    hits = response_cache.stats()['hits']
+    
+    def fetch():
+        response = client.get('/api/quizzes/1/questions')
+        assert response.data == first.data
+    
+    assert count_queries(fetch) == 0
+    assert response_cache.stats()['hits'] == hits + 1
+
+def test_gzip_response(client):
+    """Test gzip-encoded responses and their ETags"""
+    response_cache.gzip_min_bytes = 0
+    plain = client.get('/api/quizzes/1/questions')
+    
+    response = client.get('/api/quizzes/1/questions', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] != plain.headers['ETag']
+    
+    cached = client.get('/api/quizzes/1/questions',
+                        headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+def test_response_cache_evicts_to_memory_ceiling():
+    """Test that the LRU stays under its byte limit"""
+    from response_cache import ResponseCache
+    cache = ResponseCache(max_bytes=120, entry_overhead=0)
+    cache.put(('a',), b'x' * 60)
+    cache.put(('b',), b'x' * 30)
+    cache.get(('a',))
+    cache.put(('c',), b'x' * 30)
+    
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) is not None
+    assert cache.stats()['evictions'] == 1
+    # Bodies plus their keys
+    assert cache.stats()['bytes'] == 90 + len(repr(('a',))) + len(repr(('c',)))
+
+def test_response_cache_charges_small_entries_and_caps_their_number():
+    """Test that many tiny pages can't outgrow the ceiling and prefix invalidation drops only their keys"""
+    from response_cache import ResponseCache
+    cache = ResponseCache(max_bytes=100_000, max_entries=50)
+    for after in range(1000):
+        cache.put(('list', 20, after), b'[]', {'X-Next-Cursor': str(after)})
+    assert cache.stats()['entries'] <= 50
+    assert cache.stats()['bytes'] <= 100_000
+    assert cache.stats()['bytes'] > 50 * 512
+    
+    cache.put(('questions', 1), b'[]')
+    cache.invalidate_prefix('list')
+    assert cache.stats()['entries'] == 1 and cache.get(('questions', 1)) is not None
@@ -1,62 +1,11 @@
-import pytest
 import json
+import threading
 from app import app, db
-from models import Quiz, Question, Option
-
-@pytest.fixture
-def client():
-    """Create a test client for the Flask app"""
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-            setup_test_data()
-        yield client
-        
-    with app.app_context():
-        db.drop_all()
-
-def setup_test_data():
-    """Setup test quiz data"""
-    # Create a test quiz
-    quiz = Quiz(title="Test Quiz")
-    db.session.add(quiz)
-    db.session.flush()
-    
-    # Add questions
-    q1 = Question(text="What is 2 + 2?", quiz_id=quiz.id)
-    db.session.add(q1)
-    db.session.flush()
-    
-    # Add options for question 1
-    Option(text="3", is_correct=False, question_id=q1.id)
-    Option(text="4", is_correct=True, question_id=q1.id)
-    Option(text="5", is_correct=False, question_id=q1.id)
-    Option(text="6", is_correct=False, question_id=q1.id)
-    
-    q2 = Question(text="What is the capital of France?", quiz_id=quiz.id)
-    db.session.add(q2)
-    db.session.flush()
-    
-    # Add options for question 2
-    Option(text="London", is_correct=False, question_id=q2.id)
-    Option(text="Paris", is_correct=True, question_id=q2.id)
-    Option(text="Berlin", is_correct=False, question_id=q2.id)
-    Option(text="Madrid", is_correct=False, question_id=q2.id)
-    
-    q3 = Question(text="What is 10 / 2?", quiz_id=quiz.id)
-    db.session.add(q3)
-    db.session.flush()
-    
-    # Add options for question 3
-    Option(text="3", is_correct=False, question_id=q3.id)
-    Option(text="4", is_correct=False, question_id=q3.id)
-    Option(text="5", is_correct=True, question_id=q3.id)
-    Option(text="6", is_correct=False, question_id=q3.id)
-    
-    db.session.commit()
+from models import Option
+from scoring import answer_keys
+from response_cache import response_cache
+from signing import signer, Signer
+from conftest import count_queries, add_questions, submit_first_options
 
 def test_all_correct_answers(client):
     """Test scoring with all correct answers"""
@@ -198,5 +147,226 @@ def test_missing_answers_field(client):
     result = json.loads(response.data)
     assert 'error' in result
 
-if __name__ == '__main__':
-    pytest.main([__file__, '-v'])
+def test_malformed_answers_are_rejected(client):
+    """Test that submit answers 400, not 500, for answers of the wrong shape"""
+    for answers in ['x', [1], [{'questionId': [1], 'selectedOptionId': 1}],
+                    [{'questionId': 1, 'selectedOptionId': {'id': 1}}], [{'questionId': 1}]]:
+        response = client.post('/api/quizzes/1/submit', data=json.dumps({'answers': answers}),
+                               content_type='application/json')
+        assert response.status_code == 400
+        assert json.loads(response.data)['error'] == 'Invalid answers'
+
+def test_questions_query_count_is_constant(client):
+    """Test that fetching questions does not issue one query per question"""
+    def fetch():
+        # Bypass the response and answer key caches so the payload is built from the database
+        response_cache.clear()
+        answer_keys.clear()
+        response = client.get('/api/quizzes/1/questions')
+        assert response.status_code == 200
+
+    small_count = count_queries(fetch)
+
+    add_questions(1, 50)
+    large_count = count_queries(fetch)
+
+    assert large_count == small_count
+    assert large_count <= 3
+
+def test_submit_uses_cached_answer_key(client):
+    """Test that repeated submissions are scored without database queries"""
+    submit_first_options(client)
+    
+    def submit():
+        response = client.post('/api/quizzes/1/submit',
+                               data=json.dumps({'answers': []}),
+                               content_type='application/json')
+        assert response.status_code == 200
+        assert json.loads(response.data)['total'] == 3
+
+    assert count_queries(submit) == 0
+
+def test_answer_key_invalidated_on_new_question(client):
+    """Test that adding a question is reflected in the next submission"""
+    assert json.loads(submit_first_options(client).data)['total'] == 3
+    
+    response = client.post('/api/quizzes/1/questions',
+                           data=json.dumps({
+                               'text': 'What is 1 + 1?',
+                               'options': [
+                                   {'text': '2', 'is_correct': True},
+                                   {'text': '3', 'is_correct': False}
+                               ]
+                           }),
+                           content_type='application/json')
+    assert response.status_code == 201
+    
+    result = json.loads(submit_first_options(client).data)
+    assert result['total'] == 4
+    assert result['results'][-1]['isCorrect'] is True
+
+def test_answer_key_built_across_an_invalidation_is_not_cached(client, monkeypatch):
+    """Test that a key whose build overlapped a write is returned but not kept"""
+    build = answer_keys._build
+    
+    def build_during_write(quiz_id):
+        key = build(quiz_id)
+        answer_keys.invalidate(quiz_id)
+        return key
+    
+    with app.app_context():
+        monkeypatch.setattr(answer_keys, '_build', build_during_write)
+        assert answer_keys.get(1) is not None
+        assert len(answer_keys) == 0
+        monkeypatch.setattr(answer_keys, '_build', build)
+        assert answer_keys.get(1) is answer_keys.get(1)
+        assert len(answer_keys) == 1
+
+def test_answer_key_builds_of_different_quizzes_do_not_wait_on_each_other(client, monkeypatch):
+    """Test that a slow cold build only holds up lookups of its own quiz"""
+    started, release = threading.Event(), threading.Event()
+    
+    def build(quiz_id):
+        if quiz_id == 1:
+            started.set()
+            release.wait(5)
+        return ('key', quiz_id)
+    
+    monkeypatch.setattr(answer_keys, '_build', build)
+    answer_keys.clear()
+    keys = []
+    slow = threading.Thread(target=lambda: keys.append(answer_keys.get(1)))
+    waiting = threading.Thread(target=lambda: keys.append(answer_keys.get(1)))
+    slow.start()
+    assert started.wait(5)
+    waiting.start()
+    try:
+        assert answer_keys.get(2) == ('key', 2)
+        assert keys == []
+    finally:
+        release.set()
+        slow.join()
+        waiting.join()
+    assert keys == [('key', 1), ('key', 1)]
+    assert answer_keys._building == {}
+    answer_keys.clear()
+
+def test_batch_submission(client):
+    """Test scoring several answer sheets in one request"""
+    questions = json.loads(client.get('/api/quizzes/1/questions').data)
+    all_correct = [
+        {"questionId": questions[0]['id'], "selectedOptionId": questions[0]['options'][1]['id']},
+        {"questionId": questions[1]['id'], "selectedOptionId": questions[1]['options'][1]['id']},
+        {"questionId": questions[2]['id'], "selectedOptionId": questions[2]['options'][2]['id']}
+    ]
+    sheets = [
+        {"id": "alice", "answers": all_correct},
+        {"id": "bob", "answers": all_correct[:1]},
+        {"id": "carol", "answers": "not a list"}
+    ]
+    
+    response = client.post('/api/quizzes/1/submit/batch',
+                          data=json.dumps({'sheets': sheets}),
+                          content_type='application/json')
+    
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert result['count'] == 3
+    alice, bob, carol = result['results']
+    assert (alice['id'], alice['score'], alice['percentage']) == ('alice', 3, 100.0)
+    assert (bob['id'], bob['score'], bob['total']) == ('bob', 1, 3)
+    assert 'results' not in bob
+    assert carol['error'] == 'Invalid answers'
+
+def test_batch_submission_ndjson_details(client):
+    """Test streaming batch results as NDJSON with per-question details"""
+    sheets = [{"answers": []}, {"answers": []}]
+    
+    response = client.post('/api/quizzes/1/submit/batch?format=ndjson&details=true',
+                          data=json.dumps({'sheets': sheets}),
+                          content_type='application/json')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line['sheet'] for line in lines] == [0, 1]
+    assert all(len(line['results']) == 3 for line in lines)
+
+def test_batch_submission_invalid(client):
+    """Test batch submission validation"""
+    response = client.post('/api/quizzes/1/submit/batch',
+                          data=json.dumps({}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    
+    response = client.post('/api/quizzes/999/submit/batch',
+                          data=json.dumps({'sheets': []}),
+                          content_type='application/json')
+    assert response.status_code == 404
+
+def test_seeded_draw_is_reproducible_and_scored(client):
+    """Test per-attempt shuffling and drawing N of M questions"""
+    with app.app_context():
+        add_questions(1, 8)
+    
+    response = client.get('/api/quizzes/1/questions?seed=student-1&count=5')
+    assert response.headers['X-Quiz-Seed'] == 'student-1'
+    drawn = json.loads(response.data)
+    assert len(drawn) == 5
+    assert client.get('/api/quizzes/1/questions?seed=student-1&count=5').data == response.data
+    
+    all_questions = {question['id']: question for question in json.loads(client.get('/api/quizzes/1/questions').data)}
+    assert all(
+        sorted(option['id'] for option in question['options'])
+        == sorted(option['id'] for option in all_questions[question['id']]['options'])
+        for question in drawn
+    )
+    shuffled = json.loads(client.get('/api/quizzes/1/questions?seed=student-2').data)
+    assert sorted(question['id'] for question in shuffled) == sorted(all_questions)
+    assert shuffled != list(all_questions.values())
+    
+    # Drawing again is served from the cached answer key
+    assert count_queries(lambda: client.get('/api/quizzes/1/questions?seed=student-3&count=5')) == 0
+    
+    # A client-chosen seed is for display only: no draw token
+    assert 'X-Quiz-Draw' not in response.headers
+    
+    # A server-drawn submission is scored against the drawn questions only
+    response = client.get('/api/quizzes/1/questions?shuffle=true&count=5')
+    assert len(response.headers['X-Quiz-Seed']) == 16
+    drawn = json.loads(response.data)
+    with app.app_context():
+        correct = dict(db.session.query(Option.question_id, Option.id).filter(Option.is_correct))
+    answers = [{'questionId': question['id'], 'selectedOptionId': correct[question['id']]} for question in drawn]
+    result = json.loads(client.post('/api/quizzes/1/submit',
+                                    data=json.dumps({'answers': answers, 'drawToken': response.headers['X-Quiz-Draw']}),
+                                    content_type='application/json').data)
+    assert (result['score'], result['total']) == (5, 5)
+    assert [item['questionId'] for item in result['results']] == [question['id'] for question in drawn]
+    
+    assert client.get('/api/quizzes/1/questions?seed=x&count=zero').status_code == 400
+    for body in ({'answers': [], 'count': 5}, {'answers': [], 'seed': 'x'}):
+        response = client.post('/api/quizzes/1/submit', data=json.dumps(body), content_type='application/json')
+        assert response.status_code == 400
+
+def test_client_cannot_choose_a_small_draw(client):
+    """Test that seed and count of a scored draw come from the server"""
+    with app.app_context():
+        add_questions(1, 7)
+    
+    # Too few questions to score fairly, whether drawn or started
+    assert client.get('/api/quizzes/1/questions?shuffle=true&count=1').status_code == 400
+    assert client.post('/api/quizzes/1/start', data=json.dumps({'count': 1}),
+                       content_type='application/json').status_code == 400
+    
+    # A draw token only verifies for the quiz and draw it was signed for
+    token = client.get('/api/quizzes/1/questions?count=5').headers['X-Quiz-Draw']
+    signature = token.split('.')[1]
+    forged = signer.sign({'quizId': 1, 'seed': 'x', 'count': 1}).split('.')[0] + '.' + signature
+    for draw_token in (forged, 'nonsense', 42):
+        response = client.post('/api/quizzes/1/submit', data=json.dumps({'answers': [], 'drawToken': draw_token}),
+                               content_type='application/json')
+        assert response.status_code == 400
+    assert Signer('another key').unsign(token) is None
+    draw = signer.unsign(token)
+    assert (draw['quizId'], draw['count']) == (1, 5)
@@ -0,0 +1,49 @@
+import json
+
+def test_search_is_ranked_and_kept_in_sync(client):
+    """Test full-text search over titles, questions and options"""
+    client.post('/api/quizzes', data=json.dumps({'title': 'Astronomy Basics'}),
+                content_type='application/json')
+    response = client.post('/api/quizzes/import',
+                          data=json.dumps({
+                              'title': 'Space Trivia',
+                              'questions': [
+                                  {'text': 'Which planet has the most moons?',
+                                   'options': [{'text': 'Saturn', 'is_correct': True}, {'text': 'Earth'}]},
+                                  {'text': 'What is a light year?',
+                                   'options': [{'text': 'A distance', 'is_correct': True},
+                                               {'text': 'A planet orbit period'}]}
+                              ]
+                          }),
+                          content_type='application/json')
+    quiz_id = json.loads(response.data)['id']
+    
+    # Question text outranks a match in the options; the prefix matches "planet"
+    results = json.loads(client.get('/api/search?q=plan').data)['results']
+    assert [(hit['kind'], hit['text']) for hit in results] == [
+        ('question', 'Which planet has the most moons?'),
+        ('question', 'What is a light year?')
+    ]
+    assert all(hit['quizId'] == quiz_id for hit in results)
+    
+    results = json.loads(client.get('/api/search?q=saturn').data)['results']
+    assert [hit['text'] for hit in results] == ['Which planet has the most moons?']
+    results = json.loads(client.get('/api/search?q=astronomy&kind=quiz').data)['results']
+    assert [hit['text'] for hit in results] == ['Astronomy Basics']
+    
+    # New questions are searchable as soon as they are added
+    client.post(f'/api/quizzes/{quiz_id}/questions',
+                data=json.dumps({'text': 'Which planet is the hottest?',
+                                 'options': [{'text': 'Venus', 'is_correct': True}, {'text': 'Mercury'}]}),
+                content_type='application/json')
+    response = json.loads(client.get(f'/api/search?q=planet&quiz_id={quiz_id}&limit=2').data)
+    assert len(response['results']) == 2
+    assert response['nextOffset'] == 2
+    response = json.loads(client.get(f'/api/search?q=planet&quiz_id={quiz_id}&limit=2&offset=2').data)
+    assert len(response['results']) == 1
+    assert response['nextOffset'] is None
+    
+    # Query syntax is treated as plain words
+    assert client.get('/api/search?q="NEAR(OR').status_code == 200
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=x&kind=option').status_code == 400
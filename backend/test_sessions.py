@@ -0,0 +1,138 @@
+import pytest
+import json
+import time
+import tracemalloc
+from app import app
+from config import get_setting
+import sessions as sessions_module
+from sessions import session_store, create_session_store, SessionStore, SqliteSessionStore
+from admission import admission
+from signing import signer
+from conftest import add_questions, submit_first_options
+
+def test_draw_token_is_single_use_and_expires(client, monkeypatch):
+    """Test that a drawToken scores one submission and stops working after it expires"""
+    with app.app_context():
+        add_questions(1, 7)
+    
+    def submit(draw_token):
+        return client.post('/api/quizzes/1/submit', data=json.dumps({'answers': [], 'drawToken': draw_token}),
+                           content_type='application/json')
+    
+    token = client.get('/api/quizzes/1/questions?count=5').headers['X-Quiz-Draw']
+    assert submit(token).status_code == 200
+    assert submit(token).status_code == 409
+    
+    token = client.get('/api/quizzes/1/questions?count=5').headers['X-Quiz-Draw']
+    expires = signer.unsign(token)['expires']
+    monkeypatch.setattr(admission, 'arrived_at', lambda: expires + session_store.grace + 1)
+    assert submit(token).status_code == 410
+    
+    # With attempt tokens required the questions endpoint issues no drawToken
+    app.config['REQUIRE_ATTEMPT_TOKEN'] = True
+    try:
+        assert 'X-Quiz-Draw' not in client.get('/api/quizzes/1/questions?count=5').headers
+    finally:
+        app.config['REQUIRE_ATTEMPT_TOKEN'] = False
+
+def test_timed_attempt_start_and_submit(client):
+    """Test that submissions with an attempt token are scored on the served draw"""
+    with app.app_context():
+        add_questions(1, 6)
+    
+    response = client.post('/api/quizzes/1/start', data=json.dumps({'count': 5}), content_type='application/json')
+    assert response.status_code == 201
+    started = json.loads(response.data)
+    assert len(started['questions']) == 5
+    assert started['deadline'] == pytest.approx(time.time() + started['timeLimitSeconds'], abs=5)
+    
+    answers = [{'questionId': question['id'], 'selectedOptionId': question['options'][0]['id']}
+               for question in started['questions']]
+    submission = json.dumps({'answers': answers, 'attemptToken': started['attemptToken']})
+    response = client.post('/api/quizzes/1/submit', data=submission, content_type='application/json')
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert result['total'] == 5
+    assert result['attemptId'] == started['attemptToken']
+    
+    # A token can only be used once
+    response = client.post('/api/quizzes/1/submit', data=submission, content_type='application/json')
+    assert response.status_code == 410
+    assert client.post('/api/quizzes/999/start').status_code == 404
+
+def test_submission_after_deadline_is_rejected(client):
+    """Test that the server enforces the attempt deadline"""
+    started = json.loads(client.post('/api/quizzes/1/start').data)
+    session_store.get(started['attemptToken']).deadline -= 3600
+    
+    response = client.post('/api/quizzes/1/submit',
+                           data=json.dumps({'answers': [], 'attemptToken': started['attemptToken']}),
+                           content_type='application/json')
+    assert response.status_code == 403
+    assert 'Time limit' in json.loads(response.data)['error']
+
+def test_submit_requires_attempt_token(client):
+    """Test that by default a submission must come from /start"""
+    assert get_setting('sessions', 'require_token', False)
+    app.config['REQUIRE_ATTEMPT_TOKEN'] = True
+    
+    response = submit_first_options(client)
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'attemptToken is required'
+    
+    started = json.loads(client.post('/api/quizzes/1/start').data)
+    response = client.post('/api/quizzes/1/submit', data=json.dumps({'attemptToken': started['attemptToken']}),
+                           content_type='application/json')
+    assert response.status_code == 200
+
+def test_several_workers_share_sessions(tmp_path, monkeypatch):
+    """Test that the default store is shared once serve.py runs several workers"""
+    path = str(tmp_path / 'sessions.db')
+    monkeypatch.delenv('SESSION_DB', raising=False)
+    monkeypatch.setattr(sessions_module, 'get_setting',
+                        lambda section, key, default=None: path if key == 'sqlite_path' else default)
+    monkeypatch.setenv('QUIZ_WORKERS', '1')
+    assert type(create_session_store()) is SessionStore
+    monkeypatch.setenv('QUIZ_WORKERS', '4')
+    assert isinstance(create_session_store(), SqliteSessionStore)
+
+def test_session_store_sweeps_expired_sessions():
+    """Test TTL eviction through the timing wheel"""
+    store = SessionStore(grace=5)
+    now = 1_000_000.0
+    short = store.start(1, 'a', None, 60, now=now)
+    long = store.start(1, 'b', None, 600, now=now)
+    
+    assert store.sweep(now + 64) == 0
+    assert store.sweep(now + 67) == 1
+    assert store.get(short.token) is None and store.get(long.token) is long
+    assert store.finish(long.token) is long
+    assert store.sweep(now + 10_000) == 0
+    assert len(store) == 0
+
+def test_session_store_memory_footprint():
+    """Test that active sessions stay small enough to hold 100k per process"""
+    store = SessionStore()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(20_000):
+        store.start(i % 50, f'{i:016x}', None, 300)
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / len(store)
+    tracemalloc.stop()
+    
+    # Token, session object, dict and wheel entries: 100k sessions in under 40 MB
+    assert per_session < 400
+
+def test_sqlite_session_store_survives_restart(tmp_path):
+    """Test that sessions in the SQLite store outlive the process's store object"""
+    path = str(tmp_path / 'sessions.db')
+    session = SqliteSessionStore(path).start(3, 'seed', 5, 300)
+    
+    reopened = SqliteSessionStore(path)
+    restored = reopened.get(session.token)
+    assert (restored.quiz_id, restored.seed, restored.count) == (3, 'seed', 5)
+    assert reopened.finish(session.token) is not None
+    assert reopened.finish(session.token) is None
+    
+    reopened.start(3, 'old', None, 1, now=time.time() - 3600)
+    assert reopened.sweep() == 1
@@ -0,0 +1,60 @@
+import pytest
+import json
+import os
+from app import app, db
+from models import Quiz, Attempt
+from attempts import attempt_writer
+from migrations import upgrade_schema
+from sharding import shards
+from conftest import TEST_DIR, make_question
+
+def test_quizzes_are_sharded_by_id(client):
+    """Test placing quizzes on two shards, routing requests to them and merging the listing"""
+    with app.app_context():
+        shards.configure([f"sqlite:///{os.path.join(TEST_DIR, 'shard1.db')}"])
+        shards.each(upgrade_schema)
+    try:
+        ids = [json.loads(client.post('/api/quizzes', data=json.dumps({'title': f'Sharded {i}'}),
+                                      content_type='application/json').data)['id'] for i in range(2)]
+        assert sorted(ids) == [2, 3]
+        assert {shards.shard_for(quiz_id) for quiz_id in ids} == {0, 1}
+        
+        quiz_id = 2
+        response = client.post(f'/api/quizzes/{quiz_id}/questions', data=json.dumps(make_question('Sharded?')),
+                               content_type='application/json')
+        assert response.status_code == 201
+        questions = json.loads(client.get(f'/api/quizzes/{quiz_id}/questions').data)
+        answers = [{'questionId': questions[0]['id'], 'selectedOptionId': questions[0]['options'][0]['id']}]
+        result = json.loads(client.post(f'/api/quizzes/{quiz_id}/submit', data=json.dumps({'answers': answers}),
+                                        content_type='application/json').data)
+        assert (result['score'], result['total']) == (1, 1)
+        attempt_writer.flush()
+        
+        with app.app_context():
+            attempts = shards.each(lambda: Attempt.query.filter_by(quiz_id=quiz_id).count())
+        assert attempts == [0, 1]
+        assert json.loads(client.get(f'/api/quizzes/{quiz_id}/stats').data)['attempts'] == 1
+        
+        listing = json.loads(client.get('/api/quizzes').data)
+        assert [quiz['id'] for quiz in listing] == [1, 2, 3]
+        response = client.get('/api/quizzes?limit=1&after=1')
+        assert [quiz['id'] for quiz in json.loads(response.data)] == [2]
+        assert response.headers['X-Next-Cursor'] == '2'
+        
+        # Starting with a shard list that doesn't match the data is refused
+        shards.check_placement()
+        with app.app_context(), shards.use(1):
+            db.session.add(Quiz(id=5, title='Misplaced'))
+            db.session.commit()
+        with pytest.raises(RuntimeError):
+            shards.check_placement()
+        with app.app_context(), pytest.raises(RuntimeError):
+            shards.configure(['postgresql://quiz@localhost/shard1'])
+        assert shards.count == 2
+    finally:
+        with app.app_context():
+            shards.each(lambda: db.metadata.drop_all(db.session.get_bind()))
+            shards.configure([])
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
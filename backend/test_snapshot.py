@@ -0,0 +1,39 @@
+import json
+from scoring import answer_keys
+from response_cache import response_cache
+from snapshot import snapshots, QuizBankSnapshot
+from conftest import count_queries, submit_first_options, make_question
+
+def test_snapshot_serves_questions_and_scoring_without_queries(client):
+    """Test compiling the quiz bank snapshot and reading quizzes from it"""
+    expected = json.loads(client.get('/api/quizzes/1/questions').data)
+    
+    response = client.post('/api/admin/snapshot')
+    assert response.status_code == 201
+    assert json.loads(response.data)['questions'] == 3
+    
+    snapshot = QuizBankSnapshot(snapshots.path)
+    assert snapshot.title(1) == 'Test Quiz'
+    assert 999 not in snapshot
+    snapshot.close()
+    
+    answer_keys.clear()
+    response_cache.clear()
+    assert count_queries(lambda: client.get('/api/quizzes/1/questions')) == 0
+    assert json.loads(client.get('/api/quizzes/1/questions').data) == expected
+    # Scoring builds its answer key from the snapshot too (the leaderboard is loaded by the first submit)
+    assert json.loads(submit_first_options(client).data)['total'] == 3
+    answer_keys.clear()
+    assert count_queries(lambda: submit_first_options(client)) == 0
+    
+    # A quiz written after the snapshot was built is read from the database again
+    client.post('/api/quizzes/1/questions', data=json.dumps(make_question('Added later?')),
+                content_type='application/json')
+    assert len(json.loads(client.get('/api/quizzes/1/questions').data)) == 4
+    
+    # Also after a restart, which forgets everything this process saw
+    answer_keys.clear()
+    response_cache.clear()
+    snapshots.configure()
+    assert len(json.loads(client.get('/api/quizzes/1/questions').data)) == 4
+    assert json.loads(submit_first_options(client).data)['total'] == 4
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from app import app
+from startup import readiness, Readiness
+
+def test_importing_app_does_no_database_work(tmp_path):
+    """Test that importing the app leaves the database alone until warm-up"""
+    path = tmp_path / 'untouched.db'
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                   env={**os.environ, 'DATABASE_URL': f'sqlite:///{path}'}, check=True)
+    assert not path.exists()
+
+def test_health_reports_starting_until_warm_up_finishes(client, monkeypatch):
+    """Test that requests are held back while the worker warms up"""
+    release = threading.Event()
+    monkeypatch.setattr(readiness, '_ready', threading.Event())
+    monkeypatch.setattr(readiness, '_steps', [('blocked', release.wait)])
+    monkeypatch.setattr(readiness, 'phases', {})
+    monkeypatch.setattr(readiness, 'request_wait', 0.05)
+    
+    response = client.get('/api/health')
+    assert response.status_code == 503
+    assert json.loads(response.data)['status'] == 'starting'
+    response = client.get('/api/quizzes/1')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    
+    release.set()
+    assert readiness.wait(5)
+    response = client.get('/api/health')
+    assert response.status_code == 200
+    assert json.loads(response.data)['startup']['state'] == 'ready'
+    assert client.get('/api/quizzes/1').status_code == 200
+
+def test_failed_warm_up_is_retried():
+    """Test that a failing warm-up step leaves the worker unready until a retry succeeds"""
+    warm_up = Readiness()
+    warm_up.app = app
+    calls = []
+    
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('database unavailable')
+    
+    warm_up.add_step('flaky', flaky)
+    assert not warm_up.run()
+    assert warm_up.state == 'failed'
+    assert warm_up.status()['error'] == 'database unavailable'
+    assert warm_up.run()
+    assert warm_up.ready
+    assert set(warm_up.phases) == {'flaky'}
@@ -0,0 +1,54 @@
+import pytest
+import json
+from app import app, db
+from models import Quiz
+from attempts import attempt_writer
+from conftest import submit_first_options
+
+def test_quiz_stats_are_updated_incrementally(client):
+    """Test per-question counters and the score histogram"""
+    with app.app_context():
+        questions = db.session.get(Quiz, 1).questions
+        correct = [next(option.id for option in question.options if option.is_correct) for question in questions]
+        wrong = [next(option.id for option in question.options if not option.is_correct) for question in questions]
+    
+    def submit(option_ids):
+        answers = [{'questionId': question.id, 'selectedOptionId': option_id}
+                   for question, option_id in zip(questions, option_ids) if option_id is not None]
+        client.post('/api/quizzes/1/submit', data=json.dumps({'answers': answers}),
+                    content_type='application/json')
+    
+    submit(correct)
+    submit([correct[0], wrong[1]])
+    submit([wrong[0], None])
+    attempt_writer.flush()
+    
+    stats = json.loads(client.get('/api/quizzes/1/stats').data)
+    assert stats['attempts'] == 3
+    assert stats['averageScore'] == 1.33
+    assert stats['averagePercentage'] == 44.44
+    # Scores of 0/3, 1/3 and 3/3
+    assert [bucket['attempts'] for bucket in stats['histogram'] if bucket['attempts']] == [1, 1, 1]
+    assert [bucket['minPercentage'] for bucket in stats['histogram'] if bucket['attempts']] == [0, 30, 100]
+    
+    first, second, third = stats['questions']
+    assert (first['shown'], first['answered'], first['correct']) == (3, 3, 2)
+    assert (second['shown'], second['answered'], second['correct']) == (3, 2, 1)
+    assert (third['shown'], third['answered'], third['correct']) == (3, 1, 1)
+    assert first['correctRate'] == pytest.approx(2 / 3, abs=1e-4)
+    assert {option['optionId']: option['picks'] for option in first['options']}[correct[0]] == 2
+    assert 'isCorrect' not in first['options'][0]
+    assert client.get('/api/quizzes/999/stats').status_code == 404
+
+def test_stats_recompute_matches_incremental_counters(client):
+    """Test that the offline recompute reproduces the incremental counters"""
+    from stats import recompute
+    
+    for _ in range(5):
+        submit_first_options(client)
+    attempt_writer.flush()
+    incremental = json.loads(client.get('/api/quizzes/1/stats').data)
+    
+    with app.app_context():
+        assert recompute(chunk_size=3) == 5
+    assert json.loads(client.get('/api/quizzes/1/stats').data) == incremental
@@ -0,0 +1,56 @@
+from config import get_setting
+
+
+def validate_question(data):
+    """Validate a question payload against the quiz_settings limits in config.json.
+
+    Returns an error message, or None if the question is valid.
+    """
+    if not isinstance(data, dict) or 'text' not in data or 'options' not in data:
+        return 'Missing text or options'
+
+    max_question_length = get_setting('quiz_settings', 'max_question_length', 300)
+    max_option_length = get_setting('quiz_settings', 'max_option_length', 200)
+    min_options = get_setting('quiz_settings', 'min_options_per_question', 2)
+    max_options = get_setting('quiz_settings', 'max_options_per_question', 6)
+
+    if not isinstance(data['text'], str) or not data['text'].strip():
+        return 'Question text is required'
+    if len(data['text']) > max_question_length:
+        return f'Question text must be {max_question_length} characters or less'
+
+    options = data['options']
+    if not isinstance(options, list):
+        return 'Options must be a list'
+    if not min_options <= len(options) <= max_options:
+        return f'A question must have between {min_options} and {max_options} options'
+
+    for option in options:
+        if not isinstance(option, dict) or not isinstance(option.get('text'), str) or not option['text'].strip():
+            return 'Every option needs a text'
+        if len(option['text']) > max_option_length:
+            return f'Option text must be {max_option_length} characters or less'
+
+    # Validate that exactly one option is marked as correct
+    correct_options = [opt for opt in options if opt.get('is_correct', False)]
+    if len(correct_options) != 1:
+        return 'Exactly one option must be marked as correct'
+
+    return None
+
+
+def validate_questions(questions):
+    """Validate a list of question payloads.
+
+    Returns (valid_questions, errors) where errors is a list of
+    {'index': i, 'error': message} for every invalid item.
+    """
+    valid = []
+    errors = []
+    for index, question in enumerate(questions):
+        error = validate_question(question)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append(question)
+    return valid, errors
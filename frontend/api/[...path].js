@@ -44,8 +44,11 @@ module.exports = async (req, res) => {
     // Copy status and headers
     res.statusCode = backendRes.status;
     backendRes.headers.forEach((value, name) => {
-      // Vercel may reject some headers; skip transfer-encoding
-      if (name.toLowerCase() === "transfer-encoding") return;
+      // Vercel may reject some headers; skip transfer-encoding.
+      // fetch() already decoded gzip bodies, so drop the encoding headers too.
+      const lower = name.toLowerCase();
+      if (lower === "transfer-encoding") return;
+      if (lower === "content-encoding" || lower === "content-length") return;
       res.setHeader(name, value);
     });
 
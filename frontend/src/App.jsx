@@ -22,6 +22,7 @@ function App() {
   const [quizzes, setQuizzes] = useState([]);
   const [selectedQuiz, setSelectedQuiz] = useState(null);
   const [questions, setQuestions] = useState([]);
+  const [attempt, setAttempt] = useState(null);
   const [results, setResults] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -54,10 +55,15 @@ function App() {
       const quiz = quizzes.find((q) => q.id === quizId);
       setSelectedQuiz(quiz);
 
-      const response = await axios.get(
-        `${API_BASE_URL}/quizzes/${quizId}/questions`
+      // Starting an attempt returns its questions and the server-side deadline
+      const response = await axios.post(
+        `${API_BASE_URL}/quizzes/${quizId}/start`
       );
-      setQuestions(response.data);
+      setQuestions(response.data.questions);
+      setAttempt({
+        token: response.data.attemptToken,
+        deadline: response.data.deadline,
+      });
       setCurrentView("quiz");
     } catch (err) {
       setError("Failed to load quiz questions.");
@@ -67,13 +73,23 @@ function App() {
     }
   };
 
+  // Autosave each answer so a reload or crash doesn't lose the attempt
+  const handleAnswer = (questionId, selectedOptionId) => {
+    if (!attempt) return;
+    axios
+      .patch(`${API_BASE_URL}/attempts/${attempt.token}/answers`, {
+        answers: [{ questionId, selectedOptionId }],
+      })
+      .catch((err) => console.error("Error autosaving answer:", err));
+  };
+
   const handleQuizSubmit = async (answers, timeTaken) => {
     setLoading(true);
     setError(null);
     try {
       const response = await axios.post(
         `${API_BASE_URL}/quizzes/${selectedQuiz.id}/submit`,
-        { answers }
+        { answers, attemptToken: attempt?.token }
       );
       setResults({ ...response.data, timeTaken });
       setCurrentView("results");
@@ -89,6 +105,7 @@ function App() {
     setCurrentView("selection");
     setSelectedQuiz(null);
     setQuestions([]);
+    setAttempt(null);
     setResults(null);
     setError(null);
   };
@@ -134,6 +151,8 @@ function App() {
             <QuizView
               quiz={selectedQuiz}
               questions={questions}
+              deadline={attempt?.deadline}
+              onAnswer={handleAnswer}
               onSubmit={handleQuizSubmit}
               onBack={handleBackToSelection}
             />
@@ -2,10 +2,13 @@ import { useState, useEffect } from 'react'
 import { ChevronLeft, ChevronRight, Clock, CheckCircle, AlertCircle } from 'lucide-react'
 import './QuizView.css'
 
-function QuizView({ quiz, questions, onSubmit, onBack }) {
+function QuizView({ quiz, questions, deadline, onAnswer, onSubmit, onBack }) {
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0)
   const [answers, setAnswers] = useState({})
-  const [timeRemaining, setTimeRemaining] = useState(300) // 5 minutes in seconds
+  // The server's deadline (Unix seconds) is authoritative; fall back to 5 minutes
+  const [timeRemaining, setTimeRemaining] = useState(
+    deadline ? Math.max(0, Math.floor(deadline - Date.now() / 1000)) : 300
+  )
   const [startTime] = useState(Date.now())
   const [showSubmitWarning, setShowSubmitWarning] = useState(false)
 
@@ -38,6 +41,7 @@ function QuizView({ quiz, questions, onSubmit, onBack }) {
       ...answers,
       [currentQuestion.id]: optionId
     })
+    onAnswer?.(currentQuestion.id, optionId)
   }
 
   const handleNext = () => {